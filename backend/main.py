@@ -30,6 +30,7 @@ from pipeline import (
     StoryboardGenerator,  # NEW
     LayoutEngine,  # NEW
     ManimGenerator,
+    NanoBananaGenerator,
     RemotionGenerator,  # NEW - Alternative to Manim
     ImageToVideoGenerator,
     LipsyncGenerator,
@@ -40,6 +41,7 @@ from pipeline import (
     CharacterContext,
     VisualContext,  # NEW - Visual continuity
 )
+from pipeline.openai_client import close_openai_clients
 
 # Media upload modules
 from pipeline.media_validator import MediaValidator
@@ -561,12 +563,15 @@ async def generate_video_pipeline(
 
             # Detect completed steps
             resume_detector = ResumeDetector(job_dir)
-            completed_steps = resume_detector.detect_completed_steps()
+            completed_steps = await resume_detector.detect_completed_steps_async()
             resume_point = resume_detector.get_resume_point()
 
             logger.info(resume_detector.get_summary())
             logger.info(f"Resuming from: {resume_point}")
 
+            # Read every saved artifact (script, storyboard, voice map, ...) at once
+            saved_artifacts = await resume_detector.load_all()
+
             # Restore job metadata (celebrities, models, etc.)
             metadata_path = job_dir / "job_metadata.json"
             if metadata_path.exists():
@@ -607,6 +612,7 @@ async def generate_video_pipeline(
             job_dir = BASE_OUTPUT_DIR / job_id
             job_dir.mkdir(parents=True, exist_ok=True)
             completed_steps = {}
+            saved_artifacts = {}
             resume_point = "script"
 
         # Handle celebrity configuration (NEW: supports multiple celebrities)
@@ -714,7 +720,6 @@ async def generate_video_pipeline(
                 await send_progress_update(job_id, "Generating custom character images...", 2)
                 logger.info("🎨 Step 1/9: Generating customized character images with Nano Banana")
 
-                from pipeline import NanoBananaGenerator
                 nano_gen = NanoBananaGenerator(REPLICATE_API_TOKEN)
 
                 for celeb_idx, celeb_config in enumerate(celebrities):
@@ -808,7 +813,9 @@ async def generate_video_pipeline(
         script_path = job_dir / "script.json"
         if completed_steps.get("script"):
             logger.info("⏩ Skipping script generation (already completed)")
-            script = json.loads(script_path.read_text(encoding="utf-8"))
+            script = saved_artifacts.get("script")
+            if script is None:
+                raise Exception(f"Cannot resume: failed to load {script_path}")
             await send_progress_update(job_id, "Script loaded from cache", 10)
         else:
             await send_progress_update(job_id, "Generating script...", 5)
@@ -917,14 +924,11 @@ async def generate_video_pipeline(
         if completed_steps.get("audio"):
             logger.info("⏩ Skipping audio generation (already completed)")
 
-            # Load speaker voice map for resume functionality
-            voice_map_path = job_dir / "speaker_voice_map.json"
-            if voice_map_path.exists():
-                try:
-                    audio_gen.speaker_voice_map = json.loads(voice_map_path.read_text())
-                    logger.info(f"Loaded speaker voice map: {audio_gen.speaker_voice_map}")
-                except Exception as e:
-                    logger.warning(f"Failed to load speaker voice map: {e}")
+            # Restore speaker voice map for resume functionality
+            speaker_voice_map = saved_artifacts.get("speaker_voice_map")
+            if speaker_voice_map is not None:
+                audio_gen.speaker_voice_map = speaker_voice_map
+                logger.info(f"Loaded speaker voice map: {audio_gen.speaker_voice_map}")
 
             await send_progress_update(job_id, "Audio loaded from cache", 25)
         else:
@@ -987,12 +991,16 @@ async def generate_video_pipeline(
         # Try to use new storyboard system, fallback to legacy
         if completed_steps.get("storyboard"):
             logger.info("⏩ Skipping storyboard generation (already completed)")
-            storyboard = json.loads(storyboard_path.read_text(encoding="utf-8"))
+            storyboard = saved_artifacts.get("storyboard")
+            if storyboard is None:
+                raise Exception(f"Cannot resume: failed to load {storyboard_path}")
             await send_progress_update(job_id, "Storyboard loaded from cache", 47)
             visual_instructions = None  # Using new system
         elif completed_steps.get("visual_instructions"):
             logger.info("⏩ Using legacy visual instructions (already completed)")
-            visual_instructions = json.loads(visual_path.read_text(encoding="utf-8"))
+            visual_instructions = saved_artifacts.get("visual_instructions")
+            if visual_instructions is None:
+                raise Exception(f"Cannot resume: failed to load {visual_path}")
             await send_progress_update(job_id, "Visual instructions loaded from cache (legacy)", 47)
             storyboard = None  # Using legacy system
         else:
@@ -1093,6 +1101,8 @@ async def generate_video_pipeline(
                                 progress_callback=lambda msg, prog: asyncio.create_task(
                                     send_progress_update(job_id, msg, prog)
                                 ),
+                                script=script,
+                                use_cache=False,
                             )
                             logger.info(f"Remotion code regenerated after render failure")
                         else:
@@ -1180,6 +1190,7 @@ async def generate_video_pipeline(
                                 progress_callback=lambda msg, prog: asyncio.create_task(
                                     send_progress_update(job_id, msg, prog)
                                 ),
+                                use_cache=False,
                             )
                             logger.info(f"Manim code regenerated after render failure")
                         else:
@@ -1605,6 +1616,17 @@ async def startup_event():
     logger.info("Server started - output folders preserved for resume functionality")
 
 
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Shutdown event - close shared HTTP connection pools and workers."""
+    await close_openai_clients()
+    await ManimGenerator.close_shared_resources()
+    await NanoBananaGenerator.close_shared_resources()
+    await RemotionGenerator.close_shared_resources()
+    MediaProcessor.shutdown_pool()
+
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -2034,10 +2056,10 @@ async def upload_photo(photo: UploadFile = File(...), user_id: str = Form("defau
         photo_data, sanitized_filename = await media_validator.validate_photo(photo)
 
         # Process photo (resize, create thumbnail, strip EXIF)
-        processed_photo, thumbnail, dimensions = media_processor.process_photo(photo_data)
+        processed_photo, thumbnail, dimensions = await media_processor.process_photo_async(photo_data)
 
         # Save to storage
-        metadata = media_storage.save_photo(
+        metadata = await media_storage.save_photo_async(
             user_id=user_id,
             photo_data=processed_photo,
             thumbnail_data=thumbnail,
@@ -2055,6 +2077,62 @@ async def upload_photo(photo: UploadFile = File(...), user_id: str = Form("defau
         raise HTTPException(status_code=500, detail=f"Photo upload failed: {str(e)}")
 
 
+# Most photos accepted by one batch upload request
+MAX_PHOTOS_PER_UPLOAD = 20
+
+
+@app.post("/api/upload/photos", response_model=List[PhotoMetadata])
+async def upload_photos(photos: List[UploadFile] = File(...), user_id: str = Form("default")):
+    """
+    Upload several custom photos in one request.
+
+    Every photo is validated before any is stored, so a batch with an
+    invalid file is rejected as a whole.
+
+    Args:
+        photos: Photo files (JPEG, PNG, WebP)
+        user_id: User identifier
+
+    Returns:
+        PhotoMetadata for each photo, in upload order
+    """
+    if len(photos) > MAX_PHOTOS_PER_UPLOAD:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many photos: {len(photos)}. Maximum per upload: {MAX_PHOTOS_PER_UPLOAD}"
+        )
+
+    try:
+        logger.info(f"Uploading {len(photos)} photos for user {user_id}")
+
+        # Validate all photos (reads and header checks run concurrently)
+        validated = await media_validator.validate_photos_batch(photos)
+
+        async def process_and_save(photo_data: bytes, sanitized_filename: str) -> PhotoMetadata:
+            # Process photo (resize, create thumbnail, strip EXIF)
+            processed_photo, thumbnail, dimensions = await media_processor.process_photo_async(photo_data)
+            return await media_storage.save_photo_async(
+                user_id=user_id,
+                photo_data=processed_photo,
+                thumbnail_data=thumbnail,
+                filename=sanitized_filename,
+                dimensions=dimensions
+            )
+
+        metadata = await asyncio.gather(
+            *(process_and_save(photo_data, filename) for photo_data, filename in validated)
+        )
+
+        logger.info(f"{len(metadata)} photos uploaded successfully for user {user_id}")
+        return list(metadata)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Photo upload failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Photo upload failed: {str(e)}")
+
+
 @app.post("/api/upload/audio", response_model=AudioMetadata)
 async def upload_audio(audio: UploadFile = File(...), user_id: str = Form("default")):
     """
@@ -2116,6 +2194,47 @@ async def get_user_media(user_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to get user media: {str(e)}")
 
 
+# Uploaded media is stored under fresh unique ids and never rewritten, so the
+# user's browser may reuse it for a while and then revalidate with the ETag /
+# Last-Modified headers FileResponse sends. Personal, deletable media must not
+# sit in shared proxy or CDN caches, hence private and no immutable.
+MEDIA_CACHE_CONTROL = "private, max-age=3600"
+
+
+def media_file_response(kind: str, user_id: str, filename: str, media_type: str) -> FileResponse:
+    """
+    Build the response serving a stored photo or audio file.
+
+    FileResponse streams from the file in the threadpool rather than loading
+    it into memory, and reuses the stat from the lookup for its headers.
+
+    Args:
+        kind: 'photos' or 'audio'
+        user_id: User identifier
+        filename: File name within the user's directory
+        media_type: Content type to serve the file as
+
+    Returns:
+        FileResponse for the file
+
+    Raises:
+        HTTPException: 404 if the file doesn't exist
+    """
+    found = media_storage.find_media_file(kind, user_id, filename)
+    if found is None:
+        label = "Photo" if kind == "photos" else "Audio"
+        raise HTTPException(status_code=404, detail=f"{label} not found")
+
+    path, file_stat = found
+    return FileResponse(
+        path=path,
+        media_type=media_type,
+        filename=filename,
+        stat_result=file_stat,
+        headers={"Cache-Control": MEDIA_CACHE_CONTROL},
+    )
+
+
 @app.get("/api/media/photos/{user_id}/{filename}")
 async def get_photo(user_id: str, filename: str):
     """
@@ -2129,17 +2248,7 @@ async def get_photo(user_id: str, filename: str):
         Photo file
     """
     try:
-        photo_dir = media_storage._get_user_photo_dir(user_id)
-        photo_path = photo_dir / filename
-
-        if not photo_path.exists():
-            raise HTTPException(status_code=404, detail="Photo not found")
-
-        return FileResponse(
-            path=photo_path,
-            media_type="image/jpeg",
-            filename=filename
-        )
+        return media_file_response("photos", user_id, filename, "image/jpeg")
     except HTTPException:
         raise
     except Exception as e:
@@ -2160,17 +2269,7 @@ async def get_audio(user_id: str, filename: str):
         Audio file
     """
     try:
-        audio_dir = media_storage._get_user_audio_dir(user_id)
-        audio_path = audio_dir / filename
-
-        if not audio_path.exists():
-            raise HTTPException(status_code=404, detail="Audio not found")
-
-        return FileResponse(
-            path=audio_path,
-            media_type="audio/mpeg",
-            filename=filename
-        )
+        return media_file_response("audio", user_id, filename, "audio/mpeg")
     except HTTPException:
         raise
     except Exception as e:
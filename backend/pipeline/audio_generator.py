@@ -10,7 +10,7 @@ import logging
 from typing import Callable, Optional, List, Dict
 from pathlib import Path
 import asyncio
-from openai import AsyncOpenAI
+from .openai_client import get_openai_client
 from pydub import AudioSegment
 import replicate
 import os
@@ -42,7 +42,7 @@ class AudioGenerator:
             audio_model: Optional audio model to use (e.g., Tortoise TTS)
             celebrity_audio_samples: Optional dict mapping celebrity names to audio sample paths
         """
-        self.client = AsyncOpenAI(api_key=api_key)
+        self.client = get_openai_client(api_key)
         self.model = "tts-1"
         self.speaker_voice_map = {}
         self.voice_index = 0
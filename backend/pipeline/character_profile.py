@@ -8,7 +8,7 @@ based on celebrity selections. Injects authentic character context into script g
 import logging
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
-from openai import AsyncOpenAI
+from .openai_client import get_openai_client
 
 logger = logging.getLogger(__name__)
 
@@ -144,7 +144,7 @@ class CharacterProfileGenerator:
 
     def __init__(self, api_key: str):
         """Initialize character profile generator."""
-        self.client = AsyncOpenAI(api_key=api_key)
+        self.client = get_openai_client(api_key)
 
     async def generate_character_profile(
         self,
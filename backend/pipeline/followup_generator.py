@@ -7,7 +7,7 @@ Uses GPT-4o-mini for fast, cost-effective question generation (<2s latency).
 
 import logging
 from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
+from .openai_client import get_openai_client
 import json
 import asyncio
 
@@ -119,7 +119,7 @@ class FollowUpQuestionGenerator:
         Args:
             api_key: OpenAI API key
         """
-        self.client = AsyncOpenAI(api_key=api_key)
+        self.client = get_openai_client(api_key)
         self.model = "gpt-4o-mini"  # Fast, cheap model for question generation
 
     async def generate_questions(
@@ -0,0 +1,164 @@
+"""
+Manim Code Cache Module
+
+Semantic lookup for previously validated Manim code. Requests are embedded
+with an OpenAI embedding model and matched by cosine similarity, so
+near-duplicate topics/instructions can reuse code without an LLM round-trip.
+The code itself lives in the exact-match cache directory as {key}.py; this
+module only keeps a small JSON index of embeddings next to it.
+"""
+
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+# Optional: cross-process locking of the index (unavailable on Windows)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class ManimCodeCache:
+    """Embedding-based index over cached Manim code files."""
+
+    EMBEDDING_MODEL = "text-embedding-3-small"
+    SIMILARITY_THRESHOLD = 0.9  # Minimum cosine similarity for a hit
+    TTL_SECONDS = 7 * 24 * 3600  # Entries older than this are ignored and pruned
+    MAX_PROMPT_CHARS = 24000  # Stay under the embedding model's input limit
+
+    def __init__(self, client: AsyncOpenAI, cache_dir: Path):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            client: OpenAI client used for embeddings
+            cache_dir: Directory holding cached {key}.py files
+        """
+        self.client = client
+        self.cache_dir = cache_dir
+        self.index_path = cache_dir / "semantic_index.json"
+        self.lock_path = cache_dir / "semantic_index.lock"
+        self._entries: Optional[List[Dict]] = None
+        self._entries_mtime_ns: Optional[int] = None
+
+    def _load_entries(self, refresh: bool = False) -> List[Dict]:
+        """
+        Load the index, dropping expired entries.
+
+        The parsed index is reused until the file's mtime changes, so entries
+        written by other generator instances or processes are picked up.
+
+        Args:
+            refresh: Re-read the file even if its mtime looks unchanged
+        """
+        try:
+            mtime_ns = self.index_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if refresh or self._entries is None or mtime_ns != self._entries_mtime_ns:
+            entries = []
+            if mtime_ns is not None:
+                try:
+                    entries = json.loads(self.index_path.read_text(encoding="utf-8"))
+                except (json.JSONDecodeError, OSError) as e:
+                    logger.warning(f"Ignoring unreadable semantic cache index: {e}")
+            cutoff = time.time() - self.TTL_SECONDS
+            self._entries = [entry for entry in entries if entry.get("created", 0) >= cutoff]
+            self._entries_mtime_ns = mtime_ns
+        return self._entries
+
+    @contextmanager
+    def _index_lock(self):
+        """Hold an exclusive lock on the index across processes, where supported."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save_entries(self):
+        """
+        Write the index atomically so concurrent readers never see a partial file.
+
+        Each write goes through its own temp file, so concurrent writers can't
+        clobber each other's.
+        """
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, prefix="semantic_index.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(json.dumps(self._entries))
+            os.replace(tmp_name, self.index_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    async def embed(self, prompt: str) -> List[float]:
+        """Embed a cache prompt."""
+        response = await self.client.embeddings.create(
+            model=self.EMBEDDING_MODEL,
+            input=prompt[: self.MAX_PROMPT_CHARS],
+        )
+        return response.data[0].embedding
+
+    async def check(self, prompt: str) -> Tuple[Optional[str], List[float]]:
+        """
+        Find the most similar cached request.
+
+        Args:
+            prompt: Canonical text describing the request
+
+        Returns:
+            Tuple of (cache key of the best match or None, prompt embedding).
+            The embedding is returned so a later store() doesn't re-embed.
+        """
+        embedding = await self.embed(prompt)
+
+        best_key = None
+        best_score = self.SIMILARITY_THRESHOLD
+        for entry in self._load_entries():
+            score = self._cosine_similarity(embedding, entry["embedding"])
+            if score >= best_score and (self.cache_dir / f"{entry['key']}.py").exists():
+                best_key, best_score = entry["key"], score
+
+        if best_key:
+            logger.info(f"Semantic cache hit (similarity {best_score:.3f}): {best_key}")
+        return best_key, embedding
+
+    def store(self, key: str, embedding: List[float]):
+        """
+        Index a cached code file by its request embedding.
+
+        The index on disk is re-read and merged under the lock, so entries
+        stored meanwhile by other instances or processes are kept.
+
+        Args:
+            key: Cache key of the {key}.py file
+            embedding: Embedding returned by check()
+        """
+        with self._index_lock():
+            entries = [entry for entry in self._load_entries(refresh=True) if entry["key"] != key]
+            entries.append({"key": key, "embedding": embedding, "created": time.time()})
+            self._entries = entries
+            self._save_entries()
+            self._entries_mtime_ns = self.index_path.stat().st_mtime_ns
+
+    @staticmethod
+    def _cosine_similarity(a: List[float], b: List[float]) -> float:
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
@@ -6,137 +6,61 @@ Validates generated code and retries with error feedback up to 3 times.
 """
 
 import logging
+from collections import OrderedDict
 from typing import Callable, Optional, List, Dict, Tuple
 from pathlib import Path
 import asyncio
-import subprocess
+import codecs
+import hashlib
+import os
+import sys
 import re
-from openai import AsyncOpenAI
 import json
+import signal
 
-logger = logging.getLogger(__name__)
-
-
-class ManimGenerator:
-    """Generate and validate Manim code with self-fixing loop."""
-
-    MAX_RETRIES = 3
-
-    def __init__(self, api_key: str):
-        """
-        Initialize the Manim generator.
-
-        Args:
-            api_key: OpenAI API key
-        """
-        self.client = AsyncOpenAI(api_key=api_key)
-        self.model = "gpt-4o"
-
-    async def generate_manim_code(
-        self,
-        visual_instructions: List[Dict],
-        topic: str,
-        output_path: Path,
-        target_duration: float = 60.0,
-        progress_callback: Optional[Callable[[str, int], None]] = None,
-    ) -> Path:
-        """
-        Generate Manim code from visual instructions with self-fixing.
-
-        Args:
-            visual_instructions: List of visual instruction segments
-            topic: Educational topic
-            output_path: Path to save the generated Manim Python file
-            progress_callback: Optional callback for progress updates
-
-        Returns:
-            Path to the generated and validated Manim file
-
-        Raises:
-            Exception: If code generation fails after max retries
-        """
-        if progress_callback:
-            progress_callback("Generating Manim code...", 50)
-
-        manim_code = None
-        last_error = None
-        conversation_history = []  # Maintain full conversation with LLM
+from .manim_code_cache import ManimCodeCache
+from .openai_client import get_openai_client
+from .manim_scene_check import find_undefined_names
 
-        for attempt in range(self.MAX_RETRIES):
-            try:
-                logger.info(f"Manim code generation attempt {attempt + 1}/{self.MAX_RETRIES}")
-
-                if progress_callback:
-                    progress_callback(
-                        f"Generating Manim code (attempt {attempt + 1}/{self.MAX_RETRIES})...",
-                        50 + (attempt * 3),
-                    )
-
-                # Generate code (passes conversation history for context)
-                if attempt == 0:
-                    manim_code, conversation_history = await self._generate_initial_code(
-                        visual_instructions, topic, target_duration
-                    )
-                else:
-                    # Fix previous code based on error with FULL conversation context
-                    manim_code, conversation_history = await self._fix_code(
-                        manim_code, last_error, conversation_history, attempt
-                    )
-
-                # ENFORCE canvas bounds - post-process code to add safety measures
-                logger.info("Applying canvas bounds enforcement...")
-                manim_code = self._enforce_canvas_bounds(manim_code)
+logger = logging.getLogger(__name__)
 
-                # Save code
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                await asyncio.to_thread(
-                    output_path.write_text, manim_code, encoding="utf-8"
-                )
+# Helper script that compiles, imports and dry-runs a scene in one subprocess
+SCENE_CHECK_SCRIPT = Path(__file__).parent / "manim_scene_check.py"
 
-                # Validate code (syntax check)
-                is_valid, error_message = await self._validate_code(output_path)
+# Fenced code block in an LLM response (first match is used)
+CODE_BLOCK_RE = re.compile(r"```(?:python)?\s*\n(.*?)```", re.DOTALL)
 
-                if not is_valid:
-                    logger.warning(
-                        f"Syntax validation failed (attempt {attempt + 1}): {error_message}"
-                    )
-                    last_error = f"Syntax Error:\n{error_message}"
-                    continue
+# Structural landmarks every generated scene needs; scanned in a single pass
+STRUCTURE_RE = re.compile(
+    r"(?P<imports>from manim import|import manim)"
+    r"|(?P<scene>class\s+\w+\([^)]*Scene[^)]*\))"
+    r"|(?P<construct>def construct)"
+)
 
-                # Test render to catch runtime errors
-                test_valid, test_error = await self._test_render(output_path)
+# Manim stderr line signalling a fatal error (traceback header or "XxxError: ...")
+RENDER_ERROR_RE = re.compile(r"Traceback|^[\s│|]*\w*(?:Error|Exception):")
 
-                if test_valid:
-                    logger.info("Manim code generated and validated successfully")
-                    if progress_callback:
-                        progress_callback("Manim code validated successfully", 59)
-                    return output_path
+# Manim's per-animation progress bar prefix ("Animation 3: FadeIn(...)")
+RENDER_PROGRESS_RE = re.compile(r"Animation (\d+)")
 
-                logger.warning(
-                    f"Runtime validation failed (attempt {attempt + 1}): {test_error}"
-                )
-                last_error = f"Runtime Error:\n{test_error}"
+# Calls that each produce one "Animation N" progress bar
+ANIMATION_CALL_RE = re.compile(r"\bself\.(?:play|wait)\(")
 
-            except Exception as e:
-                # Catch exceptions during this attempt but continue loop
-                logger.warning(f"Exception during attempt {attempt + 1}: {e}")
-                last_error = f"Exception:\n{str(e)}"
-                continue
+# Layout checks run on every generated candidate in _validate_code
+COMMENT_RE = re.compile(r"#.*$", re.MULTILINE)
+LONG_TEXT_RE = re.compile(r'Text\(["\']([^"\']{50,})["\']')
+POSITION_MULTIPLIER_RE = re.compile(r"(?:move_to|shift)\([^)]*?([-\d.]+)\s*\*\s*(?:UP|DOWN|LEFT|RIGHT)")
 
-        # Max retries exceeded
-        error_msg = f"Failed to generate valid Manim code after {self.MAX_RETRIES} attempts. Last error: {last_error}"
-        logger.error(error_msg)
-        raise Exception(error_msg)
+# "line N" reference in a scene check error
+ERROR_LINE_RE = re.compile(r"line (\d+)")
 
-    async def _generate_initial_code(
-        self, visual_instructions: List[Dict], topic: str, target_duration: float = 60.0
-    ) -> Tuple[str, List[Dict]]:
-        """Generate initial Manim code from visual instructions.
+# "# SCENE <n>" marker opening each scene block in construct()
+SCENE_MARKER_RE = re.compile(r"\s*# SCENE (\d+)\s*$")
 
-        Returns:
-            Tuple of (generated_code, conversation_history)
-        """
-        system_prompt = """Generate Manim code for an educational animation.
+# Static system prompt for initial generation. Kept as a module constant so the
+# exact same bytes lead every request and OpenAI's automatic prefix caching
+# can reuse it across attempts and runs.
+MANIM_SYSTEM_PROMPT = """Generate Manim code for an educational animation.
 
 CRITICAL - NO TEXT OBJECTS (SUBTITLES HANDLE NARRATION):
 - ⛔ NEVER use Text() objects for narration or explanations - subtitles already show spoken words!
@@ -541,8 +465,737 @@ CRITICAL - TEXT/MATH RENDERING:
 - MathTex handles LaTeX math mode automatically
 - Example: MathTex(r"E = mc^2"), MathTex(r"6CO_2 + 6H_2O")
 
-Return ONLY Python code."""
+SCENE MARKERS:
+- Start each scene's code inside construct() with a marker comment on its own line: # SCENE <n>
+  (n = 1-based scene number, indented like the surrounding construct() body)
+- Fixes may rewrite a single scene block, so keep each scene's code below its marker
+
+Return ONLY a JSON object of the form {"code": "<complete Python source>"}."""
+
+MANIM_FIX_REMINDERS = """Key reminders:
+- Subtitles handle narration - don't create Text() for dialogue/explanations
+- Only use MathTex for equations, Text for short 1-3 word labels
+- Don't use object indexing (obj[0], obj[2]) - animate whole objects instead
+- Use Create/FadeIn/FadeOut instead of Transform to avoid issues"""
+
+# Static part of the fix prompt. Sent before the variable error/code so the
+# cached prefix extends as far as possible on retries.
+MANIM_FIX_INSTRUCTIONS = f"""The code you generated has an error. Analyze the error and fix the code.
+
+{MANIM_FIX_REMINDERS}
+
+Return ONLY a JSON object of the form {{"code": "<complete fixed Python source>"}}, no explanations."""
+
+# Fix prompt used when the error falls inside one "# SCENE <n>" block: only
+# that block is regenerated and spliced back into the file
+MANIM_SCENE_FIX_INSTRUCTIONS = f"""The code you generated has an error inside one scene block. Analyze the error and rewrite ONLY that scene block.
+
+{MANIM_FIX_REMINDERS}
+- Every object used from earlier scenes already exists; keep names of objects later scenes use
+- Keep the "# SCENE <n>" marker as the first line and the original indentation (no line numbers)
+
+Return ONLY a JSON object of the form {{"code": "<replacement scene block>"}}, no explanations."""
+
+# Structured output schema for every code response
+CODE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "manim_code",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"code": {"type": "string"}},
+            "required": ["code"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+# Process-wide cap on in-flight chat completions across all generators and
+# pipeline runs, sized to the account's rate limits so bursts queue here
+# instead of triggering 429 retry storms
+_LLM_SLOTS: Optional[asyncio.Semaphore] = None
+
+
+def _get_llm_slots() -> asyncio.Semaphore:
+    """Return the shared completion semaphore, creating it on first use."""
+    # Created inside the running loop: on Python 3.9 a semaphore binds the
+    # loop current at construction, which at import time is not the server's
+    global _LLM_SLOTS
+    if _LLM_SLOTS is None:
+        _LLM_SLOTS = asyncio.Semaphore(int(os.getenv("OPENAI_CONCURRENCY", "8")))
+    return _LLM_SLOTS
+
+
+class SceneCheckWorker:
+    """
+    Long-lived manim_scene_check.py --worker process.
+
+    Importing manim and initializing Cairo costs 1-2s per interpreter, so a
+    single warm process serves every scene check. Requests are serialized
+    with a lock. Each check runs in a child forked from the warm worker, so
+    scene state never leaks between checks; the worker is still restarted
+    after a timeout, a crash, or MAX_CHECKS checks as a backstop where fork()
+    is unavailable.
+    """
+
+    MAX_CHECKS = 50
+
+    def __init__(self):
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+        self._checks = 0
+
+    async def _ensure_started(self):
+        if self._proc is not None and self._proc.returncode is None and self._checks < self.MAX_CHECKS:
+            return
+        await self._stop()
+        logger.info("Starting Manim scene check worker")
+        self._proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", str(SCENE_CHECK_SCRIPT), "--worker",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        self._checks = 0
+
+    async def check(self, code_path: str, scene_name: str, timeout: float) -> Tuple[bool, Optional[str]]:
+        """
+        Dry-run a scene in the worker.
+
+        Returns:
+            Tuple of (is_valid, error_message)
+        """
+        async with self._lock:
+            try:
+                await self._ensure_started()
+                request = json.dumps({"path": code_path, "scene": scene_name, "timeout": timeout}) + "\n"
+                self._proc.stdin.write(request.encode("utf-8"))
+                await self._proc.stdin.drain()
+                line = await asyncio.wait_for(self._proc.stdout.readline(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await self._stop()
+                return False, "Test render timeout"
+            except Exception as e:
+                await self._stop()
+                logger.error(f"Scene check worker error: {e}")
+                return False, f"Scene check error: {str(e)}"
+
+            self._checks += 1
+            if not line:
+                await self._stop()
+                return False, "Scene check worker exited unexpectedly"
+
+            result = json.loads(line)
+            return result["ok"], result.get("error")
+
+    async def _stop(self):
+        if self._proc is not None and self._proc.returncode is None:
+            # Kill the whole group: the child forked for a timed-out check
+            # would otherwise keep running after the worker
+            try:
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await self._proc.wait()
+        self._proc = None
+
+    async def close(self):
+        """Stop the worker process."""
+        async with self._lock:
+            await self._stop()
+
+
+class SceneCheckPool:
+    """
+    Pool of SceneCheckWorker processes so concurrent pipeline runs don't
+    queue behind a single worker.
+
+    Idle workers are handed out LIFO, so under light load the same warm
+    process is reused and extra workers only start when checks overlap.
+    """
+
+    def __init__(self, size: int):
+        self._workers = [SceneCheckWorker() for _ in range(size)]
+        self._idle: asyncio.LifoQueue = asyncio.LifoQueue()
+        for worker in reversed(self._workers):
+            self._idle.put_nowait(worker)
+
+    async def check(self, code_path: str, scene_name: str, timeout: float) -> Tuple[bool, Optional[str]]:
+        """Dry-run a scene on the next idle worker."""
+        worker = await self._idle.get()
+        try:
+            return await worker.check(code_path, scene_name, timeout)
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def close(self):
+        """Stop every worker process."""
+        for worker in self._workers:
+            await worker.close()
+
+
+_SCENE_POOL: Optional[SceneCheckPool] = None
+
+
+def _get_scene_pool() -> SceneCheckPool:
+    """Return the shared scene check pool, creating it on first use."""
+    global _SCENE_POOL
+    if _SCENE_POOL is None:
+        size = int(os.getenv("MANIM_CHECK_WORKERS", min(4, os.cpu_count() or 1)))
+        _SCENE_POOL = SceneCheckPool(max(1, size))
+    return _SCENE_POOL
+
+
+class ManimGenerator:
+    """Generate and validate Manim code with self-fixing loop."""
+
+    MAX_RETRIES = 3
+    SPECULATIVE_PREFETCH = True  # Regenerate in parallel with the scene check
+    PARALLEL_CANDIDATES = ((0.3, 1), (0.7, 2))  # (temperature, seed) for first attempt
+    MAX_CONCURRENT_COMPLETIONS = 2  # In-flight LLM calls per generator
+    STREAM_PROGRESS_EVERY = 50  # Report streaming progress every N chunks
+    EXPECTED_CODE_CHARS = 12000  # Rough size of a full scene, for progress estimates
+    RENDER_ERROR_GRACE_SECONDS = 5  # Wait before terminating a render that hit an error
+    RENDER_MEMO_SIZE = 64  # Scene check results remembered per generator
+    FIX_CONTEXT_LINES = 30  # Lines of code sent either side of an error line
+
+    def __init__(self, api_key: str, cache_dir: Optional[Path] = None):
+        """
+        Initialize the Manim generator.
+
+        Args:
+            api_key: OpenAI API key
+            cache_dir: Optional directory for caching validated code
+                (defaults to the MANIM_CACHE_DIR env var; caching is off if unset)
+        """
+        self.client = get_openai_client(api_key)
+        self.model = "gpt-4o"
+
+        # Exact-match cache of validated code keyed by a hash of the inputs
+        cache_dir = cache_dir or os.getenv("MANIM_CACHE_DIR")
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Optional semantic lookup on top of the exact-match cache
+        self.semantic_cache = None
+        if self.cache_dir and os.getenv("MANIM_SEMANTIC_CACHE", "").lower() in ("1", "true", "yes"):
+            self.semantic_cache = ManimCodeCache(self.client, self.cache_dir)
+
+        # Deterministic sampling when caching so re-runs reproduce cached output
+        self.temperature = 0.0 if self.cache_dir else 0.7
+
+        # sha256(code) -> (is_valid, error) for recent scene checks
+        self._render_results: OrderedDict = OrderedDict()
+
+        # Bound speculative fan-out (parallel candidates + prefetch) per generator
+        self._completion_slots = asyncio.Semaphore(self.MAX_CONCURRENT_COMPLETIONS)
+
+    @staticmethod
+    async def close_shared_resources():
+        """Stop the shared scene check workers (call on shutdown)."""
+        if _SCENE_POOL is not None:
+            await _SCENE_POOL.close()
+
+    async def generate_manim_code(
+        self,
+        visual_instructions: List[Dict],
+        topic: str,
+        output_path: Path,
+        target_duration: float = 60.0,
+        progress_callback: Optional[Callable[[str, int], None]] = None,
+        use_cache: bool = True,
+    ) -> Path:
+        """
+        Generate Manim code from visual instructions with self-fixing.
+
+        Args:
+            visual_instructions: List of visual instruction segments
+            topic: Educational topic
+            output_path: Path to save the generated Manim Python file
+            progress_callback: Optional callback for progress updates
+            use_cache: Whether to reuse cached code (a successful run always
+                refreshes the cache entry)
+
+        Returns:
+            Path to the generated and validated Manim file
+
+        Raises:
+            Exception: If code generation fails after max retries
+        """
+        if progress_callback:
+            progress_callback("Generating Manim code...", 50)
+
+        # The output directory doesn't change between attempts; create it once
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        cache_path = None
+        semantic_embedding = None
+        if self.cache_dir:
+            cache_path = self.cache_dir / f"{self._cache_key(visual_instructions, topic, target_duration)}.py"
+            if use_cache and await self._load_from_cache(cache_path, output_path):
+                if progress_callback:
+                    progress_callback("Manim code loaded from cache", 59)
+                return output_path
+
+        if self.semantic_cache and use_cache:
+            # Near-duplicate requests can reuse code validated for a similar one.
+            # Skipped entirely when bypassing the cache, so no embedding call
+            # is made (and a success just refreshes the exact-match entry).
+            try:
+                prompt = self._semantic_prompt(visual_instructions, topic, target_duration)
+                match_key, semantic_embedding = await self.semantic_cache.check(prompt)
+                if match_key and await self._load_from_cache(
+                    self.cache_dir / f"{match_key}.py", output_path
+                ):
+                    if progress_callback:
+                        progress_callback("Manim code loaded from semantic cache", 59)
+                    return output_path
+            except Exception as e:
+                logger.warning(f"Semantic cache lookup failed: {e}")
+
+        manim_code = None
+        last_error = None
+        conversation_history = []  # Maintain full conversation with LLM
+        candidate_tasks = []  # Parallel initial generations
+        prefetch_task = None  # Speculative regeneration started during the scene check
+        failed_codes = set()  # sha256 of every candidate that failed a check
+
+        try:
+            for attempt in range(self.MAX_RETRIES):
+                try:
+                    logger.info(f"Manim code generation attempt {attempt + 1}/{self.MAX_RETRIES}")
+
+                    if progress_callback:
+                        progress_callback(
+                            f"Generating Manim code (attempt {attempt + 1}/{self.MAX_RETRIES})...",
+                            50 + (attempt * 3),
+                        )
+
+                    if attempt == 0:
+                        # Race several initial generations with different sampling
+                        # settings and check each as soon as it arrives; when
+                        # caching, one deterministic generation so re-runs
+                        # reproduce the cached output
+                        candidates = (
+                            ((self.temperature, self.PARALLEL_CANDIDATES[0][1]),)
+                            if self.cache_dir else self.PARALLEL_CANDIDATES
+                        )
+                        candidate_tasks = [
+                            asyncio.create_task(
+                                self._generate_initial_code(
+                                    visual_instructions,
+                                    topic,
+                                    target_duration,
+                                    temperature=temperature,
+                                    seed=seed,
+                                    progress_callback=progress_callback,
+                                )
+                            )
+                            for temperature, seed in candidates
+                        ]
+                        for index, next_candidate in enumerate(asyncio.as_completed(candidate_tasks)):
+                            try:
+                                candidate_code, candidate_history = await next_candidate
+                            except Exception as e:
+                                logger.warning(f"Initial candidate failed: {e}")
+                                # An earlier candidate's error stays paired with
+                                # its code, which is what the next attempt fixes
+                                if manim_code is None:
+                                    last_error = f"Exception:\n{str(e)}"
+                                continue
+
+                            try:
+                                candidate_code, candidate_error = await self._save_and_validate(
+                                    candidate_code, output_path
+                                )
+                                if candidate_error is None:
+                                    # Nothing else is in flight while the last
+                                    # candidate is checked, so overlap it with a
+                                    # speculative regeneration; the next attempt
+                                    # still fixes the real error alongside it
+                                    if index == len(candidate_tasks) - 1:
+                                        prefetch_task = self._start_prefetch(
+                                            visual_instructions, topic, target_duration, attempt
+                                        )
+                                    candidate_error = await self._check_runtime(
+                                        output_path, candidate_code
+                                    )
+                            except Exception as e:
+                                logger.warning(f"Checking initial candidate failed: {e}")
+                                candidate_error = f"Exception:\n{str(e)}"
+
+                            if candidate_error is None:
+                                return await self._accept_code(
+                                    candidate_code, output_path, cache_path, progress_callback,
+                                    semantic_embedding,
+                                )
+                            failed_codes.add(self._code_digest(candidate_code))
+                            manim_code, conversation_history, last_error = (
+                                candidate_code, candidate_history, candidate_error
+                            )
+                        continue
+
+                    # Start fixing the actual error (static or runtime) right
+                    # away, with FULL conversation context; only regenerate
+                    # from scratch if no candidate was ever produced
+                    if manim_code is None:
+                        fix_task = asyncio.create_task(
+                            self._generate_initial_code(visual_instructions, topic, target_duration)
+                        )
+                    else:
+                        fix_task = asyncio.create_task(
+                            self._fix_code(
+                                manim_code, last_error, conversation_history, attempt,
+                                progress_callback=progress_callback,
+                            )
+                        )
+                    try:
+                        if prefetch_task is not None:
+                            # Check the regeneration that ran alongside the failed
+                            # scene check while the fix streams
+                            task, prefetch_task = prefetch_task, None
+                            prefetched_code = await self._check_prefetched(
+                                task, output_path, failed_codes
+                            )
+                            if prefetched_code is not None:
+                                return await self._accept_code(
+                                    prefetched_code, output_path, cache_path, progress_callback,
+                                    semantic_embedding,
+                                )
+                        fixed_code, fixed_history = await fix_task
+                    except Exception as e:
+                        # The code didn't change, so its last error still applies
+                        logger.warning(f"Fix request failed on attempt {attempt + 1}: {e}")
+                        continue
+                    finally:
+                        fix_task.cancel()
+
+                    try:
+                        fixed_code, fixed_error = await self._save_and_validate(fixed_code, output_path)
+                        if fixed_error is None:
+                            # The scene check takes seconds, so overlap it with the
+                            # next attempt's LLM call; cancelled if the check passes
+                            prefetch_task = self._start_prefetch(
+                                visual_instructions, topic, target_duration, attempt
+                            )
+                            fixed_error = await self._check_runtime(output_path, fixed_code)
+                    except Exception as e:
+                        logger.warning(f"Checking fixed code failed on attempt {attempt + 1}: {e}")
+                        fixed_error = f"Exception:\n{str(e)}"
+
+                    if fixed_error is None:
+                        return await self._accept_code(
+                            fixed_code, output_path, cache_path, progress_callback,
+                            semantic_embedding,
+                        )
+                    failed_codes.add(self._code_digest(fixed_code))
+                    manim_code, conversation_history, last_error = (
+                        fixed_code, fixed_history, fixed_error
+                    )
+
+                except Exception as e:
+                    # Catch exceptions during this attempt but continue loop
+                    logger.warning(f"Exception during attempt {attempt + 1}: {e}")
+                    if manim_code is None:
+                        last_error = f"Exception:\n{str(e)}"
+                    continue
+        finally:
+            for task in candidate_tasks:
+                task.cancel()
+            if prefetch_task is not None:
+                prefetch_task.cancel()
+
+        # Max retries exceeded
+        error_msg = f"Failed to generate valid Manim code after {self.MAX_RETRIES} attempts. Last error: {last_error}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+
+    def _start_prefetch(
+        self,
+        visual_instructions: List[Dict],
+        topic: str,
+        target_duration: float,
+        attempt: int,
+    ) -> Optional[asyncio.Task]:
+        """Start a speculative regeneration for the next attempt, if there is one."""
+        if not self.SPECULATIVE_PREFETCH or attempt + 1 >= self.MAX_RETRIES:
+            return None
+        return asyncio.create_task(
+            self._generate_initial_code(visual_instructions, topic, target_duration)
+        )
+
+    async def _check_prefetched(
+        self, task: asyncio.Task, output_path: Path, failed_codes: set
+    ) -> Optional[str]:
+        """
+        Validate a speculative regeneration once it finishes.
+
+        Skipped when it reproduces code that already failed, which is common
+        with deterministic (cached) sampling.
+
+        Args:
+            task: Prefetch task from _start_prefetch()
+            output_path: Path to save the Manim Python file
+            failed_codes: Digests of candidates that already failed a check
+
+        Returns:
+            The validated code, or None if it is unusable
+        """
+        try:
+            code, _ = await task
+        except Exception as e:
+            logger.warning(f"Prefetched regeneration failed: {e}")
+            return None
+
+        if self._code_digest(self._enforce_canvas_bounds(code)) in failed_codes:
+            logger.info("Prefetched regeneration repeats failed code, skipping it")
+            return None
+
+        logger.info("Checking speculatively prefetched regeneration")
+        try:
+            code, error = await self._save_and_validate(code, output_path)
+            if error is None:
+                error = await self._check_runtime(output_path, code)
+        except Exception as e:
+            logger.warning(f"Checking prefetched regeneration failed: {e}")
+            error = f"Exception:\n{str(e)}"
+        if error is not None:
+            failed_codes.add(self._code_digest(code))
+            return None
+        return code
+
+    async def generate_manim_code_batch(
+        self,
+        jobs: List[Dict],
+        poll_interval: float = 60.0,
+    ) -> List[Optional[Path]]:
+        """
+        Generate Manim code for many jobs through the OpenAI Batch API.
+
+        Intended for offline/bulk generation where a 24h turnaround is fine:
+        batch requests cost half as much and use a separate rate-limit pool.
+        Each batched result is validated like an interactive attempt; jobs whose
+        batched code fails fall back to the interactive self-fixing loop.
+
+        Args:
+            jobs: List of dicts with "visual_instructions", "topic", "output_path"
+                and optional "target_duration"
+            poll_interval: Seconds between batch status polls
+
+        Returns:
+            List of paths to validated Manim files (None where a job failed),
+            in the same order as jobs
+
+        Raises:
+            Exception: If the batch itself fails, expires or is cancelled
+        """
+        requests = []
+        for i, job in enumerate(jobs):
+            messages = self._build_initial_messages(
+                job["visual_instructions"], job["topic"], job.get("target_duration", 60.0)
+            )
+            requests.append(json.dumps({
+                "custom_id": f"job-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": messages,
+                    "temperature": self.temperature,
+                    "response_format": CODE_RESPONSE_FORMAT,
+                },
+            }))
+
+        batch_file = await self.client.files.create(
+            file=("manim_batch.jsonl", "\n".join(requests).encode("utf-8")),
+            purpose="batch",
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        logger.info(f"Submitted Manim batch {batch.id} with {len(jobs)} jobs")
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+            logger.info(f"Manim batch {batch.id} status: {batch.status}")
+
+        if batch.status != "completed":
+            raise Exception(f"Manim batch {batch.id} did not complete: {batch.status}")
+
+        responses = {}
+        if batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    responses[record["custom_id"]] = record
+
+        async def finish_job(i: int, job: Dict) -> Optional[Path]:
+            output_path = Path(job["output_path"])
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            record = responses.get(f"job-{i}")
+            try:
+                if record and record.get("response", {}).get("status_code") == 200:
+                    content = record["response"]["body"]["choices"][0]["message"]["content"]
+                    code = self._parse_code_response(content)
+                    code, error = await self._save_and_validate(code, output_path)
+                    if error is None:
+                        error = await self._check_runtime(output_path, code)
+                    if error is None:
+                        logger.info(f"Batched Manim code for job {i} validated")
+                        return output_path
+                    logger.warning(f"Batched Manim code for job {i} failed, falling back: {error}")
+                else:
+                    logger.warning(f"No usable batch response for job {i}, falling back")
+
+                return await self.generate_manim_code(
+                    visual_instructions=job["visual_instructions"],
+                    topic=job["topic"],
+                    output_path=output_path,
+                    target_duration=job.get("target_duration", 60.0),
+                )
+            except Exception as e:
+                logger.error(f"Manim generation failed for batch job {i}: {e}")
+                return None
+
+        return await asyncio.gather(*(finish_job(i, job) for i, job in enumerate(jobs)))
+
+    async def _save_and_validate(
+        self, manim_code: str, output_path: Path
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Enforce canvas bounds on a candidate, save it and run the static checks.
+
+        Args:
+            manim_code: Generated Manim code
+            output_path: Path to save the Manim Python file
+
+        Returns:
+            Tuple of (processed_code, error_message or None if valid)
+        """
+        # ENFORCE canvas bounds - post-process code to add safety measures
+        logger.info("Applying canvas bounds enforcement...")
+        manim_code = self._enforce_canvas_bounds(manim_code)
 
+        # Save code. A few KB of text on a warm page cache is cheaper to write
+        # directly than to schedule on the default thread pool. Callers create
+        # the parent directory once up front.
+        output_path.write_text(manim_code, encoding="utf-8")
+
+        # Validate code (syntax, structure and canvas checks)
+        is_valid, error_message = self._validate_code(output_path, manim_code)
+        if not is_valid:
+            logger.warning(f"Validation failed: {error_message}")
+            return manim_code, f"Validation Error:\n{error_message}"
+
+        return manim_code, None
+
+    @staticmethod
+    def _code_digest(manim_code: str) -> str:
+        """Hash code for the scene check memo and failed-candidate tracking."""
+        return hashlib.sha256(manim_code.encode("utf-8")).hexdigest()
+
+    async def _check_runtime(self, output_path: Path, manim_code: str) -> Optional[str]:
+        """
+        Run the scene check and return a formatted error, or None if it passed.
+
+        Results are memoized by a hash of the code, so a fixer that returns
+        byte-identical code does not pay for another scene check.
+        """
+        digest = self._code_digest(manim_code)
+        if digest in self._render_results:
+            self._render_results.move_to_end(digest)
+            logger.info("Scene check result reused for identical code")
+            test_valid, test_error = self._render_results[digest]
+        else:
+            # Compile, import and dry-run the scene to catch syntax/runtime errors
+            test_valid, test_error = await self._test_render(output_path)
+            self._render_results[digest] = (test_valid, test_error)
+            if len(self._render_results) > self.RENDER_MEMO_SIZE:
+                self._render_results.popitem(last=False)
+
+        if test_valid:
+            return None
+
+        logger.warning(f"Runtime validation failed: {test_error}")
+        return f"Runtime Error:\n{test_error}"
+
+    async def _accept_code(
+        self,
+        manim_code: str,
+        output_path: Path,
+        cache_path: Optional[Path],
+        progress_callback: Optional[Callable[[str, int], None]],
+        semantic_embedding: Optional[List[float]] = None,
+    ) -> Path:
+        """Record validated code in the cache(s) and report success."""
+        logger.info("Manim code generated and validated successfully")
+        if cache_path:
+            cache_path.write_text(manim_code, encoding="utf-8")
+            if self.semantic_cache and semantic_embedding:
+                self.semantic_cache.store(cache_path.stem, semantic_embedding)
+        if progress_callback:
+            progress_callback("Manim code validated successfully", 59)
+        return output_path
+
+    def _cache_key(
+        self, visual_instructions: List[Dict], topic: str, target_duration: float
+    ) -> str:
+        """Hash the normalized generation inputs into a cache key."""
+        payload = json.dumps(
+            {"topic": topic, "dur": target_duration, "instr": visual_instructions},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _semantic_prompt(
+        self, visual_instructions: List[Dict], topic: str, target_duration: float
+    ) -> str:
+        """Canonical text embedded for semantic cache lookups."""
+        instructions = json.dumps(visual_instructions, sort_keys=True, separators=(",", ":"))
+        return f"{topic}\n{instructions}\n{target_duration}"
+
+    async def _load_from_cache(self, cache_path: Path, output_path: Path) -> bool:
+        """
+        Copy cached code to output_path if it still validates.
+
+        Args:
+            cache_path: Path to the cached Manim file
+            output_path: Path to save the Manim Python file
+
+        Returns:
+            True if the cached code was used
+        """
+        if not cache_path.exists():
+            return False
+
+        logger.info(f"Found cached Manim code: {cache_path}")
+        cached_code = cache_path.read_text(encoding="utf-8")
+
+        output_path.write_text(cached_code, encoding="utf-8")
+
+        is_valid, error_message = self._validate_code(output_path, cached_code)
+        if is_valid:
+            is_valid, error_message = await self._test_render(output_path)
+
+        if not is_valid:
+            logger.warning(f"Cached Manim code no longer validates, regenerating: {error_message}")
+            return False
+
+        logger.info("Using cached Manim code")
+        return True
+
+    def _build_initial_messages(
+        self, visual_instructions: List[Dict], topic: str, target_duration: float
+    ) -> List[Dict]:
+        """Build the system + user messages for an initial generation request."""
         # Format instructions with clear timestamp information
         instructions_with_timing = []
         for inst in visual_instructions:
@@ -562,7 +1215,12 @@ Return ONLY Python code."""
             }
             instructions_with_timing.append(timing_info)
 
-        instructions_json = json.dumps(instructions_with_timing, indent=2)
+        # Canonical compact form: indentation only costs prompt tokens, and
+        # sorted keys make identical instructions produce identical bytes so
+        # repeat requests hit the provider's prefix cache
+        instructions_json = json.dumps(
+            instructions_with_timing, sort_keys=True, separators=(",", ":")
+        )
 
         # Extract word_sync data from instructions
         has_word_sync = any(inst.get("word_sync") for inst in visual_instructions)
@@ -595,27 +1253,48 @@ Technical specs:
 - Class name: EducationalScene
 - Follow the "description" and "manim_elements" for each scene"""
 
-        logger.info("Generating initial Manim code")
-
-        # Build conversation history
-        messages = [
-            {"role": "system", "content": system_prompt},
+        return [
+            {"role": "system", "content": MANIM_SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt},
         ]
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=0.7,
-        )
+    async def _generate_initial_code(
+        self,
+        visual_instructions: List[Dict],
+        topic: str,
+        target_duration: float = 60.0,
+        temperature: Optional[float] = None,
+        seed: Optional[int] = None,
+        progress_callback: Optional[Callable[[str, int], None]] = None,
+    ) -> Tuple[str, List[Dict]]:
+        """Generate initial Manim code from visual instructions.
 
-        code = response.choices[0].message.content
+        Args:
+            temperature: Sampling temperature (defaults to self.temperature)
+            seed: Optional sampling seed to diversify parallel candidates
+            progress_callback: Optional callback for streaming progress updates
+
+        Returns:
+            Tuple of (generated_code, conversation_history)
+        """
+        logger.info("Generating initial Manim code")
+
+        # Build conversation history
+        messages = self._build_initial_messages(visual_instructions, topic, target_duration)
+
+        code = await self._stream_completion(
+            messages,
+            temperature=self.temperature if temperature is None else temperature,
+            seed=seed,
+            progress_callback=progress_callback,
+            progress_base=50,
+        )
 
         # Add assistant response to conversation history
         messages.append({"role": "assistant", "content": code})
 
-        # Extract code from markdown if present
-        code = self._extract_code_from_markdown(code)
+        # Pull the source out of the JSON response
+        code = self._parse_code_response(code)
 
         logger.debug(f"Generated code length: {len(code)} characters")
         return code, messages
@@ -626,6 +1305,7 @@ Technical specs:
         error_message: str,
         conversation_history: List[Dict],
         attempt: int,
+        progress_callback: Optional[Callable[[str, int], None]] = None,
     ) -> Tuple[str, List[Dict]]:
         """Fix Manim code based on error feedback with full conversation context.
 
@@ -634,54 +1314,176 @@ Technical specs:
             error_message: The error that occurred
             conversation_history: Full conversation with LLM (maintains context)
             attempt: Current attempt number
+            progress_callback: Optional callback for streaming progress updates
 
         Returns:
             Tuple of (fixed_code, updated_conversation_history)
         """
+        lines = broken_code.splitlines()
+        line_match = ERROR_LINE_RE.search(error_message)
+        error_line = int(line_match.group(1)) if line_match else None
+        scene_block = self._find_scene_block(lines, error_line) if error_line else None
+
+        if scene_block:
+            # Regenerate only the failing scene; far fewer output tokens than
+            # rewriting the whole file
+            start, end = scene_block
+            instructions = MANIM_SCENE_FIX_INSTRUCTIONS
+            failed_code = "\n".join(lines[start:end])
+            code_label = f"FAILED SCENE BLOCK (lines {start + 1}-{end} of {len(lines)})"
+        else:
+            # The full code is already in the conversation as the previous reply,
+            # so only resend the region around the error when we know where it is
+            instructions = MANIM_FIX_INSTRUCTIONS
+            failed_code = broken_code
+            code_label = "FAILED CODE"
+            if error_line and len(lines) > 2 * self.FIX_CONTEXT_LINES:
+                start = max(0, error_line - 1 - self.FIX_CONTEXT_LINES)
+                end = min(len(lines), error_line + self.FIX_CONTEXT_LINES)
+                failed_code = "\n".join(
+                    f"{number}: {line}"
+                    for number, line in enumerate(lines[start:end], start=start + 1)
+                )
+                code_label = (
+                    f"FAILED CODE (lines {start + 1}-{end} of {len(lines)} around the error, "
+                    f"with line numbers; return the COMPLETE fixed file)"
+                )
+
         # Continue the conversation with the error as user feedback
-        error_prompt = f"""The code you generated has an error. Here's what happened:
+        # Static instructions first, variable error/code strictly at the end
+        error_prompt = f"""{instructions}
+
+This is attempt {attempt + 1}/3.
 
 ERROR:
 {error_message}
 
-FAILED CODE:
+{code_label}:
 ```python
-{broken_code}
-```
-
-This is attempt {attempt + 1}/3. Analyze the error and fix the code.
-
-Key reminders:
-- Subtitles handle narration - don't create Text() for dialogue/explanations
-- Only use MathTex for equations, Text for short 1-3 word labels
-- Don't use object indexing (obj[0], obj[2]) - animate whole objects instead
-- Use Create/FadeIn/FadeOut instead of Transform to avoid issues
-
-Return ONLY the fixed Python code, no explanations."""
+{failed_code}
+```"""
 
-        logger.info(f"Fixing Manim code based on error (attempt {attempt + 1})")
+        logger.info(
+            f"Fixing Manim code based on error (attempt {attempt + 1}"
+            f"{', scene block only' if scene_block else ''})"
+        )
 
         # Add error feedback to conversation history (continue the conversation)
         conversation_history.append({"role": "user", "content": error_prompt})
 
         # Continue conversation with full context
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=conversation_history,  # Full conversation history!
-            temperature=0.7,
+        response = await self._stream_completion(
+            conversation_history,  # Full conversation history!
+            temperature=self.temperature,
+            progress_callback=progress_callback,
+            progress_base=50 + (attempt * 3),
         )
 
-        fixed_code = response.choices[0].message.content
+        # Pull the source out of the JSON response
+        fixed_code = self._parse_code_response(response)
 
-        # Add assistant's fix to conversation history
-        conversation_history.append({"role": "assistant", "content": fixed_code})
+        if scene_block:
+            start, end = scene_block
+            fixed_code = "\n".join(lines[:start] + fixed_code.splitlines() + lines[end:])
+            # Record the whole stitched file so later fixes can keep assuming
+            # the previous reply holds the current code
+            response = json.dumps({"code": fixed_code})
 
-        # Extract code from markdown if present
-        fixed_code = self._extract_code_from_markdown(fixed_code)
+        # Add assistant's fix to conversation history
+        conversation_history.append({"role": "assistant", "content": response})
 
         logger.debug(f"Fixed code attempt {attempt + 1}, length: {len(fixed_code)} characters")
         return fixed_code, conversation_history
 
+    @staticmethod
+    def _find_scene_block(lines: List[str], error_line: int) -> Optional[Tuple[int, int]]:
+        """
+        Locate the "# SCENE <n>" block containing an error line.
+
+        Args:
+            lines: Source lines of the failing file
+            error_line: 1-based line number reported by the scene check
+
+        Returns:
+            (start, end) line indices of the block (end exclusive), or None if
+            the file has no markers or the error is outside every block
+        """
+        markers = [i for i, line in enumerate(lines) if SCENE_MARKER_RE.match(line)]
+        error_index = error_line - 1
+        for position, start in enumerate(markers):
+            end = markers[position + 1] if position + 1 < len(markers) else len(lines)
+            if start <= error_index < end:
+                return start, end
+        return None
+
+    async def _stream_completion(
+        self,
+        messages: List[Dict],
+        temperature: float,
+        seed: Optional[int] = None,
+        progress_callback: Optional[Callable[[str, int], None]] = None,
+        progress_base: int = 50,
+    ) -> str:
+        """
+        Stream a JSON-mode chat completion, reporting progress as it arrives.
+
+        Args:
+            messages: Conversation to send
+            temperature: Sampling temperature
+            seed: Optional sampling seed
+            progress_callback: Optional callback for progress updates
+            progress_base: Progress value to report while streaming
+
+        Returns:
+            The response text (a JSON object with a "code" field)
+        """
+        async with self._completion_slots, _get_llm_slots():
+            return await self._consume_stream(
+                messages, temperature, seed, progress_callback, progress_base
+            )
+
+    async def _consume_stream(
+        self,
+        messages: List[Dict],
+        temperature: float,
+        seed: Optional[int],
+        progress_callback: Optional[Callable[[str, int], None]],
+        progress_base: int,
+    ) -> str:
+        """Issue the streaming request and accumulate the response text."""
+        extra_args = {"seed": seed} if seed is not None else {}
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            response_format=CODE_RESPONSE_FORMAT,
+            stream=True,
+            **extra_args,
+        )
+
+        parts = []
+        received = 0
+        chunk_count = 0
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                parts.append(delta)
+                received += len(delta)
+                chunk_count += 1
+
+                if progress_callback and chunk_count % self.STREAM_PROGRESS_EVERY == 0:
+                    fraction = min(received / self.EXPECTED_CODE_CHARS, 1.0)
+                    progress_callback(
+                        f"Generating Manim code ({received} characters)...",
+                        progress_base + int(fraction * 2),
+                    )
+        finally:
+            await stream.close()
+
+        return "".join(parts)
+
     def _validate_canvas_constraints(self, code: str) -> Tuple[bool, List[str]]:
         """
         Validate that code respects 9:8 canvas constraints.
@@ -697,7 +1499,7 @@ Return ONLY the fixed Python code, no explanations."""
         critical_errors = []
 
         # Strip comments for validation (to avoid false positives from commented code)
-        code_no_comments = re.sub(r'#.*$', '', code, flags=re.MULTILINE)
+        code_no_comments = COMMENT_RE.sub('', code)
 
         # Check 1: wrap_text function should be included
         if 'def wrap_text' not in code:
@@ -705,8 +1507,7 @@ Return ONLY the fixed Python code, no explanations."""
 
         # Check 2: Find long text strings that should be wrapped
         # Find Text() calls with long strings (>50 chars)
-        text_pattern = r'Text\(["\']([^"\']{50,})["\']'
-        long_texts = re.findall(text_pattern, code_no_comments)
+        long_texts = LONG_TEXT_RE.findall(code_no_comments)
         if long_texts:
             # Check if wrap_text is actually being used
             if 'wrap_text(' not in code_no_comments:
@@ -714,17 +1515,16 @@ Return ONLY the fixed Python code, no explanations."""
 
         # Check 3: Dangerous positioning methods that can go off-screen on 9:8 canvas
         dangerous_methods = [
-            (r'\.to_edge\(', 'to_edge() can place objects off-screen on 9:8 canvas'),
-            (r'\.to_corner\(', 'to_corner() can place objects off-screen on 9:8 canvas'),
+            ('.to_edge(', 'to_edge() can place objects off-screen on 9:8 canvas'),
+            ('.to_corner(', 'to_corner() can place objects off-screen on 9:8 canvas'),
         ]
-        for pattern, warning in dangerous_methods:
-            if re.search(pattern, code_no_comments):
+        for method, warning in dangerous_methods:
+            if method in code_no_comments:
                 critical_errors.append(f"CRITICAL: Using {warning}. Use explicit coordinates instead.")
 
         # Check 4: Check for extreme position values
         # Look for move_to, shift with large values
-        position_pattern = r'(?:move_to|shift)\([^)]*?([-\d.]+)\s*\*\s*(?:UP|DOWN|LEFT|RIGHT)'
-        position_multipliers = re.findall(position_pattern, code)
+        position_multipliers = POSITION_MULTIPLIER_RE.findall(code)
         for multiplier in position_multipliers:
             try:
                 val = abs(float(multiplier))
@@ -1101,45 +1901,36 @@ def remove_object_tracking(obj):
 
         return len(errors) == 0, errors
 
-    async def _validate_code(self, code_path: Path) -> Tuple[bool, Optional[str]]:
+    def _validate_code(self, code_path: Path, code_content: str) -> Tuple[bool, Optional[str]]:
         """
-        Validate Manim code by checking syntax and imports.
+        Validate Manim code syntax, structure and canvas constraints.
+
+        Syntax is checked with an in-process compile() so obviously broken
+        code never reaches the scene check subprocess in _test_render.
 
         Args:
-            code_path: Path to the Manim Python file
+            code_path: Path to the Manim Python file (used in error messages)
+            code_content: The code as saved to code_path, so it isn't read back
 
         Returns:
             Tuple of (is_valid, error_message)
         """
         try:
-            # First check: Python syntax
-            result = await asyncio.to_thread(
-                subprocess.run,
-                ["python", "-m", "py_compile", str(code_path)],
-                capture_output=True,
-                text=True,
-                timeout=10,
-            )
-
-            if result.returncode != 0:
-                error_msg = f"Syntax error: {result.stderr}"
+            # First check: Python syntax (in-process, no interpreter spawn)
+            try:
+                compile(code_content, str(code_path), "exec")
+            except SyntaxError as e:
+                error_msg = f"Syntax error: {e}"
                 logger.warning(error_msg)
                 return False, error_msg
 
-            # Second check: Try importing the module
-            # This checks for import errors and basic runtime issues
-            code_content = code_path.read_text(encoding="utf-8")
-
-            # Check for required Manim imports
-            if "from manim import" not in code_content and "import manim" not in code_content:
+            # Required structure (imports, Scene class, construct) in one pass
+            found = {match.lastgroup for match in STRUCTURE_RE.finditer(code_content)}
+            if "imports" not in found:
                 return False, "Missing Manim imports"
-
-            # Check for Scene class
-            if "class" not in code_content or "Scene" not in code_content:
+            if "scene" not in found:
                 return False, "Missing Scene class definition"
-
-            # Check for construct method
-            if "def construct" not in code_content:
+            if "construct" not in found:
                 return False, "Missing construct() method"
 
             # CRITICAL: Validate canvas constraints (9:8 aspect ratio)
@@ -1159,15 +1950,20 @@ def remove_object_tracking(obj):
             logger.info("Code validation passed (syntax, constraints, and spatial checks)")
             return True, None
 
-        except subprocess.TimeoutExpired:
-            return False, "Validation timeout"
         except Exception as e:
             logger.error(f"Validation error: {e}")
             return False, f"Validation error: {str(e)}"
 
     async def _test_render(self, code_path: Path) -> Tuple[bool, str]:
         """
-        Test render Manim code to catch runtime errors.
+        Check Manim code for runtime errors.
+
+        First looks for undefined names statically (typoed Manim classes),
+        then has the long-lived scene check worker construct the scene with
+        animations stubbed out and, if that passes, render it with Manim's
+        dry_run config, so the full construct() executes without writing any
+        frames or re-importing manim. Generated code only ever runs in the
+        worker's forked, time-limited children, never in this process.
 
         Args:
             code_path: Path to the Manim Python file
@@ -1175,65 +1971,76 @@ def remove_object_tracking(obj):
         Returns:
             Tuple of (is_valid, error_message)
         """
+        # Static pass: an undefined name is a guaranteed NameError, and the
+        # AST walk also covers branches construct() would never reach
         try:
-            # Quick render test - render FULL animation at low quality to catch all runtime errors
-            # Previously only rendered first frame "-n 0,1" which missed errors later in animation
-            cmd = [
-                "manim",
-                str(code_path),
-                "EducationalScene",
-                "-ql",  # Low quality for speed
-                "--format=mp4",  # Full video to test all frames
-            ]
-
-            logger.info(f"Test rendering: {' '.join(cmd)}")
-
-            result = await asyncio.to_thread(
-                subprocess.run,
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=120,  # 2 minute timeout for full animation test (was 30s for single frame)
+            undefined = await asyncio.to_thread(find_undefined_names, str(code_path))
+        except Exception as e:
+            logger.warning(f"Static name check skipped: {e!r}")
+            undefined = []
+        if undefined:
+            error = "; ".join(
+                f"NameError: name '{name}' is not defined (line {line})"
+                for name, line in undefined[:5]
             )
+            logger.warning(f"Static name check failed: {error}")
+            return False, error
 
-            if result.returncode != 0:
-                error_output = result.stderr or result.stdout
-                # Extract the actual error message
-                error_lines = error_output.split('\n')
-                # Find the most relevant error line
-                for line in reversed(error_lines):
-                    if 'Error' in line or 'Exception' in line or 'TypeError' in line:
-                        return False, line.strip()
-                return False, f"Render test failed: {error_output[-500:]}"  # Last 500 chars
-
-            logger.info("Test render passed")
-            return True, None
+        # Full dry-run in a long-lived worker, which already has manim imported
+        logger.info(f"Checking scene in worker: {code_path}")
+        is_valid, error = await _get_scene_pool().check(
+            str(code_path), "EducationalScene", timeout=120
+        )
+        if not is_valid:
+            return False, error
 
-        except subprocess.TimeoutExpired:
-            return False, "Test render timeout"
-        except Exception as e:
-            logger.error(f"Test render error: {e}")
-            return False, f"Test render error: {str(e)}"
+        logger.info("Scene check passed")
+        return True, None
+
+    @staticmethod
+    async def _iter_output_lines(stream: asyncio.StreamReader):
+        """
+        Yield decoded lines from a subprocess pipe as they arrive.
 
-    def _extract_code_from_markdown(self, text: str) -> str:
+        Splits on both newlines and carriage returns, since Manim's progress
+        bars redraw with \\r and would otherwise never produce a full line.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = ""
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                break
+            buffer += decoder.decode(chunk).replace("\r", "\n")
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+
+    def _parse_code_response(self, text: str) -> str:
         """
-        Extract Python code from markdown code blocks if present.
+        Extract Python code from a JSON-mode response.
+
+        Falls back to the first fenced code block (or the raw text) if the
+        model ignored the requested format.
 
         Args:
-            text: Text that may contain markdown code blocks
+            text: Response text, normally {"code": "..."}
 
         Returns:
-            Extracted code or original text
+            Extracted code
         """
-        # Try to find code between ```python and ```
-        pattern = r"```(?:python)?\s*\n(.*?)```"
-        matches = re.findall(pattern, text, re.DOTALL)
+        try:
+            return json.loads(text)["code"].strip()
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            logger.warning("Response was not the expected JSON object, falling back to markdown extraction")
 
-        if matches:
-            # Return the first code block found
-            return matches[0].strip()
+        match = CODE_BLOCK_RE.search(text)
+        if match:
+            return match.group(1).strip()
 
-        # No code blocks found, return original
         return text.strip()
 
     async def render_manim_video(
@@ -1315,35 +2122,95 @@ def remove_object_tracking(obj):
 
             logger.info(f"Running command: {' '.join(cmd)}")
 
-            result = await asyncio.to_thread(
-                subprocess.run,
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=300,  # 5 minute timeout
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
             )
+            stdout_task = asyncio.create_task(proc.stdout.read())
+            stderr_lines = []
+            error_detected = False
+
+            # Estimate the animation count from the source so progress bars can
+            # be mapped onto the 75-85% band (loops make this approximate)
+            total_animations = max(1, len(ANIMATION_CALL_RE.findall(manim_file.read_text(encoding="utf-8"))))
+            last_progress = 75
+
+            def terminate_if_running():
+                if proc.returncode is None:
+                    logger.warning("Manim still running after error, terminating")
+                    proc.terminate()
+
+            async def watch_stderr():
+                # Stream stderr so a script that crashes early fails in seconds
+                # instead of waiting on the render timeout
+                nonlocal error_detected, last_progress
+                async for line in self._iter_output_lines(proc.stderr):
+                    stderr_lines.append(line)
+                    match = RENDER_PROGRESS_RE.search(line) if progress_callback else None
+                    if match:
+                        # Bars are numbered from 0, so N is also the count finished
+                        finished = int(match.group(1))
+                        progress = 75 + int(min(finished / total_animations, 1.0) * 10)
+                        if progress > last_progress:
+                            last_progress = progress
+                            progress_callback(
+                                f"Rendering Manim animation ({finished}/{total_animations})...",
+                                progress,
+                            )
+                    if not error_detected and RENDER_ERROR_RE.search(line):
+                        error_detected = True
+                        # Give manim a moment to flush the traceback and exit
+                        asyncio.get_running_loop().call_later(
+                            self.RENDER_ERROR_GRACE_SECONDS, terminate_if_running
+                        )
+
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(watch_stderr(), proc.wait()),
+                    timeout=300,  # 5 minute timeout
+                )
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
+            finally:
+                stdout_bytes = await stdout_task
+
+            stdout = stdout_bytes.decode("utf-8", errors="replace")
+            stderr = "\n".join(stderr_lines)
 
             # Log output for debugging
-            if result.stdout:
-                logger.info(f"Manim stdout: {result.stdout[-1000:]}")  # Last 1000 chars
-            if result.stderr:
-                logger.warning(f"Manim stderr: {result.stderr[-1000:]}")  # Last 1000 chars
+            if stdout:
+                logger.info(f"Manim stdout: {stdout[-1000:]}")  # Last 1000 chars
+            if stderr:
+                logger.warning(f"Manim stderr: {stderr[-1000:]}")  # Last 1000 chars
 
-            if result.returncode != 0:
-                error_msg = f"Manim rendering failed: {result.stderr}"
+            if proc.returncode != 0:
+                error_msg = f"Manim rendering failed: {stderr}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
 
-            # Search for the output video file more comprehensively
-            import os
-            video_path = None
+            # Manim writes to media_dir/videos/<module>/<height>p<fps>/, so
+            # build that path directly and only search on a miss
+            frame_rates = {"-ql": 15, "-qm": 30, "-qh": 60}
+            default_heights = {"-ql": 480, "-qm": 720, "-qh": 1080}
+            pixel_height = (
+                resolution_args[1].split(",")[1]
+                if resolution_args
+                else default_heights[quality_flag]
+            )
+            video_path = (
+                output_dir / "videos" / manim_file.stem
+                / f"{pixel_height}p{frame_rates[quality_flag]}" / "manim_output.mp4"
+            )
 
-            # Search all subdirectories for manim_output.mp4
-            for root, dirs, files in os.walk(output_dir):
-                if "manim_output.mp4" in files:
-                    video_path = Path(root) / "manim_output.mp4"
+            if video_path.exists():
+                logger.info(f"Found video at: {video_path}")
+            else:
+                video_path = next(output_dir.rglob("manim_output.mp4"), None)
+                if video_path:
                     logger.info(f"Found video at: {video_path}")
-                    break
 
             if not video_path or not video_path.exists():
                 # Log directory structure for debugging
@@ -1359,7 +2226,7 @@ def remove_object_tracking(obj):
 
             return video_path
 
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             error_msg = "Manim rendering timeout (5 minutes)"
             logger.error(error_msg)
             raise Exception(error_msg)
@@ -0,0 +1,238 @@
+"""
+Manim Scene Check
+
+Standalone script used by ManimGenerator to validate generated Manim code in a
+single subprocess: compiles the file, imports it, instantiates the scene and
+runs it with Manim's dry_run config so no frames or video files are written.
+
+Usage:
+    python manim_scene_check.py <path/to/scene.py> <SceneName>
+    python manim_scene_check.py --worker
+
+Exits 0 when the scene constructs cleanly, 1 with the traceback on stderr otherwise.
+
+In --worker mode the process imports manim once and then serves checks
+forever: one JSON request per stdin line ({"path": ..., "scene": ...,
+"timeout": ...}) and one JSON response per stdout line ({"ok": bool,
+"error": str | null}). Where fork() is available each check runs in a
+forked child, so scenes can't leave state behind for later checks.
+
+find_undefined_names() is imported by ManimGenerator for a static pre-check
+that never executes the generated code.
+"""
+
+import ast
+import builtins
+import json
+import os
+import runpy
+import signal
+import sys
+import traceback
+from typing import List, Tuple
+
+# Run construct() fully but write nothing: dry_run skips frame/movie output,
+# low quality keeps any rasterization cheap, and disabling the partial-movie
+# cache skips hashing every play() call
+DRY_RUN_CONFIG = {
+    "dry_run": True,
+    "write_to_movie": False,
+    "quality": "low_quality",
+    "disable_caching": True,
+}
+
+# Pattern-matching capture nodes, which only exist on Python 3.10+
+# (isinstance against an empty tuple is always False)
+MATCH_CAPTURE_NODES = tuple(
+    getattr(ast, name) for name in ("MatchAs", "MatchStar") if hasattr(ast, name)
+)
+MATCH_MAPPING_NODES = tuple(getattr(ast, name) for name in ("MatchMapping",) if hasattr(ast, name))
+
+
+def check_scene(code_path: str, scene_name: str) -> None:
+    """
+    Compile, import and dry-run a Manim scene.
+
+    Args:
+        code_path: Path to the Manim Python file
+        scene_name: Name of the scene class to instantiate
+
+    Raises:
+        Exception: Any syntax, import or runtime error raised by the scene
+    """
+    # Syntax check first so compile errors are reported as SyntaxError
+    with open(code_path, encoding="utf-8") as f:
+        compile(f.read(), code_path, "exec")
+
+    from manim import tempconfig
+
+    with tempconfig(DRY_RUN_CONFIG):
+        module = runpy.run_path(code_path)
+        if scene_name not in module:
+            raise NameError(f"Scene class '{scene_name}' not found in {code_path}")
+        scene = module[scene_name]()
+        scene.render()
+
+
+def find_undefined_names(code_path: str) -> List[Tuple[str, int]]:
+    """
+    Statically find names that are read but never bound anywhere in the file.
+
+    Typos in Manim class names (Cirle, FadeInn) are the most common LLM
+    mistake; this catches them in milliseconds, including in branches that
+    construct() never reaches. Scoping is deliberately loose (a name bound
+    anywhere counts as defined) so valid code is never rejected.
+
+    Args:
+        code_path: Path to the Manim Python file
+
+    Returns:
+        List of (name, line) for each unknown name, first occurrence only.
+        Empty when the file star-imports anything other than manim, since
+        those names can't be known statically.
+    """
+    with open(code_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), code_path)
+
+    bound = set(dir(builtins)) | {"__file__", "__name__", "__doc__", "__builtins__"}
+    loads = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                loads.append(node)
+            else:
+                bound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, MATCH_CAPTURE_NODES) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, MATCH_MAPPING_NODES) and node.rest:
+            bound.add(node.rest)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name != "*":
+                    bound.add(alias.asname or alias.name.split(".")[0])
+                elif isinstance(node, ast.ImportFrom) and node.module == "manim":
+                    bound.update(_manim_names())
+                else:
+                    return []
+
+    undefined = {}
+    for node in loads:
+        if node.id not in bound and node.id not in undefined:
+            undefined[node.id] = node.lineno
+    return sorted(undefined.items(), key=lambda item: item[1])
+
+
+def _manim_names() -> List[str]:
+    """Names exported by `from manim import *`."""
+    import manim
+
+    return getattr(manim, "__all__", None) or [name for name in dir(manim) if not name.startswith("_")]
+
+
+def format_error(exc: BaseException, code_path: str) -> str:
+    """
+    Summarize an exception as "Type: message (line N)".
+
+    The line is the deepest traceback frame inside the generated file, so the
+    fixer knows which region of the code to look at.
+    """
+    error = f"{type(exc).__name__}: {exc}"
+    frames = [
+        frame for frame in traceback.extract_tb(exc.__traceback__)
+        if frame.filename == code_path
+    ]
+    if frames:
+        error += f" (line {frames[-1].lineno})"
+    elif isinstance(exc, SyntaxError) and exc.lineno:
+        error += f" (line {exc.lineno})"
+    return error
+
+
+def _run_check(request: dict) -> dict:
+    """Run one worker request and build its response."""
+    try:
+        check_scene(request["path"], request["scene"])
+        return {"ok": True, "error": None}
+    except (Exception, SystemExit) as e:
+        # Generated code calling sys.exit() is reported, not obeyed
+        return {"ok": False, "error": format_error(e, request["path"])}
+
+
+def _run_check_in_child(request: dict) -> dict:
+    """
+    Run one worker request in a forked child.
+
+    The child inherits the already-imported manim copy-on-write, so forking
+    costs milliseconds, and whatever the scene does to module or config state
+    dies with it instead of leaking into later checks.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        exit_code = 1
+        try:
+            # Backstop for a worker that died without killing its group
+            signal.alarm(int(request.get("timeout", 120)) + 5)
+            response = _run_check(request)
+            with os.fdopen(write_fd, "w", encoding="utf-8") as result:
+                result.write(json.dumps(response))
+            exit_code = 0
+        finally:
+            os._exit(exit_code)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, encoding="utf-8") as result:
+        data = result.read()
+    os.waitpid(pid, 0)
+    if not data:
+        return {"ok": False, "error": "Scene check process died"}
+    return json.loads(data)
+
+
+def serve() -> int:
+    """Serve scene checks over stdin/stdout until stdin closes."""
+    # Keep the real stdout for protocol messages and send everything else
+    # (manim logs, print() in generated scenes) to stderr
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    import manim  # noqa: F401 - pay the import cost once, up front
+
+    isolate = hasattr(os, "fork")
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        response = _run_check_in_child(request) if isolate else _run_check(request)
+        protocol.write(json.dumps(response) + "\n")
+        protocol.flush()
+
+    return 0
+
+
+def main() -> int:
+    if sys.argv[1:] == ["--worker"]:
+        return serve()
+
+    if len(sys.argv) != 3:
+        print("Usage: manim_scene_check.py <path> <scene_name> | --worker", file=sys.stderr)
+        return 2
+
+    try:
+        check_scene(sys.argv[1], sys.argv[2])
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
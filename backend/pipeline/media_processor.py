@@ -4,18 +4,34 @@ Media file processing for custom photo and audio uploads.
 Processes images (resize, thumbnail, format conversion) and audio (format conversion, normalization).
 """
 
+import asyncio
+import functools
 import logging
+import os
 import subprocess
-import tempfile
-from pathlib import Path
-from typing import Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
 import io
 
+from mutagen.mp3 import MP3
 from PIL import Image
 from pydub import AudioSegment
 
+# Optional: lossless MozJPEG re-optimization of thumbnails
+try:
+    import mozjpeg_lossless_optimization
+except ImportError:
+    mozjpeg_lossless_optimization = None
+
 logger = logging.getLogger(__name__)
 
+# Photo processing is CPU-bound (decode, LANCZOS resize, encode), so it runs in
+# worker processes instead of threads to get past the GIL. Created on first use.
+_PHOTO_POOL: Optional[ProcessPoolExecutor] = None
+
+# Per-worker-process processor, built once by _init_photo_worker
+_WORKER_PROCESSOR: Optional["MediaProcessor"] = None
+
 
 class MediaProcessor:
     """Processes media files for storage and use in video generation."""
@@ -27,13 +43,26 @@ class MediaProcessor:
     TARGET_SAMPLE_RATE = 24000
     MAX_AUDIO_DURATION = 5.0  # seconds
 
+    # JPEG save options that write no source metadata (EXIF, ICC, comments, XMP)
+    # even when the image still carries it in .info
+    STRIP_METADATA = {"exif": b"", "icc_profile": None, "comment": b"", "xmp": b""}
+
     def __init__(self):
         """Initialize media processor."""
-        self.validate_dependencies()
+        self.has_ffmpeg = self.validate_dependencies()
 
     @staticmethod
-    def validate_dependencies():
-        """Check if required dependencies are available."""
+    @functools.lru_cache(maxsize=1)
+    def validate_dependencies() -> bool:
+        """
+        Check if required dependencies are available.
+
+        Cached, so ffmpeg is probed at most once per process no matter how
+        many processors (including photo pool workers) are created.
+
+        Returns:
+            True if ffmpeg is available
+        """
         try:
             # Check if ffmpeg is available
             result = subprocess.run(
@@ -44,8 +73,11 @@ class MediaProcessor:
             )
             if result.returncode != 0:
                 logger.warning("ffmpeg not found. Audio processing may fail.")
+                return False
         except FileNotFoundError:
             logger.warning("ffmpeg not found in PATH. Audio processing may fail.")
+            return False
+        return True
 
     def create_thumbnail(self, image: Image.Image, size: Tuple[int, int] = None) -> Image.Image:
         """
@@ -61,23 +93,30 @@ class MediaProcessor:
         if size is None:
             size = self.THUMBNAIL_SIZE
 
-        # Create a copy to avoid modifying original
-        img_copy = image.copy()
-
-        # Convert to RGB if necessary (for JPEG compatibility)
-        if img_copy.mode in ('RGBA', 'LA', 'P'):
-            # Create white background
-            background = Image.new('RGB', img_copy.size, (255, 255, 255))
-            if img_copy.mode == 'P':
-                img_copy = img_copy.convert('RGBA')
-            background.paste(img_copy, mask=img_copy.split()[-1] if img_copy.mode == 'RGBA' else None)
-            img_copy = background
-
-        # Use thumbnail method to maintain aspect ratio
-        img_copy.thumbnail(size, Image.Resampling.LANCZOS)
-
-        logger.info(f"Created thumbnail: {img_copy.size}")
-        return img_copy
+        # Fit within size keeping aspect ratio, never upscaling. resize() returns
+        # a new image, so the caller's image is left untouched without a copy
+        width, height = image.size
+        scale = min(size[0] / width, size[1] / height, 1.0)
+        thumb_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+        # Resize first so any mode conversion below runs on thumbnail-sized
+        # pixels (Pillow premultiplies alpha while resampling)
+        if image.mode == 'P':
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        thumbnail = image.resize(thumb_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        # Convert to RGB if necessary (for JPEG compatibility), flattening onto a
+        # white background only when there is an alpha channel
+        if thumbnail.mode in ('RGBA', 'LA'):
+            thumbnail = thumbnail.convert('RGBA')
+            background = Image.new('RGB', thumbnail.size, (255, 255, 255))
+            background.paste(thumbnail, mask=thumbnail.getchannel('A'))
+            thumbnail = background
+        elif thumbnail.mode != 'RGB':
+            thumbnail = thumbnail.convert('RGB')
+
+        logger.info(f"Created thumbnail: {thumbnail.size}")
+        return thumbnail
 
     def process_photo(self, image_data: bytes) -> Tuple[bytes, bytes, Tuple[int, int]]:
         """
@@ -92,6 +131,7 @@ class MediaProcessor:
         try:
             # Load image
             image = Image.open(io.BytesIO(image_data))
+            image_format = image.format
             original_size = image.size
 
             # Convert to RGB if necessary
@@ -106,21 +146,31 @@ class MediaProcessor:
                 else:
                     image = image.convert('RGB')
 
-            # Strip EXIF data (privacy/security)
-            data = list(image.getdata())
-            clean_image = Image.new(image.mode, image.size)
-            clean_image.putdata(data)
-
-            # Save main image as JPEG
+            # Save main image as JPEG, stripping EXIF data (privacy/security) at
+            # encode time instead of rebuilding the image without it
             main_buffer = io.BytesIO()
-            clean_image.save(main_buffer, format=self.TARGET_IMAGE_FORMAT, quality=90, optimize=True)
+            image.save(
+                main_buffer, format=self.TARGET_IMAGE_FORMAT, quality=90, optimize=True,
+                **self.STRIP_METADATA,
+            )
             main_bytes = main_buffer.getvalue()
 
-            # Create and save thumbnail
-            thumbnail = self.create_thumbnail(clean_image)
+            # Create and save thumbnail. For JPEGs, reopen in draft mode so libjpeg
+            # decodes straight to a 1/2-1/8 scale instead of the full image
+            thumb_source = image
+            if image_format == "JPEG":
+                thumb_source = Image.open(io.BytesIO(image_data))
+                thumb_source.draft("RGB", self.THUMBNAIL_SIZE)
+            thumbnail = self.create_thumbnail(thumb_source)
             thumb_buffer = io.BytesIO()
-            thumbnail.save(thumb_buffer, format=self.TARGET_IMAGE_FORMAT, quality=85, optimize=True)
+            thumbnail.save(
+                thumb_buffer, format=self.TARGET_IMAGE_FORMAT, quality=85, optimize=True,
+                **self.STRIP_METADATA,
+            )
             thumb_bytes = thumb_buffer.getvalue()
+            if mozjpeg_lossless_optimization is not None:
+                # Lossless: same pixels, typically 10-20% fewer bytes to serve
+                thumb_bytes = mozjpeg_lossless_optimization.optimize(thumb_bytes)
 
             logger.info(f"Processed photo: {original_size} -> main: {len(main_bytes)} bytes, thumbnail: {len(thumb_bytes)} bytes")
 
@@ -130,13 +180,43 @@ class MediaProcessor:
             logger.error(f"Failed to process photo: {e}")
             raise Exception(f"Photo processing failed: {str(e)}")
 
-    def convert_audio_format(self, audio_path: Path, output_path: Path) -> None:
+    async def process_photo_async(self, image_data: bytes) -> Tuple[bytes, bytes, Tuple[int, int]]:
+        """
+        Run process_photo in the shared process pool without blocking the event loop.
+
+        Args:
+            image_data: Raw image bytes
+
+        Returns:
+            Tuple of (processed_image_bytes, thumbnail_bytes, dimensions)
+        """
+        global _PHOTO_POOL
+        if _PHOTO_POOL is None:
+            _PHOTO_POOL = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                initializer=_init_photo_worker,
+            )
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_PHOTO_POOL, _process_photo_in_worker, image_data)
+
+    @staticmethod
+    def shutdown_pool():
+        """Stop the photo worker processes (call on shutdown)."""
+        global _PHOTO_POOL
+        if _PHOTO_POOL is not None:
+            _PHOTO_POOL.shutdown(cancel_futures=True)
+            _PHOTO_POOL = None
+
+    def convert_audio_format(self, audio_data: bytes) -> bytes:
         """
-        Convert audio to MP3 format using ffmpeg.
+        Convert audio to MP3 format using ffmpeg, piping bytes through stdin/stdout.
 
         Args:
-            audio_path: Path to input audio file
-            output_path: Path to output MP3 file
+            audio_data: Raw input audio bytes (format is probed by ffmpeg)
+
+        Returns:
+            MP3 audio bytes
         """
         try:
             # Use ffmpeg for conversion with specific parameters
@@ -146,27 +226,29 @@ class MediaProcessor:
             # -t 5: trim to max 5 seconds
             cmd = [
                 "ffmpeg",
-                "-i", str(audio_path),
+                "-i", "pipe:0",
                 "-ac", "1",  # Mono
                 "-ar", str(self.TARGET_SAMPLE_RATE),  # 24kHz
                 "-ab", "128k",  # 128 kbps
                 "-t", str(self.MAX_AUDIO_DURATION),  # Max 5 seconds
-                "-y",  # Overwrite output
-                str(output_path)
+                "-f", self.TARGET_AUDIO_FORMAT,  # No file extension to infer from
+                "pipe:1"
             ]
 
             result = subprocess.run(
                 cmd,
+                input=audio_data,
                 capture_output=True,
-                text=True,
                 check=True
             )
 
-            logger.info(f"Audio converted: {audio_path} -> {output_path}")
+            logger.info(f"Audio converted: {len(audio_data)} bytes -> {len(result.stdout)} bytes")
+            return result.stdout
 
         except subprocess.CalledProcessError as e:
-            logger.error(f"ffmpeg conversion failed: {e.stderr}")
-            raise Exception(f"Audio conversion failed: {e.stderr}")
+            stderr = e.stderr.decode("utf-8", errors="replace")
+            logger.error(f"ffmpeg conversion failed: {stderr}")
+            raise Exception(f"Audio conversion failed: {stderr}")
         except Exception as e:
             logger.error(f"Failed to convert audio: {e}")
             raise Exception(f"Audio conversion failed: {str(e)}")
@@ -177,40 +259,19 @@ class MediaProcessor:
 
         Args:
             audio_data: Raw audio bytes
-            original_filename: Original filename (for format detection)
+            original_filename: Original filename (for logging; ffmpeg probes the format)
 
         Returns:
             Tuple of (processed_audio_bytes, duration, sample_rate)
         """
-        temp_input = None
-        temp_output = None
-
         try:
-            # Determine input format from filename
-            suffix = Path(original_filename).suffix.lower()
-            if not suffix:
-                suffix = ".mp3"
-
-            # Create temporary input file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_in:
-                tmp_in.write(audio_data)
-                temp_input = Path(tmp_in.name)
-
-            # Create temporary output file
-            temp_output = Path(tempfile.mktemp(suffix=".mp3"))
-
-            # Convert using ffmpeg
-            self.convert_audio_format(temp_input, temp_output)
-
-            # Read processed audio
-            with open(temp_output, 'rb') as f:
-                processed_bytes = f.read()
+            # Convert in memory - no temp files
+            processed_bytes = self.convert_audio_format(audio_data)
 
-            # Get duration using pydub
-            audio_segment = AudioSegment.from_file(str(temp_output))
-            duration = len(audio_segment) / 1000.0  # Convert to seconds
+            # Read duration from the MP3 frames in-process instead of decoding again
+            duration = MP3(io.BytesIO(processed_bytes)).info.length
 
-            logger.info(f"Processed audio: {len(audio_data)} bytes -> {len(processed_bytes)} bytes, duration: {duration:.2f}s, sample_rate: {self.TARGET_SAMPLE_RATE}Hz")
+            logger.info(f"Processed audio {original_filename}: {len(audio_data)} bytes -> {len(processed_bytes)} bytes, duration: {duration:.2f}s, sample_rate: {self.TARGET_SAMPLE_RATE}Hz")
 
             return processed_bytes, duration, self.TARGET_SAMPLE_RATE
 
@@ -218,13 +279,6 @@ class MediaProcessor:
             logger.error(f"Failed to process audio: {e}")
             raise Exception(f"Audio processing failed: {str(e)}")
 
-        finally:
-            # Clean up temporary files
-            if temp_input and temp_input.exists():
-                temp_input.unlink(missing_ok=True)
-            if temp_output and temp_output.exists():
-                temp_output.unlink(missing_ok=True)
-
     def trim_audio(self, audio_data: bytes, max_duration: float = None) -> bytes:
         """
         Trim audio to maximum duration.
@@ -266,3 +320,15 @@ class MediaProcessor:
         except Exception as e:
             logger.error(f"Failed to trim audio: {e}")
             raise Exception(f"Audio trimming failed: {str(e)}")
+
+
+def _init_photo_worker():
+    """Load Pillow's codec plugins and build the worker's processor once."""
+    global _WORKER_PROCESSOR
+    Image.init()
+    _WORKER_PROCESSOR = MediaProcessor()
+
+
+def _process_photo_in_worker(image_data: bytes) -> Tuple[bytes, bytes, Tuple[int, int]]:
+    """Entry point executed in a photo pool worker."""
+    return _WORKER_PROCESSOR.process_photo(image_data)
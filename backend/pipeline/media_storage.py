@@ -4,13 +4,21 @@ Media storage management for custom photo and audio uploads.
 Manages file storage, metadata persistence, and media retrieval.
 """
 
+import asyncio
+import hashlib
 import logging
-import json
+import os
+import stat
+import tempfile
+import threading
 import uuid
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime
 
+import orjson
+
 from models.media_models import PhotoMetadata, AudioMetadata
 
 logger = logging.getLogger(__name__)
@@ -19,6 +27,13 @@ logger = logging.getLogger(__name__)
 class MediaStorage:
     """Manages storage of uploaded media files and their metadata."""
 
+    # Metadata is kept as one append-only JSONL log per user and kind, keyed by
+    # the item's id field; deletes append tombstones
+    METADATA_KINDS = {"photos": "photo_id", "audio": "audio_id"}
+    COMPACT_GARBAGE_RATIO = 0.25  # Rewrite a log once this share of records is dead
+    METADATA_CACHE_SIZE = 1024  # Folded logs kept in memory (one per user and kind)
+    METADATA_SHARD_CHARS = 2  # Hex digits of the user id hash naming a log's shard directory
+
     def __init__(self, base_upload_dir: Path = None):
         """
         Initialize media storage.
@@ -39,63 +54,283 @@ class MediaStorage:
         self.audio_dir.mkdir(parents=True, exist_ok=True)
         self.metadata_dir.mkdir(parents=True, exist_ok=True)
 
+        # (user_id, kind) -> ((mtime_ns, size), folded items, record count)
+        self._log_cache: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], Dict[str, Dict], int]]" = OrderedDict()
+        self._cache_lock = threading.RLock()
+
+        # User directories known to exist, so hot paths skip the mkdir syscall.
+        # Racing adds are harmless: mkdir(exist_ok=True) is idempotent.
+        self._created_dirs: Set[Path] = set()
+
+        # (user_id, kind) -> resolved log path, so hashing and migration run once
+        self._log_paths: Dict[Tuple[str, str], Path] = {}
+
+        # (user_id, kind) -> lock serializing appends and compactions of that
+        # log, so a record appended mid-compaction can't be dropped by os.replace
+        self._log_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._migration_lock = threading.Lock()
+
         logger.info(f"Media storage initialized at {self.base_dir}")
 
+    def _ensure_dir(self, path: Path) -> Path:
+        """Create a directory once per process lifetime."""
+        if path not in self._created_dirs:
+            path.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(path)
+        return path
+
     def _get_user_photo_dir(self, user_id: str) -> Path:
         """Get user-specific photo directory."""
-        user_dir = self.photos_dir / user_id
-        user_dir.mkdir(parents=True, exist_ok=True)
-        return user_dir
+        return self._ensure_dir(self.photos_dir / user_id)
 
     def _get_user_audio_dir(self, user_id: str) -> Path:
         """Get user-specific audio directory."""
-        user_dir = self.audio_dir / user_id
-        user_dir.mkdir(parents=True, exist_ok=True)
-        return user_dir
+        return self._ensure_dir(self.audio_dir / user_id)
 
     def _get_metadata_path(self, user_id: str) -> Path:
-        """Get path to user's metadata file."""
+        """Get path to user's legacy single-file metadata (pre-JSONL)."""
         return self.metadata_dir / f"{user_id}.json"
 
-    def _load_metadata(self, user_id: str) -> Dict:
+    def _get_log_path(self, user_id: str, kind: str) -> Path:
         """
-        Load user's media metadata.
+        Get path to user's append-only metadata log for 'photos' or 'audio'.
+
+        Logs are spread over 256 shard directories named by a hash of the user
+        id, so no directory grows with the number of users. A log written
+        before sharding is moved into place the first time it's resolved.
+        """
+        key = (user_id, kind)
+        log_path = self._log_paths.get(key)
+        if log_path is None:
+            shard = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:self.METADATA_SHARD_CHARS]
+            log_path = self._ensure_dir(self.metadata_dir / shard) / f"{user_id}.{kind}.jsonl"
+
+            flat_path = self.metadata_dir / log_path.name
+            if flat_path.exists() and not log_path.exists():
+                try:
+                    os.replace(flat_path, log_path)
+                    logger.info(f"Moved {kind} metadata for user {user_id} into shard {shard}")
+                except FileNotFoundError:
+                    pass  # Moved by a concurrent request
+
+            self._log_paths[key] = log_path
+        return log_path
+
+    def _log_lock(self, user_id: str, kind: str) -> threading.Lock:
+        """Get the lock guarding writes to one metadata log."""
+        with self._cache_lock:
+            return self._log_locks.setdefault((user_id, kind), threading.Lock())
+
+    @staticmethod
+    def _stat_signature(path: Path) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, size) of a file, or None if it doesn't exist."""
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _apply_record(self, items: Dict[str, Dict], kind: str, record: Dict) -> None:
+        """Apply one add/del log record to folded items."""
+        if record.get("op") == "del":
+            items.pop(record["id"], None)
+        else:
+            item = record["item"]
+            items[item[self.METADATA_KINDS[kind]]] = item
+
+    def _cache_log(self, key: Tuple[str, str], signature, items: Dict[str, Dict], record_count: int) -> None:
+        """Remember a folded log, evicting the least recently used entries."""
+        with self._cache_lock:
+            self._log_cache[key] = (signature, items, record_count)
+            self._log_cache.move_to_end(key)
+            while len(self._log_cache) > self.METADATA_CACHE_SIZE:
+                self._log_cache.popitem(last=False)
+
+    def _read_log(self, user_id: str, kind: str) -> Tuple[Dict[str, Dict], int]:
+        """
+        Fold a metadata log into its current items.
+
+        Folded logs are cached in-process and reused while the file's mtime
+        and size are unchanged, so reads don't re-parse the log.
 
         Args:
             user_id: User identifier
+            kind: 'photos' or 'audio'
 
         Returns:
-            Dictionary with 'photos' and 'audio' lists
+            Tuple of (items keyed by id in insertion order, number of log records).
+            The mapping and its item dicts are shared with the cache and must
+            not be mutated; this keeps single-item lookups O(1) with no copy.
+        """
+        log_path = self._get_log_path(user_id, kind)
+        key = (user_id, kind)
+
+        signature = self._stat_signature(log_path)
+        if signature is None:
+            return {}, 0
+
+        with self._cache_lock:
+            cached = self._log_cache.get(key)
+            if cached is not None and cached[0] == signature:
+                self._log_cache.move_to_end(key)
+                return cached[1], cached[2]
+
+        items: Dict[str, Dict] = {}
+        record_count = 0
+        with open(log_path, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    # A crash mid-append can leave a torn last line
+                    logger.warning(f"Skipping unreadable {kind} metadata record for user {user_id}")
+                    continue
+                record_count += 1
+                self._apply_record(items, kind, record)
+
+        self._cache_log(key, signature, items, record_count)
+        return items, record_count
+
+    def _append_record(self, user_id: str, kind: str, record: Dict) -> None:
         """
-        metadata_path = self._get_metadata_path(user_id)
+        Append one record to a metadata log.
 
-        if not metadata_path.exists():
-            return {"photos": [], "audio": []}
+        Args:
+            user_id: User identifier
+            kind: 'photos' or 'audio'
+            record: {"op": "add", "item": {...}} or {"op": "del", "id": ...}
+        """
+        # Legacy items must land in the log first so a tombstone can't be
+        # undone by a later migration
+        self._migrate_legacy_metadata(user_id)
 
+        log_path = self._get_log_path(user_id, kind)
+        key = (user_id, kind)
+        line = orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
         try:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with self._log_lock(user_id, kind):
+                before = self._stat_signature(log_path)
+                # One write() of one line: O(1) per mutation instead of rewriting the file
+                with open(log_path, 'ab') as f:
+                    f.write(line)
+                after = self._stat_signature(log_path)
         except Exception as e:
-            logger.error(f"Failed to load metadata for user {user_id}: {e}")
-            return {"photos": [], "audio": []}
+            logger.error(f"Failed to save metadata for user {user_id}: {e}")
+            raise Exception(f"Failed to save metadata: {str(e)}")
 
-    def _save_metadata(self, user_id: str, metadata: Dict) -> None:
+        # Fold the record into the cached log if ours was the only write since
+        # it was cached; otherwise drop it and let the next read re-parse
+        with self._cache_lock:
+            cached = self._log_cache.pop(key, None)
+        if cached is not None and before == cached[0] and after and after[1] == before[1] + len(line):
+            items = dict(cached[1])
+            self._apply_record(items, kind, record)
+            self._cache_log(key, after, items, cached[2] + 1)
+
+    def _compact_log(self, user_id: str, kind: str, items: List[Dict]) -> None:
         """
-        Save user's media metadata.
+        Rewrite a metadata log as one add record per current item.
+
+        The caller must hold the log's lock (see _log_lock), and must have
+        read items under it, so no append lands between the read and the
+        replace.
 
         Args:
             user_id: User identifier
-            metadata: Metadata dictionary
+            kind: 'photos' or 'audio'
+            items: Current items, in order
         """
-        metadata_path = self._get_metadata_path(user_id)
+        log_path = self._get_log_path(user_id, kind)
+        # Unique temp file in the same directory, so concurrent compactions
+        # never share one; fsync before os.replace so a crash leaves either
+        # the old log or the complete new one, never a truncated file
+        fd, tmp_name = tempfile.mkstemp(dir=log_path.parent, prefix=f"{log_path.name}.", suffix=".tmp")
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(b"".join(
+                    orjson.dumps({"op": "add", "item": item}, option=orjson.OPT_APPEND_NEWLINE)
+                    for item in items
+                ))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, log_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        id_field = self.METADATA_KINDS[kind]
+        self._cache_log(
+            (user_id, kind),
+            self._stat_signature(log_path),
+            {item[id_field]: item for item in items},
+            len(items),
+        )
+        logger.info(f"Compacted {kind} metadata for user {user_id} ({len(items)} items)")
+
+    def _delete_record(self, user_id: str, kind: str, item_id: str) -> None:
+        """Append a tombstone, compacting the log once it is mostly garbage."""
+        self._append_record(user_id, kind, {"op": "del", "id": item_id})
+
+        with self._log_lock(user_id, kind):
+            items, record_count = self._read_log(user_id, kind)
+            if record_count - len(items) > self.COMPACT_GARBAGE_RATIO * record_count:
+                self._compact_log(user_id, kind, list(items.values()))
+
+    def _migrate_legacy_metadata(self, user_id: str) -> None:
+        """Convert a legacy {user_id}.json file into the per-kind logs."""
+        legacy_path = self._get_metadata_path(user_id)
+        if not legacy_path.exists():
+            return
 
         try:
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
-            logger.info(f"Saved metadata for user {user_id}")
+            with self._migration_lock:
+                if not legacy_path.exists():
+                    return  # Migrated by a concurrent request
+                with open(legacy_path, 'rb') as f:
+                    legacy = orjson.loads(f.read())
+                for kind in self.METADATA_KINDS:
+                    with self._log_lock(user_id, kind):
+                        items, _ = self._read_log(user_id, kind)
+                        self._compact_log(user_id, kind, legacy.get(kind, []) + list(items.values()))
+                legacy_path.unlink()
+            logger.info(f"Migrated legacy metadata for user {user_id}")
         except Exception as e:
-            logger.error(f"Failed to save metadata for user {user_id}: {e}")
-            raise Exception(f"Failed to save metadata: {str(e)}")
+            logger.error(f"Failed to migrate legacy metadata for user {user_id}: {e}")
+
+    def _get_item(self, user_id: str, kind: str, item_id: str) -> Optional[Dict]:
+        """Look up one item by id in the folded metadata log."""
+        self._migrate_legacy_metadata(user_id)
+        try:
+            items, _ = self._read_log(user_id, kind)
+        except Exception as e:
+            logger.error(f"Failed to load {kind} metadata for user {user_id}: {e}")
+            return None
+        return items.get(item_id)
+
+    def _load_metadata(self, user_id: str) -> Dict:
+        """
+        Load user's media metadata.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            Dictionary with 'photos' and 'audio' lists
+        """
+        self._migrate_legacy_metadata(user_id)
+
+        metadata = {}
+        for kind in self.METADATA_KINDS:
+            try:
+                items, _ = self._read_log(user_id, kind)
+                metadata[kind] = list(items.values())
+            except Exception as e:
+                logger.error(f"Failed to load {kind} metadata for user {user_id}: {e}")
+                metadata[kind] = []
+        return metadata
 
     def save_photo(
         self,
@@ -120,7 +355,7 @@ class MediaStorage:
         """
         try:
             # Generate unique photo ID
-            photo_id = str(uuid.uuid4())
+            photo_id = uuid.uuid4().hex
 
             # Get user directory
             user_dir = self._get_user_photo_dir(user_id)
@@ -147,9 +382,7 @@ class MediaStorage:
             )
 
             # Update user metadata
-            user_metadata = self._load_metadata(user_id)
-            user_metadata["photos"].append(metadata.model_dump())
-            self._save_metadata(user_id, user_metadata)
+            self._append_record(user_id, "photos", {"op": "add", "item": metadata.model_dump(mode="json")})
 
             logger.info(f"Saved photo {photo_id} for user {user_id}: {photo_path}")
 
@@ -159,6 +392,31 @@ class MediaStorage:
             logger.error(f"Failed to save photo: {e}")
             raise Exception(f"Failed to save photo: {str(e)}")
 
+    async def save_photo_async(
+        self,
+        user_id: str,
+        photo_data: bytes,
+        thumbnail_data: bytes,
+        filename: str,
+        dimensions: Tuple[int, int]
+    ) -> PhotoMetadata:
+        """
+        Run save_photo in a worker thread without blocking the event loop.
+
+        Args:
+            user_id: User identifier
+            photo_data: Processed photo bytes
+            thumbnail_data: Thumbnail bytes
+            filename: Sanitized filename
+            dimensions: Image dimensions (width, height)
+
+        Returns:
+            PhotoMetadata object
+        """
+        return await asyncio.to_thread(
+            self.save_photo, user_id, photo_data, thumbnail_data, filename, dimensions
+        )
+
     def save_audio(
         self,
         user_id: str,
@@ -182,7 +440,7 @@ class MediaStorage:
         """
         try:
             # Generate unique audio ID
-            audio_id = str(uuid.uuid4())
+            audio_id = uuid.uuid4().hex
 
             # Get user directory
             user_dir = self._get_user_audio_dir(user_id)
@@ -204,9 +462,7 @@ class MediaStorage:
             )
 
             # Update user metadata
-            user_metadata = self._load_metadata(user_id)
-            user_metadata["audio"].append(metadata.model_dump())
-            self._save_metadata(user_id, user_metadata)
+            self._append_record(user_id, "audio", {"op": "add", "item": metadata.model_dump(mode="json")})
 
             logger.info(f"Saved audio {audio_id} for user {user_id}: {audio_path}")
 
@@ -228,6 +484,30 @@ class MediaStorage:
         """
         return self._load_metadata(user_id)
 
+    def find_media_file(self, kind: str, user_id: str, filename: str) -> Optional[Tuple[Path, os.stat_result]]:
+        """
+        Locate a stored media file for serving, with a single stat() call.
+
+        Read paths never create directories, so lookups for unknown users or
+        files cost one failed stat and nothing else.
+
+        Args:
+            kind: 'photos' or 'audio'
+            user_id: User identifier
+            filename: File name within the user's directory
+
+        Returns:
+            Tuple of (path, stat result) so the caller needn't stat again,
+            or None if no regular file exists there
+        """
+        base_dir = self.photos_dir if kind == "photos" else self.audio_dir
+        path = base_dir / user_id / filename
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return (path, st) if stat.S_ISREG(st.st_mode) else None
+
     def get_photo_path(self, user_id: str, photo_id: str) -> Optional[Path]:
         """
         Get path to a photo file.
@@ -239,8 +519,8 @@ class MediaStorage:
         Returns:
             Path to photo file, or None if not found
         """
-        photo_path = self._get_user_photo_dir(user_id) / f"{photo_id}.jpg"
-        return photo_path if photo_path.exists() else None
+        found = self.find_media_file("photos", user_id, f"{photo_id}.jpg")
+        return found[0] if found else None
 
     def get_audio_path(self, user_id: str, audio_id: str) -> Optional[Path]:
         """
@@ -253,8 +533,8 @@ class MediaStorage:
         Returns:
             Path to audio file, or None if not found
         """
-        audio_path = self._get_user_audio_dir(user_id) / f"{audio_id}.mp3"
-        return audio_path if audio_path.exists() else None
+        found = self.find_media_file("audio", user_id, f"{audio_id}.mp3")
+        return found[0] if found else None
 
     def delete_photo(self, user_id: str, photo_id: str) -> bool:
         """
@@ -287,12 +567,7 @@ class MediaStorage:
                 return False
 
             # Update metadata
-            user_metadata = self._load_metadata(user_id)
-            user_metadata["photos"] = [
-                p for p in user_metadata["photos"]
-                if p["photo_id"] != photo_id
-            ]
-            self._save_metadata(user_id, user_metadata)
+            self._delete_record(user_id, "photos", photo_id)
 
             logger.info(f"Deleted photo {photo_id} for user {user_id}")
             return True
@@ -325,12 +600,7 @@ class MediaStorage:
             audio_path.unlink()
 
             # Update metadata
-            user_metadata = self._load_metadata(user_id)
-            user_metadata["audio"] = [
-                a for a in user_metadata["audio"]
-                if a["audio_id"] != audio_id
-            ]
-            self._save_metadata(user_id, user_metadata)
+            self._delete_record(user_id, "audio", audio_id)
 
             logger.info(f"Deleted audio {audio_id} for user {user_id}")
             return True
@@ -350,11 +620,8 @@ class MediaStorage:
         Returns:
             PhotoMetadata object or None if not found
         """
-        user_metadata = self._load_metadata(user_id)
-        for photo in user_metadata["photos"]:
-            if photo["photo_id"] == photo_id:
-                return PhotoMetadata(**photo)
-        return None
+        photo = self._get_item(user_id, "photos", photo_id)
+        return PhotoMetadata(**photo) if photo is not None else None
 
     def get_audio_metadata(self, user_id: str, audio_id: str) -> Optional[AudioMetadata]:
         """
@@ -367,8 +634,5 @@ class MediaStorage:
         Returns:
             AudioMetadata object or None if not found
         """
-        user_metadata = self._load_metadata(user_id)
-        for audio in user_metadata["audio"]:
-            if audio["audio_id"] == audio_id:
-                return AudioMetadata(**audio)
-        return None
+        audio = self._get_item(user_id, "audio", audio_id)
+        return AudioMetadata(**audio) if audio is not None else None
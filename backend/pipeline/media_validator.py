@@ -4,17 +4,31 @@ Media file validation for custom photo and audio uploads.
 Validates file types, sizes, and formats for security and compatibility.
 """
 
+import asyncio
 import logging
 import re
+import struct
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import TYPE_CHECKING, List, Tuple, Optional
 import io
 
-from PIL import Image
 from fastapi import UploadFile, HTTPException
 
+if TYPE_CHECKING:
+    from PIL import Image
+
 logger = logging.getLogger(__name__)
 
+# JPEG markers that carry frame dimensions (SOF0-SOF15, minus DHT/JPG/DAC)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# JPEG markers without a length field (TEM, RST0-7, SOI, EOI)
+JPEG_STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xDA)])
+
+# A run of characters not allowed in filenames, underscores included, so one
+# substitution both replaces them and collapses the result to a single "_"
+FILENAME_UNSAFE_RUN_RE = re.compile(r"[^a-zA-Z0-9-]+")
+
 
 class MediaValidator:
     """Validates uploaded media files for security and compatibility."""
@@ -22,6 +36,7 @@ class MediaValidator:
     # File size limits
     MAX_PHOTO_SIZE = 10 * 1024 * 1024  # 10 MB
     MAX_AUDIO_SIZE = 2 * 1024 * 1024   # 2 MB
+    UPLOAD_CHUNK_SIZE = 64 * 1024      # Read size when streaming uploads
 
     # Image constraints
     MIN_IMAGE_DIMENSION = 512
@@ -31,19 +46,33 @@ class MediaValidator:
     MIN_AUDIO_DURATION = 2.0  # seconds
     MAX_AUDIO_DURATION = 5.0  # seconds
 
-    # Allowed MIME types
+    # Allowed MIME types and the magic bytes each file starts with
     ALLOWED_IMAGE_TYPES = {
         "image/jpeg": [b"\xff\xd8\xff"],
         "image/png": [b"\x89PNG\r\n\x1a\n"],
-        "image/webp": [b"RIFF", b"WEBP"],
+        "image/webp": [b"RIFF"],
     }
 
     ALLOWED_AUDIO_TYPES = {
         "audio/mpeg": [b"\xff\xfb", b"\xff\xf3", b"\xff\xf2", b"ID3"],
-        "audio/wav": [b"RIFF", b"WAVE"],
+        "audio/wav": [b"RIFF"],
         "audio/webm": [b"\x1a\x45\xdf\xa3"],
     }
 
+    # RIFF containers share the "RIFF" prefix; the form type at offset 8 says
+    # which format the file is
+    RIFF_FORMS = {b"WEBP": "image/webp", b"WAVE": "audio/wav"}
+
+    # Leading magic bytes -> MIME type, so a file is identified with one dict
+    # lookup per distinct signature length (none is a prefix of another)
+    SIGNATURE_TABLE = {
+        signature: mime
+        for mime, signatures in [*ALLOWED_IMAGE_TYPES.items(), *ALLOWED_AUDIO_TYPES.items()]
+        for signature in signatures
+        if signature != b"RIFF"
+    }
+    SIGNATURE_LENGTHS = sorted({len(signature) for signature in SIGNATURE_TABLE})
+
     @staticmethod
     def sanitize_filename(filename: str) -> str:
         """
@@ -61,11 +90,8 @@ class MediaValidator:
         # Remove extension temporarily
         name, ext = Path(filename).stem, Path(filename).suffix
 
-        # Replace spaces and special chars with underscores
-        name = re.sub(r'[^a-zA-Z0-9_-]', '_', name)
-
-        # Remove multiple consecutive underscores
-        name = re.sub(r'_+', '_', name)
+        # Replace runs of spaces, special chars and underscores with one underscore
+        name = FILENAME_UNSAFE_RUN_RE.sub('_', name)
 
         # Trim underscores from start/end
         name = name.strip('_')
@@ -80,8 +106,8 @@ class MediaValidator:
 
         return f"{name}{ext.lower()}"
 
-    @staticmethod
-    def check_file_signature(file_data: bytes, mime_type: str, allowed_types: dict) -> bool:
+    @classmethod
+    def check_file_signature(cls, file_data: bytes, mime_type: str, allowed_types: dict) -> bool:
         """
         Check file magic bytes to verify file type.
 
@@ -96,25 +122,18 @@ class MediaValidator:
         if mime_type not in allowed_types:
             return False
 
-        signatures = allowed_types[mime_type]
-        for signature in signatures:
-            if file_data.startswith(signature):
-                return True
-
-        # Special case for WebP (signature is at offset 8)
-        if mime_type == "image/webp" and len(file_data) >= 12:
-            if file_data[:4] == b"RIFF" and file_data[8:12] == b"WEBP":
-                return True
+        if file_data[:4] == b"RIFF":
+            return cls.RIFF_FORMS.get(file_data[8:12]) == mime_type
 
-        # Special case for WAV (WAVE signature at offset 8)
-        if mime_type == "audio/wav" and len(file_data) >= 12:
-            if file_data[:4] == b"RIFF" and file_data[8:12] == b"WAVE":
-                return True
+        for length in cls.SIGNATURE_LENGTHS:
+            detected = cls.SIGNATURE_TABLE.get(file_data[:length])
+            if detected is not None:
+                return detected == mime_type
 
         return False
 
     @staticmethod
-    def strip_exif_data(image: Image.Image) -> Image.Image:
+    def strip_exif_data(image: "Image.Image") -> "Image.Image":
         """
         Remove EXIF metadata from image for privacy/security.
 
@@ -124,12 +143,159 @@ class MediaValidator:
         Returns:
             Image without EXIF data
         """
-        # Create a new image without EXIF data
-        data = list(image.getdata())
-        image_without_exif = Image.new(image.mode, image.size)
-        image_without_exif.putdata(data)
+        # Rebuild from the raw pixel buffer: one C-level copy that carries over
+        # none of the source metadata (a palette is the only state to keep)
+        from PIL import Image
+
+        image_without_exif = Image.frombytes(image.mode, image.size, image.tobytes())
+        if image.mode == "P":
+            image_without_exif.putpalette(image.getpalette())
         return image_without_exif
 
+    @staticmethod
+    def _dimensions_from_header(content: bytes, mime_type: str) -> Optional[Tuple[int, int]]:
+        """
+        Read image dimensions from the file header without involving PIL.
+
+        Args:
+            content: Complete image bytes (signature already verified)
+            mime_type: Verified MIME type
+
+        Returns:
+            (width, height), or None if the header isn't in a recognized layout
+        """
+        if mime_type == "image/png":
+            # IHDR is always the first chunk: width and height as big-endian u32
+            if len(content) >= 24 and content[12:16] == b"IHDR":
+                return struct.unpack(">II", content[16:24])
+            return None
+
+        if mime_type == "image/jpeg":
+            # Walk the marker segments up to the first start-of-frame
+            offset = 2
+            while offset + 9 <= len(content):
+                if content[offset] != 0xFF:
+                    return None
+                marker = content[offset + 1]
+                if marker == 0xFF:  # Fill byte
+                    offset += 1
+                    continue
+                if marker in JPEG_STANDALONE_MARKERS:
+                    offset += 2
+                    continue
+                if marker in JPEG_SOF_MARKERS:
+                    height, width = struct.unpack(">HH", content[offset + 5:offset + 9])
+                    return width, height
+                segment_length = struct.unpack(">H", content[offset + 2:offset + 4])[0]
+                offset += 2 + segment_length
+            return None
+
+        if mime_type == "image/webp" and len(content) >= 30:
+            chunk = content[12:16]
+            if chunk == b"VP8 " and content[23:26] == b"\x9d\x01\x2a":
+                width, height = struct.unpack("<HH", content[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L" and content[20] == 0x2F:
+                bits = int.from_bytes(content[21:25], "little")
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b"VP8X":
+                width = int.from_bytes(content[24:27], "little") + 1
+                height = int.from_bytes(content[27:30], "little") + 1
+                return width, height
+
+        return None
+
+    @staticmethod
+    def _wav_duration(content: bytes) -> Optional[float]:
+        """
+        Compute a PCM WAV file's duration from its fmt and data chunk headers.
+
+        Args:
+            content: Complete WAV bytes (signature already verified)
+
+        Returns:
+            Duration in seconds, or None if the chunks can't be read
+        """
+        byte_rate = None
+        offset = 12  # After "RIFF" <size> "WAVE"
+        while offset + 8 <= len(content):
+            chunk_id = content[offset:offset + 4]
+            chunk_size = struct.unpack("<I", content[offset + 4:offset + 8])[0]
+            if chunk_id == b"fmt " and chunk_size >= 16:
+                # Average bytes per second = sample_rate * channels * bits / 8
+                byte_rate = struct.unpack("<I", content[offset + 16:offset + 20])[0]
+            elif chunk_id == b"data":
+                if not byte_rate:
+                    return None
+                # Streamed WAVs may leave the size unset; use the bytes we have
+                data_size = min(chunk_size, len(content) - offset - 8)
+                return data_size / byte_rate
+            offset += 8 + chunk_size + (chunk_size & 1)  # Chunks are word-aligned
+        return None
+
+    @staticmethod
+    def _decode_audio_duration(content: bytes, mime_type: str) -> float:
+        """
+        Measure audio duration by parsing the file with mutagen or pydub.
+
+        Blocking (pydub runs ffmpeg for WebM), so callers run it in a thread.
+
+        Args:
+            content: Complete audio bytes (signature already verified)
+            mime_type: Verified MIME type
+
+        Returns:
+            Duration in seconds
+        """
+        if mime_type == "audio/mpeg":
+            from mutagen.mp3 import MP3
+            return MP3(io.BytesIO(content)).info.length
+        if mime_type == "audio/wav":
+            from mutagen.wave import WAVE
+            return WAVE(io.BytesIO(content)).info.length
+        # Fallback to pydub for WebM
+        from pydub import AudioSegment
+        audio_segment = AudioSegment.from_file(io.BytesIO(content), format="webm")
+        return len(audio_segment) / 1000.0
+
+    async def _read_upload(self, upload: UploadFile, max_size: int, label: str) -> bytes:
+        """
+        Read an upload in chunks, rejecting it as soon as it exceeds max_size.
+
+        Oversized uploads are refused from the declared size or after at most
+        max_size + one chunk has been read, never buffered in full.
+
+        Args:
+            upload: Uploaded file
+            max_size: Maximum allowed size in bytes
+            label: "Photo" or "Audio", for error messages
+
+        Returns:
+            File content
+
+        Raises:
+            HTTPException: If the file is too large or empty
+        """
+        too_large = HTTPException(
+            status_code=400,
+            detail=f"{label} size exceeds maximum allowed size of {max_size / 1024 / 1024:.1f}MB"
+        )
+        if upload.size is not None and upload.size > max_size:
+            raise too_large
+
+        chunks = []
+        total = 0
+        while chunk := await upload.read(self.UPLOAD_CHUNK_SIZE):
+            total += len(chunk)
+            if total > max_size:
+                raise too_large
+            chunks.append(chunk)
+
+        if total == 0:
+            raise HTTPException(status_code=400, detail=f"{label} file is empty")
+
+        return b"".join(chunks)
+
     async def validate_photo(self, photo: UploadFile) -> Tuple[bytes, str]:
         """
         Validate uploaded photo file.
@@ -143,20 +309,7 @@ class MediaValidator:
         Raises:
             HTTPException: If validation fails
         """
-        # Check file size
-        content = await photo.read()
-        file_size = len(content)
-
-        if file_size > self.MAX_PHOTO_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Photo size exceeds maximum allowed size of {self.MAX_PHOTO_SIZE / 1024 / 1024:.1f}MB"
-            )
-
-        if file_size == 0:
-            raise HTTPException(status_code=400, detail="Photo file is empty")
-
-        # Check MIME type
+        # Check MIME type before reading anything
         mime_type = photo.content_type
         if mime_type not in self.ALLOWED_IMAGE_TYPES:
             raise HTTPException(
@@ -164,6 +317,10 @@ class MediaValidator:
                 detail=f"Unsupported image type: {mime_type}. Allowed: JPEG, PNG, WebP"
             )
 
+        # Check file size while reading
+        content = await self._read_upload(photo, self.MAX_PHOTO_SIZE, "Photo")
+        file_size = len(content)
+
         # Verify file signature (magic bytes)
         if not self.check_file_signature(content[:12], mime_type, self.ALLOWED_IMAGE_TYPES):
             raise HTTPException(
@@ -171,27 +328,34 @@ class MediaValidator:
                 detail="File signature does not match claimed image type (possible file spoofing)"
             )
 
-        # Validate image can be opened and check dimensions
+        # Check dimensions from the header bytes alone; PIL is only imported for
+        # the rare header layout the parser doesn't recognize, and then runs in
+        # a worker thread, off the event loop
         try:
-            image = Image.open(io.BytesIO(content))
-            width, height = image.size
-
-            if width < self.MIN_IMAGE_DIMENSION or height < self.MIN_IMAGE_DIMENSION:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Image dimensions too small. Minimum: {self.MIN_IMAGE_DIMENSION}x{self.MIN_IMAGE_DIMENSION}"
-                )
-
-            if width > self.MAX_IMAGE_DIMENSION or height > self.MAX_IMAGE_DIMENSION:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Image dimensions too large. Maximum: {self.MAX_IMAGE_DIMENSION}x{self.MAX_IMAGE_DIMENSION}"
-                )
-
+            dimensions = self._dimensions_from_header(content, mime_type)
+            if dimensions is None:
+                from PIL import Image
+
+                logger.debug("Image header not recognized, falling back to PIL")
+                image = await asyncio.to_thread(Image.open, io.BytesIO(content))
+                dimensions = image.size
+            width, height = dimensions
         except Exception as e:
             logger.error(f"Failed to validate image: {e}")
             raise HTTPException(status_code=400, detail=f"Invalid or corrupted image file: {str(e)}")
 
+        if width < self.MIN_IMAGE_DIMENSION or height < self.MIN_IMAGE_DIMENSION:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Image dimensions too small. Minimum: {self.MIN_IMAGE_DIMENSION}x{self.MIN_IMAGE_DIMENSION}"
+            )
+
+        if width > self.MAX_IMAGE_DIMENSION or height > self.MAX_IMAGE_DIMENSION:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Image dimensions too large. Maximum: {self.MAX_IMAGE_DIMENSION}x{self.MAX_IMAGE_DIMENSION}"
+            )
+
         # Sanitize filename
         sanitized_filename = self.sanitize_filename(photo.filename or "photo.jpg")
 
@@ -199,6 +363,24 @@ class MediaValidator:
 
         return content, sanitized_filename
 
+    async def validate_photos_batch(self, photos: List[UploadFile]) -> List[Tuple[bytes, str]]:
+        """
+        Validate many uploaded photos in one call.
+
+        Reads and checks run concurrently; since dimensions come from header
+        parsing, the batch costs little more than its uploads' I/O.
+
+        Args:
+            photos: Uploaded photo files
+
+        Returns:
+            List of (file_content, sanitized_filename), in input order
+
+        Raises:
+            HTTPException: If any photo fails validation
+        """
+        return list(await asyncio.gather(*(self.validate_photo(photo) for photo in photos)))
+
     async def validate_audio(self, audio: UploadFile) -> Tuple[bytes, str, float]:
         """
         Validate uploaded audio file.
@@ -212,20 +394,7 @@ class MediaValidator:
         Raises:
             HTTPException: If validation fails
         """
-        # Check file size
-        content = await audio.read()
-        file_size = len(content)
-
-        if file_size > self.MAX_AUDIO_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Audio size exceeds maximum allowed size of {self.MAX_AUDIO_SIZE / 1024 / 1024:.1f}MB"
-            )
-
-        if file_size == 0:
-            raise HTTPException(status_code=400, detail="Audio file is empty")
-
-        # Check MIME type
+        # Check MIME type before reading anything
         mime_type = audio.content_type
         if mime_type not in self.ALLOWED_AUDIO_TYPES:
             raise HTTPException(
@@ -233,6 +402,10 @@ class MediaValidator:
                 detail=f"Unsupported audio type: {mime_type}. Allowed: MP3, WAV, WebM"
             )
 
+        # Check file size while reading
+        content = await self._read_upload(audio, self.MAX_AUDIO_SIZE, "Audio")
+        file_size = len(content)
+
         # Verify file signature (magic bytes)
         if not self.check_file_signature(content[:12], mime_type, self.ALLOWED_AUDIO_TYPES):
             raise HTTPException(
@@ -240,54 +413,29 @@ class MediaValidator:
                 detail="File signature does not match claimed audio type (possible file spoofing)"
             )
 
-        # Get audio duration using mutagen or pydub
+        # Get audio duration from the in-memory bytes (no temp file); PCM WAV
+        # headers are read inline, anything needing a decoder runs in a thread
         try:
-            import tempfile
-            from mutagen.mp3 import MP3
-            from mutagen.wave import WAVE
-            from pydub import AudioSegment
-
-            # Write to temp file for duration check
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(audio.filename or "audio").suffix) as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-
-            try:
-                # Try mutagen first (more accurate)
-                if mime_type == "audio/mpeg":
-                    audio_file = MP3(tmp_path)
-                    duration = audio_file.info.length
-                elif mime_type == "audio/wav":
-                    audio_file = WAVE(tmp_path)
-                    duration = audio_file.info.length
-                else:
-                    # Fallback to pydub for WebM
-                    audio_segment = AudioSegment.from_file(tmp_path)
-                    duration = len(audio_segment) / 1000.0
-
-                # Validate duration
-                if duration < self.MIN_AUDIO_DURATION:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Audio too short. Minimum duration: {self.MIN_AUDIO_DURATION}s, got: {duration:.2f}s"
-                    )
-
-                if duration > self.MAX_AUDIO_DURATION:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Audio too long. Maximum duration: {self.MAX_AUDIO_DURATION}s, got: {duration:.2f}s"
-                    )
-
-            finally:
-                # Clean up temp file
-                Path(tmp_path).unlink(missing_ok=True)
-
-        except HTTPException:
-            raise
+            duration = self._wav_duration(content) if mime_type == "audio/wav" else None
+            if duration is None:
+                duration = await asyncio.to_thread(self._decode_audio_duration, content, mime_type)
         except Exception as e:
             logger.error(f"Failed to validate audio: {e}")
             raise HTTPException(status_code=400, detail=f"Invalid or corrupted audio file: {str(e)}")
 
+        # Validate duration
+        if duration < self.MIN_AUDIO_DURATION:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Audio too short. Minimum duration: {self.MIN_AUDIO_DURATION}s, got: {duration:.2f}s"
+            )
+
+        if duration > self.MAX_AUDIO_DURATION:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Audio too long. Maximum duration: {self.MAX_AUDIO_DURATION}s, got: {duration:.2f}s"
+            )
+
         # Sanitize filename
         sanitized_filename = self.sanitize_filename(audio.filename or "audio.mp3")
 
@@ -11,6 +11,7 @@ from pathlib import Path
 import asyncio
 import replicate
 import os
+import aiofiles
 import httpx
 
 logger = logging.getLogger(__name__)
@@ -19,6 +20,12 @@ logger = logging.getLogger(__name__)
 class NanoBananaGenerator:
     """Generate customized character images using Nano Banana."""
 
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Bytes per streamed download chunk
+
+    # Shared download client, so TLS sessions and HTTP/2 connections are
+    # reused across generations instead of re-negotiated for every image
+    _client: Optional[httpx.AsyncClient] = None
+
     def __init__(self, api_token: Optional[str] = None):
         """
         Initialize the Nano Banana generator.
@@ -34,6 +41,24 @@ class NanoBananaGenerator:
         if self.api_token:
             os.environ["REPLICATE_API_TOKEN"] = self.api_token
 
+    @classmethod
+    def _get_client(cls) -> httpx.AsyncClient:
+        """Return the shared download client, creating it on first use."""
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+                timeout=httpx.Timeout(60.0),
+            )
+        return cls._client
+
+    @classmethod
+    async def close_shared_resources(cls):
+        """Close the shared download client (call on shutdown)."""
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+
     async def generate_image(
         self,
         prompt: str,
@@ -106,12 +131,12 @@ class NanoBananaGenerator:
 
             # Download from URL
             logger.info(f"Downloading generated image from: {image_url}")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(image_url)
+            # Stream straight to disk so the image is never held in memory
+            async with self._get_client().stream("GET", image_url) as response:
                 response.raise_for_status()
-
-                with open(output_path, 'wb') as f:
-                    f.write(response.content)
+                async with aiofiles.open(output_path, 'wb') as f:
+                    async for chunk in response.aiter_bytes(self.DOWNLOAD_CHUNK_SIZE):
+                        await f.write(chunk)
 
             logger.info(f"Generated image saved to {output_path}")
 
@@ -0,0 +1,60 @@
+"""
+Shared OpenAI Client Module
+
+One AsyncOpenAI client per API key, shared by every generator so TLS sessions
+and HTTP/2 connections survive across LLM calls, generator instances and
+pipeline runs instead of each instance opening its own connection pool.
+"""
+
+import logging
+import os
+from typing import Dict
+
+import httpx
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+_OPENAI_CLIENTS: Dict[str, AsyncOpenAI] = {}
+
+
+def get_openai_client(api_key: str) -> AsyncOpenAI:
+    """
+    Return the shared AsyncOpenAI client for an API key, creating it on first use.
+
+    Args:
+        api_key: OpenAI API key
+
+    Returns:
+        AsyncOpenAI client backed by a pooled HTTP/2 connection
+    """
+    client = _OPENAI_CLIENTS.get(api_key)
+    if client is None:
+        http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=32,
+                max_keepalive_connections=20,
+                keepalive_expiry=300,
+            ),
+            # Same 10 minute read budget as the SDK default, for long
+            # non-streaming completions; fail fast on unreachable hosts
+            timeout=httpx.Timeout(600.0, connect=5.0),
+        )
+        # The SDK retries 429/5xx with exponential backoff and jitter, honoring
+        # Retry-After; allow a few more attempts than its default of 2
+        client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "4")),
+        )
+        _OPENAI_CLIENTS[api_key] = client
+    return client
+
+
+async def close_openai_clients():
+    """Close every shared client's connection pool (call on shutdown)."""
+    for client in _OPENAI_CLIENTS.values():
+        await client.close()
+    _OPENAI_CLIENTS.clear()
+    logger.info("Closed shared OpenAI clients")
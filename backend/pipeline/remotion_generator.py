@@ -8,163 +8,57 @@ Validates generated code and retries with error feedback up to 3 times.
 import logging
 from typing import Callable, Optional, List, Dict, Tuple
 from pathlib import Path
+from collections import Counter, deque
 import asyncio
-import subprocess
+import codecs
+import functools
+import hashlib
+import os
 import re
-from openai import AsyncOpenAI
 import json
 import shutil
+import signal
 
-logger = logging.getLogger(__name__)
-
-
-class RemotionGenerator:
-    """Generate and validate Remotion code with self-fixing loop."""
-
-    MAX_RETRIES = 3
-
-    def __init__(self, api_key: str):
-        """
-        Initialize the Remotion generator.
-
-        Args:
-            api_key: OpenAI API key
-        """
-        self.client = AsyncOpenAI(api_key=api_key)
-        self.model = "gpt-4o"
-
-    async def generate_remotion_code(
-        self,
-        visual_instructions: List[Dict],
-        topic: str,
-        output_dir: Path,
-        target_duration: float = 60.0,
-        progress_callback: Optional[Callable[[str, int], None]] = None,
-        script: Optional[List[Dict[str, str]]] = None,
-    ) -> Path:
-        """
-        Generate Remotion code from visual instructions with self-fixing.
-
-        Args:
-            visual_instructions: List of visual instruction segments
-            topic: Educational topic
-            output_dir: Directory to save the generated Remotion project
-            target_duration: Target duration in seconds
-            progress_callback: Optional callback for progress updates
-
-        Returns:
-            Path to the generated and validated Remotion project directory
-
-        Raises:
-            Exception: If code generation fails after max retries
-        """
-        if progress_callback:
-            progress_callback("Generating Remotion code...", 50)
-
-        remotion_code = None
-        last_error = None
-        conversation_history = []
-
-        for attempt in range(self.MAX_RETRIES):
-            try:
-                logger.info(f"Remotion code generation attempt {attempt + 1}/{self.MAX_RETRIES}")
-
-                if progress_callback:
-                    progress_callback(
-                        f"Generating Remotion code (attempt {attempt + 1}/{self.MAX_RETRIES})...",
-                        50 + (attempt * 3),
-                    )
-
-                # Generate code
-                if attempt == 0:
-                    remotion_code, conversation_history = await self._generate_initial_code(
-                        visual_instructions, topic, target_duration, script
-                    )
-                else:
-                    remotion_code, conversation_history = await self._fix_code(
-                        remotion_code, last_error, conversation_history, attempt
-                    )
-
-                # Setup Remotion project structure
-                await self._setup_remotion_project(output_dir, remotion_code)
-
-                # Validate code (TypeScript/syntax check)
-                is_valid, error_message = await self._validate_code(output_dir)
-
-                if not is_valid:
-                    logger.warning(
-                        f"Validation failed (attempt {attempt + 1}): {error_message}"
-                    )
-                    # Log the generated code for debugging
-                    root_file = output_dir / "src" / "Root.tsx"
-                    if root_file.exists():
-                        generated_code = root_file.read_text(encoding="utf-8")
-                        logger.debug(f"Generated code (first 1000 chars):\n{generated_code[:1000]}")
-                    last_error = f"Validation Error:\n{error_message}"
-                    continue
-
-                logger.info("Remotion code generated and validated successfully")
-                if progress_callback:
-                    progress_callback("Remotion code validated successfully", 59)
-                return output_dir
-
-            except Exception as e:
-                import traceback
-                error_traceback = traceback.format_exc()
-                logger.error(f"Exception during attempt {attempt + 1}: {e}")
-                logger.error(f"Traceback:\n{error_traceback}")
-                last_error = f"Exception:\n{str(e)}\n\nTraceback:\n{error_traceback}"
-                continue
-
-        # Max retries exceeded
-        error_msg = f"Failed to generate valid Remotion code after {self.MAX_RETRIES} attempts. Last error: {last_error}"
-        logger.error(error_msg)
-        raise Exception(error_msg)
-
-    async def _generate_initial_code(
-        self, visual_instructions: List[Dict], topic: str, target_duration: float = 60.0, script: Optional[List[Dict[str, str]]] = None
-    ) -> Tuple[str, List[Dict]]:
-        """Generate initial Remotion code from visual instructions.
-
-        Returns:
-            Tuple of (generated_code, conversation_history)
-        """
-        system_prompt = """Generate Remotion code for educational animations with DIAGRAMS, EQUATIONS, and ILLUSTRATIONS.
-
-CANVAS: 1080x960 (9:8), 30fps. Safe area: 50px margins.
-
-VISUAL TYPES - Render based on visual_type field:
-
-1. EQUATIONS: Math formulas with <Equation> component
-   - E = mc², x² + y² = r², F = ma, etc.
-   - Variables in italic, proper subscripts/superscripts
-
-2. DIAGRAMS: Flowcharts/process diagrams
-   - <Box> for nodes with SHORT labels ("Input", "CPU", "Output")
-   - <Arrow> to connect boxes
-   - NO narration text - subtitles handle that!
-
-3. GRAPHS: Coordinate plots
-   - <GraphAxes> for x/y axes
-   - <PlotCurve> for data
-   - ONLY label axes ("x", "y", "t", etc.)
+import orjson
 
-4. SHAPES: Geometric figures
-   - <Shape> for circles, triangles, squares
-   - Add measurements/angles ONLY ("90°", "5cm")
+from .openai_client import get_openai_client
 
-CRITICAL: NO NARRATION TEXT! Subtitles handle speech. Text is ONLY for:
-- Math equations
-- Short labels on diagrams
-- Axis labels
-- Measurements/annotations
-
-TEMPLATE WITH VISUAL COMPONENT EXAMPLES:
-```tsx
-import React from 'react';
-import { AbsoluteFill, Composition, useCurrentFrame, useVideoConfig, interpolate, spring, Easing, registerRoot } from 'remotion';
+logger = logging.getLogger(__name__)
 
-// EQUATION COMPONENT - For math formulas
+# Fenced TSX code block in an LLM response (first match is used)
+CODE_BLOCK_RE = re.compile(r"```(?:tsx|typescript|ts)?\s*\n(.*?)```", re.DOTALL)
+
+
+@functools.lru_cache(maxsize=8)
+def _extract_code(text: str) -> str:
+    """
+    Extract the first TSX code block from a response, or the whole text if none.
+
+    Memoized since parallel candidates and repeated fallbacks can hand over
+    the same response text more than once.
+    """
+    match = CODE_BLOCK_RE.search(text)
+    return (match.group(1) if match else text).strip()
+
+
+# Landmarks of an assembled Root.tsx, scanned and counted in a single pass:
+# the template provides the imports, export and registerRoot, so any extra
+# one means the model's components repeated them
+STRUCTURE_RE = re.compile(
+    r"(?P<import_statement>^import\b)"
+    r"|(?P<imports>from ['\"]remotion['\"])"
+    r"|(?P<export>export const RemotionRoot\b)"
+    r"|(?P<register>registerRoot\()"
+    r"|(?P<composition><Composition\b)"
+    r"|(?P<scene>(?:const|function) EducationalScene\b)"
+    r"|(?P<fill>AbsoluteFill)",
+    re.MULTILINE,
+)
+
+# Helper components every generated scene can use. They are shown to the model
+# in the system prompt's template and, when scenes are generated in chunks,
+# pasted into the assembled file so every chunk can share them
+REMOTION_HELPER_COMPONENTS = """// EQUATION COMPONENT - For math formulas
 const Equation: React.FC<{text: string; x: number; y: number; startFrame: number; endFrame: number; size?: number}> = ({text, x, y, startFrame, endFrame, size = 48}) => {
   const frame = useCurrentFrame();
   const {fps} = useVideoConfig();
@@ -281,7 +175,47 @@ const Shape: React.FC<{type: 'circle'|'triangle'|'square'; x: number; y: number;
   );
 };
 
-// MAIN SCENE - Implement visual instructions here
+"""
+
+# Static system prompt. Everything request-specific goes in the user message,
+# so every generation and fix request starts with these same bytes and
+# OpenAI's automatic prompt caching can serve this prefix across calls.
+REMOTION_SYSTEM_PROMPT = """Generate Remotion code for educational animations with DIAGRAMS, EQUATIONS, and ILLUSTRATIONS.
+
+CANVAS: 1080x960 (9:8), 30fps. Safe area: 50px margins.
+
+VISUAL TYPES - Render based on visual_type field:
+
+1. EQUATIONS: Math formulas with <Equation> component
+   - E = mc², x² + y² = r², F = ma, etc.
+   - Variables in italic, proper subscripts/superscripts
+
+2. DIAGRAMS: Flowcharts/process diagrams
+   - <Box> for nodes with SHORT labels ("Input", "CPU", "Output")
+   - <Arrow> to connect boxes
+   - NO narration text - subtitles handle that!
+
+3. GRAPHS: Coordinate plots
+   - <GraphAxes> for x/y axes
+   - <PlotCurve> for data
+   - ONLY label axes ("x", "y", "t", etc.)
+
+4. SHAPES: Geometric figures
+   - <Shape> for circles, triangles, squares
+   - Add measurements/angles ONLY ("90°", "5cm")
+
+CRITICAL: NO NARRATION TEXT! Subtitles handle speech. Text is ONLY for:
+- Math equations
+- Short labels on diagrams
+- Axis labels
+- Measurements/annotations
+
+TEMPLATE WITH VISUAL COMPONENT EXAMPLES (the imports, RemotionRoot and registerRoot parts are added for you):
+```tsx
+import React from 'react';
+import { AbsoluteFill, Composition, useCurrentFrame, useVideoConfig, interpolate, spring, Easing, registerRoot } from 'remotion';
+
+""" + REMOTION_HELPER_COMPONENTS + """// MAIN SCENE - Implement visual instructions here
 const EducationalScene: React.FC = () => {
   const frame = useCurrentFrame();
   const {fps} = useVideoConfig();
@@ -364,18 +298,859 @@ STYLING:
 - Inline styles only
 
 CRITICAL STRUCTURE (REQUIRED):
-1. Import React and Remotion components
-2. Define helper components (Equation, Box, etc.)
-3. Define EducationalScene component
-4. EXPORT RemotionRoot: export const RemotionRoot: React.FC = () => (...)
-5. CALL registerRoot: registerRoot(RemotionRoot);
+The file header (React plus AbsoluteFill, Composition, Sequence, useCurrentFrame, useVideoConfig,
+interpolate, spring, Easing and registerRoot from 'remotion') and the footer (export const RemotionRoot
+rendering <Composition id="EducationalScene" ... /> and registerRoot(RemotionRoot)) are added for you.
+Your "components" code must:
+1. Define the helper components you use (Equation, Box, etc.)
+2. Define the EducationalScene component: const EducationalScene: React.FC = () => {...}
+3. Contain NO import statements, NO RemotionRoot and NO registerRoot call
+
+Return ONLY a JSON object of the form {"components": "<TypeScript code>"}, no explanations."""
+
+# Trusted parts of every Root.tsx; the model only writes the components in between
+REMOTION_CODE_HEADER = """import React from 'react';
+import { AbsoluteFill, Composition, Sequence, useCurrentFrame, useVideoConfig, interpolate, spring, Easing, registerRoot } from 'remotion';
+
+"""
+
+REMOTION_CODE_FOOTER = """
+
+export const RemotionRoot: React.FC = () => (
+  <Composition id="EducationalScene" component={{EducationalScene}} durationInFrames={{{duration_frames}}} fps={{30}} width={{1080}} height={{960}} />
+);
+
+registerRoot(RemotionRoot);
+"""
+
+# Structured output schema for every code response
+CODE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "remotion_scene",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"components": {"type": "string"}},
+            "required": ["components"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Structured output schema for a chunk of scenes
+CHUNK_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "remotion_scene_chunk",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"jsx": {"type": "string"}},
+            "required": ["jsx"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# EducationalScene for chunked generation; the chunks' JSX fragments are
+# pasted in as the AbsoluteFill's children, with frame and fps in scope
+REMOTION_CHUNKED_SCENE = """const EducationalScene: React.FC = () => {{
+  const frame = useCurrentFrame();
+  const {{fps}} = useVideoConfig();
+
+  return (
+    <AbsoluteFill style={{{{background: 'linear-gradient(135deg, #0a0a1a 0%, #1a0a2a 100%)'}}}}>
+{fragments}
+    </AbsoluteFill>
+  );
+}};"""
+
+# User prompt for one chunk of scenes, filled in with str.format()
+REMOTION_CHUNK_PROMPT = """TEACHING: {topic}
 
-MUST include both:
-- export const RemotionRoot: React.FC = () => (...)
-- registerRoot(RemotionRoot);
+This request covers ONLY the scenes below, one part of a longer video generated in parallel parts.
 
-Return ONLY TypeScript code, no explanations."""
+VISUAL SCENES TO RENDER:
+{instructions_json}{word_sync_note}
+
+The template's helper components (Equation, Arrow, Box, GraphAxes, PlotCurve, Shape) are already
+defined, and `frame` and `fps` are in scope. Write ONLY the JSX children of EducationalScene's
+<AbsoluteFill> for these scenes - no imports, no component definitions, no RemotionRoot.
+
+CRITICAL - PREVENT CONTENT OVERLAP:
+For EACH scene:
+1. startFrame = scene.timestamp.start * 30
+2. endFrame = next scene's timestamp.start * 30 (OR {end_frame} for the last scene here)
+3. Wrap ALL its components in: {{frame >= startFrame && frame < endFrame && (<>...</>)}}
+4. Elements listed in "cleanup" must NOT appear; keep "builds_on" elements visible
+5. Add a comment before each scene: {{/* Scene: start-end seconds */}}
 
+Return ONLY a JSON object of the form {{"jsx": "<JSX children>"}}, no explanations."""
+
+# Fix request template, filled in with str.format() (literal braces are doubled)
+REMOTION_FIX_PROMPT = """The code you generated has an error. Here's what happened:
+
+ERROR:
+{error_message}
+
+FAILED CODE (first 3000 chars):
+```tsx
+{code_preview}
+```
+
+This is attempt {attempt}/{max_attempts}. Please analyze the error carefully and fix the code.
+
+CRITICAL DEBUGGING TIPS:
+- Imports, RemotionRoot and registerRoot(RemotionRoot) are added around your components - never write them yourself
+- If "Missing EducationalScene" error: You MUST define const EducationalScene: React.FC = () => ...
+- If a component isn't available from the header imports, define it yourself instead of importing it
+- If React error #130 (invalid element type): Component is undefined - check all components are defined before use
+- If syntax errors: Check all JSX tags are properly closed
+- If type errors: Ensure TypeScript types are correct
+
+CONTENT OVERLAP FIX (VERY COMMON ISSUE):
+If content is rendering on top of each other, you MUST use frame-based conditional rendering:
+- BAD: <Equation startFrame={{0}} /> <Equation startFrame={{150}} />  // Both visible at frame 150!
+- GOOD: {{frame >= 0 && frame < 150 && <Equation startFrame={{0}} />}}
+         {{frame >= 150 && frame < 300 && <Equation startFrame={{150}} />}}
+
+For EACH scene, wrap content in: {{frame >= sceneStart && frame < sceneEnd && (<>...</>)}}
+
+Return ONLY a JSON object of the form {{"components": "<complete fixed components code>"}}, no explanations."""
+
+# Long-lived Node processes: one renders compositions with a reused browser,
+# the other syntax-checks generated code with esbuild before any render
+RENDER_WORKER_SCRIPT = Path(__file__).parent / "remotion_render_worker.js"
+SYNTAX_CHECK_SCRIPT = Path(__file__).parent / "remotion_syntax_check.js"
+
+
+class NodeWorker:
+    """
+    Long-lived Node script answering one JSON request per stdin line.
+
+    Requests must be serialized by the caller holding _lock. A worker that
+    exits without ever responding (e.g. its npm package isn't installed) is
+    disabled for the rest of the process, so callers can fall back cheaply.
+    """
+
+    def __init__(self, script: Path, name: str, toggle_env: str):
+        """
+        Args:
+            script: Path to the worker's .js file
+            name: Name used in log messages
+            toggle_env: Env var that disables the worker when false/0/no
+        """
+        self.script = script
+        self.name = name
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+        self._responded = False
+        self.disabled = os.getenv(toggle_env, "true").lower() in ("0", "false", "no")
+
+    async def _ensure_started(self, cwd: Path):
+        if self._proc is not None and self._proc.returncode is None:
+            return
+        await self._stop()
+        logger.info(f"Starting {self.name}")
+        self._proc = await asyncio.create_subprocess_exec(
+            "node", str(self.script),
+            cwd=str(cwd),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+
+    async def _read_response(self) -> Optional[Dict]:
+        """Read the next response line, skipping any stray library output."""
+        while True:
+            line = await self._proc.stdout.readline()
+            if not line:
+                return None
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(response, dict) and "ok" in response:
+                return response
+
+    async def _request(self, payload: Dict, cwd: Path, timeout: float) -> Optional[Dict]:
+        """
+        Send one request and wait for its response.
+
+        Returns:
+            The response, or None if the worker couldn't be used
+
+        Raises:
+            asyncio.TimeoutError: If no response arrives within timeout
+                (the worker is stopped first)
+        """
+        try:
+            await self._ensure_started(cwd)
+            self._proc.stdin.write(json.dumps(payload).encode("utf-8") + b"\n")
+            await self._proc.stdin.drain()
+            response = await asyncio.wait_for(self._read_response(), timeout=timeout)
+        except asyncio.TimeoutError:
+            await self._stop()
+            raise
+        except Exception as e:
+            logger.warning(f"{self.name} error: {e}")
+            response = None
+
+        if response is None:
+            await self._stop()
+            if not self._responded:
+                logger.warning(f"{self.name} unavailable, disabling it")
+                self.disabled = True
+            return None
+
+        self._responded = True
+        return response
+
+    async def _stop(self):
+        if self._proc is not None and self._proc.returncode is None:
+            # Kill the whole group: a browser the worker launched would
+            # otherwise outlive it
+            try:
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await self._proc.wait()
+        self._proc = None
+
+    async def close(self):
+        """Stop the worker process."""
+        async with self._lock:
+            await self._stop()
+
+
+class RemotionRenderWorker(NodeWorker):
+    """
+    Long-lived remotion_render_worker.js process.
+
+    Every `npx remotion render` resolves npx, starts Node, loads the bundler
+    and launches headless Chromium before rendering anything. The worker pays
+    that once and keeps the browser warm across renders. It is restarted
+    after a failed render so a broken scene can't leave the browser in a
+    bad state.
+    """
+
+    def __init__(self):
+        super().__init__(RENDER_WORKER_SCRIPT, "Remotion render worker", "REMOTION_RENDER_WORKER")
+
+    async def render(
+        self, entry: Path, output: Path, composition_id: str, cwd: Path, timeout: float
+    ) -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        Render a composition in the worker.
+
+        Returns:
+            Tuple of (success, error_message), or None if the worker couldn't
+            be used and the caller should fall back to the CLI
+
+        Raises:
+            asyncio.TimeoutError: If the render takes longer than timeout
+        """
+        if self.disabled:
+            return None
+
+        async with self._lock:
+            job = {"entry": str(entry), "out": str(output), "composition": composition_id}
+            response = await self._request(job, cwd, timeout)
+            if response is None:
+                return None
+            if not response["ok"]:
+                await self._stop()
+            return response["ok"], response.get("error")
+
+
+class RemotionSyntaxChecker(NodeWorker):
+    """
+    Long-lived remotion_syntax_check.js process.
+
+    Parses Root.tsx with esbuild in milliseconds, so syntax errors go back to
+    the fixer before a render spends seconds starting the bundler. Checks
+    are best-effort: if esbuild is missing or slow, code is passed through
+    to the render as before.
+    """
+
+    CHECK_TIMEOUT = 15  # Seconds, including Node startup on the first check
+
+    def __init__(self):
+        super().__init__(SYNTAX_CHECK_SCRIPT, "Remotion syntax checker", "REMOTION_SYNTAX_CHECK")
+
+    async def check(self, code: str, cwd: Path) -> Optional[str]:
+        """
+        Syntax-check Root.tsx code.
+
+        Returns:
+            The syntax error, or None if the code parses (or couldn't be checked)
+        """
+        if self.disabled:
+            return None
+
+        async with self._lock:
+            try:
+                response = await self._request({"code": code}, cwd, self.CHECK_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Remotion syntax check timed out, skipping it")
+                return None
+
+        if response is None or response["ok"]:
+            return None
+        return response.get("error") or "Unknown syntax error"
+
+
+class RemotionRenderPool:
+    """
+    Pool of RemotionRenderWorker processes so concurrent jobs render in
+    parallel instead of queueing behind one browser.
+
+    Idle workers are handed out LIFO, so under light load the same warm
+    process is reused. When every worker is busy the caller falls back to
+    the CLI straight away rather than waiting for one to free up.
+    """
+
+    def __init__(self, size: int):
+        self._workers = [RemotionRenderWorker() for _ in range(size)]
+        self._idle: asyncio.LifoQueue = asyncio.LifoQueue()
+        for worker in reversed(self._workers):
+            self._idle.put_nowait(worker)
+
+    async def render(
+        self, entry: Path, output: Path, composition_id: str, cwd: Path, timeout: float
+    ) -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        Render a composition on the next idle worker.
+
+        Returns:
+            Tuple of (success, error_message), or None if no worker could be
+            used and the caller should fall back to the CLI
+
+        Raises:
+            asyncio.TimeoutError: If the render takes longer than timeout
+        """
+        try:
+            worker = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            logger.info("All Remotion render workers busy, rendering with the CLI")
+            return None
+        try:
+            return await worker.render(entry, output, composition_id, cwd, timeout)
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def close(self):
+        """Stop every worker process."""
+        for worker in self._workers:
+            await worker.close()
+
+
+_RENDER_POOL: Optional[RemotionRenderPool] = None
+_SYNTAX_CHECKER: Optional[RemotionSyntaxChecker] = None
+
+
+def _get_render_pool() -> RemotionRenderPool:
+    """Return the shared render worker pool, creating it on first use."""
+    global _RENDER_POOL
+    if _RENDER_POOL is None:
+        size = int(os.getenv("REMOTION_RENDER_WORKERS", "2"))
+        _RENDER_POOL = RemotionRenderPool(max(1, size))
+    return _RENDER_POOL
+
+
+def _get_syntax_checker() -> RemotionSyntaxChecker:
+    """Return the shared syntax checker, creating it on first use."""
+    global _SYNTAX_CHECKER
+    if _SYNTAX_CHECKER is None:
+        _SYNTAX_CHECKER = RemotionSyntaxChecker()
+    return _SYNTAX_CHECKER
+
+
+class RemotionGenerator:
+    """Generate and validate Remotion code with self-fixing loop."""
+
+    MAX_RETRIES = 3
+    PARALLEL_CANDIDATES = ((0.5, 1), (0.6, 2), (0.7, 3))  # (temperature, seed) raced on the first attempt
+    SCENES_PER_CHUNK = 4  # Longer scene lists are generated in parallel chunks of this size
+    LLM_TIMEOUT = 45.0  # Seconds allowed for the first chunk of a completion and between chunks
+    LLM_TOTAL_TIMEOUT = 300.0  # Seconds allowed for one whole completion before the attempt is retried
+    RENDER_TIMEOUT = 600  # Seconds allowed for one render
+    RENDER_OUTPUT_TAIL_LINES = 50  # Lines of CLI output kept for logs and errors
+    FIX_ERROR_CHARS = 2000  # Tail of an error message sent back for fixing
+    TEMPLATE_IMPORTS = 2  # Import statements in REMOTION_CODE_HEADER
+    CACHE_VERSION = 2  # Bump when the prompts change so older cached code is ignored
+
+    def __init__(self, api_key: str, cache_dir: Optional[Path] = None):
+        """
+        Initialize the Remotion generator.
+
+        Args:
+            api_key: OpenAI API key
+            cache_dir: Optional directory for caching code that rendered successfully
+                (defaults to the REMOTION_CACHE_DIR env var; caching is off if unset)
+        """
+        self.client = get_openai_client(api_key)
+        self.model = "gpt-4o"
+
+        # Exact-match cache of validated Root.tsx keyed by a hash of the inputs
+        cache_dir = cache_dir or os.getenv("REMOTION_CACHE_DIR")
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # Project dir -> (cache path, code) awaiting a successful render; code
+        # is None when it came from the cache. Code is only cached once it has
+        # rendered, and a cached entry that fails to render is evicted.
+        self._render_pending: Dict[Path, Tuple[Path, Optional[str]]] = {}
+
+    @staticmethod
+    async def close_shared_resources():
+        """Stop the shared render workers and syntax checker (call on shutdown)."""
+        for worker in (_RENDER_POOL, _SYNTAX_CHECKER):
+            if worker is not None:
+                await worker.close()
+
+    async def generate_remotion_code(
+        self,
+        visual_instructions: List[Dict],
+        topic: str,
+        output_dir: Path,
+        target_duration: float = 60.0,
+        progress_callback: Optional[Callable[[str, int], None]] = None,
+        script: Optional[List[Dict[str, str]]] = None,
+        use_cache: bool = True,
+    ) -> Path:
+        """
+        Generate Remotion code from visual instructions with self-fixing.
+
+        Args:
+            visual_instructions: List of visual instruction segments
+            topic: Educational topic
+            output_dir: Directory to save the generated Remotion project
+            target_duration: Target duration in seconds
+            progress_callback: Optional callback for progress updates
+            script: Optional dialogue script the scenes are timed against
+            use_cache: Whether to reuse cached code (pass False when
+                regenerating after a render failure)
+
+        Returns:
+            Path to the generated and validated Remotion project directory
+
+        Raises:
+            Exception: If code generation fails after max retries
+        """
+        if progress_callback:
+            progress_callback("Generating Remotion code...", 50)
+
+        cache_path = None
+        if self.cache_dir:
+            cache_key = self._cache_key(visual_instructions, topic, target_duration, script)
+            cache_path = self.cache_dir / f"{cache_key}.tsx"
+            if use_cache and await self._load_from_cache(cache_path, output_dir):
+                self._render_pending[output_dir.absolute()] = (cache_path, None)
+                if progress_callback:
+                    progress_callback("Remotion code loaded from cache", 59)
+                return output_dir
+
+        remotion_code = None
+        last_error = None
+        conversation_history = []
+        candidate_tasks = []  # Parallel initial generations
+        failed_codes = {}  # Validation errors by code digest, so repeats fail fast
+
+        try:
+            for attempt in range(self.MAX_RETRIES):
+                try:
+                    logger.info(f"Remotion code generation attempt {attempt + 1}/{self.MAX_RETRIES}")
+
+                    if progress_callback:
+                        progress_callback(
+                            f"Generating Remotion code (attempt {attempt + 1}/{self.MAX_RETRIES})...",
+                            50 + (attempt * 3),
+                        )
+
+                    if attempt == 0:
+                        # Race several initial generations with different sampling
+                        # settings and validate each as soon as it arrives; only
+                        # this loop writes the project, so candidates can't clobber
+                        # each other's files
+                        if len(visual_instructions) > self.SCENES_PER_CHUNK:
+                            # Long videos: one candidate, its scenes generated in parallel chunks
+                            candidate_tasks = [
+                                asyncio.create_task(
+                                    self._generate_chunked_code(
+                                        visual_instructions, topic, target_duration, script
+                                    )
+                                )
+                            ]
+                        else:
+                            candidate_tasks = [
+                                asyncio.create_task(
+                                    self._generate_initial_code(
+                                        visual_instructions, topic, target_duration, script,
+                                        temperature=temperature, seed=seed,
+                                    )
+                                )
+                                for temperature, seed in self.PARALLEL_CANDIDATES
+                            ]
+                        for next_candidate in asyncio.as_completed(candidate_tasks):
+                            # Keep each error with the code that produced it; a
+                            # request that fails leaves the earlier pair in place
+                            try:
+                                candidate_code, candidate_history = await next_candidate
+                            except asyncio.TimeoutError:
+                                logger.warning("Initial candidate timed out")
+                                last_error = last_error or "OpenAI request timed out"
+                                continue
+                            except Exception as e:
+                                logger.warning(f"Initial candidate failed: {e}")
+                                last_error = last_error or f"Exception:\n{str(e)}"
+                                continue
+
+                            candidate_error = await self._validate_candidate(
+                                output_dir, candidate_code, attempt, failed_codes
+                            )
+                            remotion_code, conversation_history, last_error = (
+                                candidate_code, candidate_history, candidate_error
+                            )
+                            if last_error is None:
+                                break
+                    elif remotion_code is None:
+                        # Every earlier request failed outright, so there is
+                        # nothing to fix yet: start over
+                        remotion_code, conversation_history = await self._generate_initial_code(
+                            visual_instructions, topic, target_duration, script
+                        )
+                        last_error = await self._validate_candidate(
+                            output_dir, remotion_code, attempt, failed_codes
+                        )
+                    else:
+                        remotion_code, conversation_history = await self._fix_code(
+                            remotion_code, last_error, conversation_history, attempt,
+                            int(target_duration * 30),
+                        )
+                        last_error = await self._validate_candidate(
+                            output_dir, remotion_code, attempt, failed_codes
+                        )
+
+                    if last_error is not None:
+                        continue
+
+                    logger.info("Remotion code generated and validated successfully")
+                    if cache_path:
+                        # Cached by render_remotion_video() once it renders
+                        self._render_pending[output_dir.absolute()] = (cache_path, remotion_code)
+                    if progress_callback:
+                        progress_callback("Remotion code validated successfully", 59)
+                    return output_dir
+
+                except asyncio.TimeoutError:
+                    # Retry without feeding a timeout back to the fixer as if it
+                    # were a code error; code and history stay as they were
+                    logger.warning(f"OpenAI request timed out (attempt {attempt + 1})")
+                    last_error = last_error or "OpenAI request timed out"
+                    continue
+                except Exception as e:
+                    import traceback
+                    error_traceback = traceback.format_exc()
+                    logger.error(f"Exception during attempt {attempt + 1}: {e}")
+                    logger.error(f"Traceback:\n{error_traceback}")
+                    # Only the LLM requests get here, and they leave the code
+                    # unchanged, so its error still applies
+                    last_error = last_error or f"Exception:\n{str(e)}\n\nTraceback:\n{error_traceback}"
+                    continue
+        finally:
+            for task in candidate_tasks:
+                task.cancel()
+
+        # Max retries exceeded
+        error_msg = f"Failed to generate valid Remotion code after {self.MAX_RETRIES} attempts. Last error: {last_error}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+
+    def _cache_key(
+        self,
+        visual_instructions: List[Dict],
+        topic: str,
+        target_duration: float,
+        script: Optional[List[Dict[str, str]]],
+    ) -> str:
+        """Hash the normalized generation inputs into a cache key."""
+        payload = json.dumps(
+            {
+                "topic": topic,
+                "dur": target_duration,
+                "instr": visual_instructions,
+                "script": script,
+                "version": self.CACHE_VERSION,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _load_from_cache(self, cache_path: Path, output_dir: Path) -> bool:
+        """
+        Set up the project from cached code if it still validates.
+
+        Args:
+            cache_path: Path to the cached Root.tsx
+            output_dir: Directory for the Remotion project
+
+        Returns:
+            True if the cached code was used
+        """
+        if not cache_path.exists():
+            return False
+
+        logger.info(f"Found cached Remotion code: {cache_path}")
+        cached_code = cache_path.read_text(encoding="utf-8")
+
+        error_message = await self._save_and_validate(output_dir, cached_code, 0)
+        if error_message is not None:
+            logger.warning(f"Cached Remotion code no longer validates, regenerating: {error_message}")
+            return False
+
+        logger.info("Using cached Remotion code")
+        return True
+
+    def _settle_cache(self, project_dir: Path, rendered: bool):
+        """
+        Cache a project's code after a successful render, or evict a cached
+        entry whose code failed to render.
+        """
+        pending = self._render_pending.pop(project_dir.absolute(), None)
+        if pending is None:
+            return
+        cache_path, remotion_code = pending
+        if rendered and remotion_code is not None:
+            self._store_in_cache(cache_path, remotion_code)
+        elif not rendered and remotion_code is None:
+            logger.warning(f"Cached Remotion code failed to render, evicting {cache_path}")
+            cache_path.unlink(missing_ok=True)
+
+    def _store_in_cache(self, cache_path: Path, remotion_code: str):
+        """Write rendered code to the cache atomically, so readers never see a partial file."""
+        tmp_path = cache_path.with_suffix(f".tmp.{os.getpid()}")
+        try:
+            tmp_path.write_text(remotion_code, encoding="utf-8")
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            tmp_path.unlink(missing_ok=True)
+            logger.warning(f"Failed to cache Remotion code: {e}")
+
+    async def _validate_candidate(
+        self,
+        output_dir: Path,
+        remotion_code: str,
+        attempt: int,
+        failed_codes: Dict[bytes, str],
+    ) -> Optional[str]:
+        """
+        Validate a candidate, turning any exception into that candidate's error.
+
+        Args:
+            output_dir: Directory for the Remotion project
+            remotion_code: Root.tsx code to validate
+            attempt: Attempt number, for logging
+            failed_codes: Errors of code that already failed, keyed by code digest
+
+        Returns:
+            None if the code is valid, otherwise the error to feed back for fixing
+        """
+        try:
+            return await self._save_and_validate(output_dir, remotion_code, attempt, failed_codes)
+        except Exception as e:
+            logger.warning(f"Validating candidate failed (attempt {attempt + 1}): {e}")
+            error = f"Exception:\n{str(e)}"
+            code_hash = hashlib.blake2b(remotion_code.encode("utf-8"), digest_size=16).digest()
+            failed_codes[code_hash] = error
+            return error
+
+    async def _save_and_validate(
+        self,
+        output_dir: Path,
+        remotion_code: str,
+        attempt: int,
+        failed_codes: Optional[Dict[bytes, str]] = None,
+    ) -> Optional[str]:
+        """
+        Write a candidate into the project and validate it.
+
+        Args:
+            output_dir: Directory for the Remotion project
+            remotion_code: Root.tsx code to validate
+            attempt: Attempt number, for logging
+            failed_codes: Errors of code that already failed, keyed by code
+                digest; identical code fails immediately without being
+                rewritten or revalidated, and new failures are added
+
+        Returns:
+            None if the code is valid, otherwise the error to feed back for fixing
+        """
+        code_hash = None
+        if failed_codes is not None:
+            code_hash = hashlib.blake2b(remotion_code.encode("utf-8"), digest_size=16).digest()
+            if code_hash in failed_codes:
+                logger.warning(f"Attempt {attempt + 1} returned code that already failed, skipping validation")
+                return f"The code is unchanged from a version that already failed.\n{failed_codes[code_hash]}"
+
+        await self._setup_remotion_project(output_dir, remotion_code)
+
+        is_valid, error_message = await self._validate_code(output_dir, remotion_code)
+        if is_valid:
+            return None
+
+        logger.warning(f"Validation failed (attempt {attempt + 1}): {error_message}")
+        logger.debug(f"Generated code (first 1000 chars):\n{remotion_code[:1000]}")
+        error = f"Validation Error:\n{error_message}"
+        if code_hash is not None:
+            failed_codes[code_hash] = error
+        return error
+
+    async def _generate_initial_code(
+        self,
+        visual_instructions: List[Dict],
+        topic: str,
+        target_duration: float = 60.0,
+        script: Optional[List[Dict[str, str]]] = None,
+        temperature: float = 0.7,
+        seed: Optional[int] = None,
+    ) -> Tuple[str, List[Dict]]:
+        """Generate initial Remotion code from visual instructions.
+
+        Args:
+            temperature: Sampling temperature
+            seed: Optional sampling seed to diversify parallel candidates
+
+        Returns:
+            Tuple of (generated_code, conversation_history)
+        """
+        logger.info("Generating initial Remotion code")
+
+        messages = self._build_initial_messages(visual_instructions, topic, target_duration, script)
+
+        response = await self._stream_completion(messages, temperature=temperature, seed=seed)
+        messages.append({"role": "assistant", "content": response})
+
+        code = self._parse_code_response(response, int(target_duration * 30))
+
+        logger.debug(f"Generated code length: {len(code)} characters")
+        return code, messages
+
+    async def _generate_chunked_code(
+        self,
+        visual_instructions: List[Dict],
+        topic: str,
+        target_duration: float = 60.0,
+        script: Optional[List[Dict[str, str]]] = None,
+    ) -> Tuple[str, List[Dict]]:
+        """
+        Generate the scenes in parallel chunks and assemble them into one file.
+
+        Each chunk of SCENES_PER_CHUNK scenes becomes a JSX fragment from its
+        own, much shorter completion, run concurrently, so
+        wall-clock time is roughly that of the slowest chunk instead of one
+        call decoding every scene. The
+        fragments go inside a fixed EducationalScene that has the shared
+        helper components in scope.
+
+        Returns:
+            Tuple of (generated_code, conversation_history). The history
+            reads as if the whole file came from a single request, so a
+            later _fix_code call works on it unchanged.
+        """
+        duration_frames = int(target_duration * 30)
+        chunks = [
+            visual_instructions[i:i + self.SCENES_PER_CHUNK]
+            for i in range(0, len(visual_instructions), self.SCENES_PER_CHUNK)
+        ]
+        logger.info(f"Generating Remotion code in {len(chunks)} parallel chunks")
+
+        chunk_tasks = [
+            asyncio.create_task(
+                self._generate_chunk(
+                    chunk,
+                    topic,
+                    index,
+                    # Each chunk's last scene ends where the next chunk begins
+                    chunks[index + 1][0] if index + 1 < len(chunks) else None,
+                    duration_frames,
+                )
+            )
+            for index, chunk in enumerate(chunks)
+        ]
+        try:
+            fragments = await asyncio.gather(*chunk_tasks)
+        finally:
+            # gather() raises the first failure but leaves the other chunks
+            # running, so cancel whatever is still in flight
+            for task in chunk_tasks:
+                task.cancel()
+
+        components = REMOTION_HELPER_COMPONENTS + REMOTION_CHUNKED_SCENE.format(
+            fragments="\n\n".join(fragments)
+        )
+        messages = self._build_initial_messages(visual_instructions, topic, target_duration, script)
+        messages.append({"role": "assistant", "content": json.dumps({"components": components})})
+
+        code = self._assemble_code(components, duration_frames)
+        logger.debug(f"Generated code length: {len(code)} characters")
+        return code, messages
+
+    async def _generate_chunk(
+        self,
+        scenes: List[Dict],
+        topic: str,
+        index: int,
+        next_scene: Optional[Dict],
+        duration_frames: int,
+    ) -> str:
+        """
+        Generate the JSX fragment for one chunk of scenes.
+
+        Args:
+            scenes: The chunk's visual instruction segments
+            topic: Educational topic
+            index: Chunk number, for logging
+            next_scene: First scene of the following chunk, or None for the last chunk
+            duration_frames: Total duration in frames
+
+        Returns:
+            JSX children for the EducationalScene's AbsoluteFill
+        """
+        if next_scene is not None:
+            end_frame = int(float(next_scene.get("timestamp", {}).get("start", 0)) * 30)
+        else:
+            end_frame = duration_frames
+
+        word_sync_note = ""
+        if any(scene.get("word_sync") for scene in scenes):
+            word_sync_note = "\n\nWORD-SYNC DATA PROVIDED - IMPLEMENT ALL WORD-SYNCHRONIZED ANIMATIONS!"
+
+        user_prompt = REMOTION_CHUNK_PROMPT.format(
+            topic=topic,
+            instructions_json=self._format_instructions(scenes),
+            word_sync_note=word_sync_note,
+            end_frame=end_frame,
+        )
+        messages = [
+            {"role": "system", "content": REMOTION_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ]
+
+        response = await self._stream_completion(messages, response_format=CHUNK_RESPONSE_FORMAT)
+        try:
+            fragment = json.loads(response)["jsx"].strip()
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            raise Exception(f"Chunk {index + 1} response was not the expected JSON object")
+
+        logger.debug(f"Generated chunk {index + 1} ({len(scenes)} scenes), length: {len(fragment)} characters")
+        return fragment
+
+    def _format_instructions(self, visual_instructions: List[Dict]) -> str:
+        """Serialize the visual instruction fields the prompts use."""
         # Format instructions
         instructions_with_timing = []
         for inst in visual_instructions:
@@ -394,7 +1169,22 @@ Return ONLY TypeScript code, no explanations."""
             }
             instructions_with_timing.append(timing_info)
 
-        instructions_json = json.dumps(instructions_with_timing, indent=2)
+        # Compact, key-sorted and with raw UTF-8 (no \uXXXX escapes for symbols
+        # like "²"): whitespace and escapes are billed as input tokens, and
+        # identical instructions serialize to identical bytes
+        return orjson.dumps(
+            instructions_with_timing, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def _build_initial_messages(
+        self,
+        visual_instructions: List[Dict],
+        topic: str,
+        target_duration: float,
+        script: Optional[List[Dict[str, str]]],
+    ) -> List[Dict]:
+        """Build the system + user messages for an initial generation request."""
+        instructions_json = self._format_instructions(visual_instructions)
 
         # Check for word_sync data
         has_word_sync = any(inst.get("word_sync") for inst in visual_instructions)
@@ -466,125 +1256,144 @@ CRITICAL CHECKLIST FOR EACH SCENE:
 CRITICAL REQUIREMENTS:
 - startFrame = timestamp.start * 30
 - endFrame = next timestamp.start * 30
-- durationInFrames = {duration_frames}
-- MUST EXPORT: export const RemotionRoot: React.FC = () => (...)
-- MUST END WITH: registerRoot(RemotionRoot);"""
+- MUST DEFINE: const EducationalScene: React.FC = () => {{...}}
+- NO imports, RemotionRoot or registerRoot (added around your components)"""
 
-        logger.info("Generating initial Remotion code")
-
-        messages = [
-            {"role": "system", "content": system_prompt},
+        return [
+            {"role": "system", "content": REMOTION_SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt},
         ]
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=0.7,
-        )
-
-        code = response.choices[0].message.content
-        messages.append({"role": "assistant", "content": code})
-
-        # Extract code from markdown
-        code = self._extract_code_from_markdown(code)
-
-        logger.debug(f"Generated code length: {len(code)} characters")
-        return code, messages
-
     async def _fix_code(
         self,
         broken_code: str,
         error_message: str,
         conversation_history: List[Dict],
         attempt: int,
+        duration_frames: int,
     ) -> Tuple[str, List[Dict]]:
         """Fix Remotion code based on error feedback."""
+        # Tracebacks carry the useful part at the bottom
+        if len(error_message) > self.FIX_ERROR_CHARS:
+            error_message = "... (truncated)\n" + error_message[-self.FIX_ERROR_CHARS:]
+
         # Truncate code if too long
         code_preview = broken_code if len(broken_code) < 3000 else broken_code[:3000] + "\n... (truncated)"
 
-        error_prompt = f"""The code you generated has an error. Here's what happened:
-
-ERROR:
-{error_message}
-
-FAILED CODE (first 3000 chars):
-```tsx
-{code_preview}
-```
-
-This is attempt {attempt + 1}/3. Please analyze the error carefully and fix the code.
-
-CRITICAL DEBUGGING TIPS:
-- If validation error about missing imports: Ensure you import all used components from 'remotion'
-- If "Missing export" error: You MUST export RemotionRoot: export const RemotionRoot: React.FC = () => ...
-- If "Missing registerRoot()" error: You MUST call registerRoot(RemotionRoot) at the end of the file
-- If React error #130 (invalid element type): Component is undefined - check all components are defined before use
-- If syntax errors: Check all JSX tags are properly closed
-- If type errors: Ensure TypeScript types are correct
-- Make sure durationInFrames is set to a NUMBER not a variable name
-- Ensure all React hooks (useCurrentFrame, useVideoConfig) are imported from 'remotion'
-
-CONTENT OVERLAP FIX (VERY COMMON ISSUE):
-If content is rendering on top of each other, you MUST use frame-based conditional rendering:
-- BAD: <Equation startFrame={{0}} /> <Equation startFrame={{150}} />  // Both visible at frame 150!
-- GOOD: {{frame >= 0 && frame < 150 && <Equation startFrame={{0}} />}}
-         {{frame >= 150 && frame < 300 && <Equation startFrame={{150}} />}}
+        error_prompt = REMOTION_FIX_PROMPT.format(
+            error_message=error_message,
+            code_preview=code_preview,
+            attempt=attempt + 1,
+            max_attempts=self.MAX_RETRIES,
+        )
 
-For EACH scene, wrap content in: {{frame >= sceneStart && frame < sceneEnd && (<>...</>)}}
+        logger.info(f"Fixing Remotion code based on error (attempt {attempt + 1})")
 
-REQUIRED AT END OF FILE (Remotion 4.x):
-```tsx
-export const RemotionRoot: React.FC = () => (
-  <Composition id="EducationalScene" component={EducationalScene} durationInFrames={XXXX} fps={30} width={1080} height={960} />
-);
+        # Send the original request and only the latest attempt: older failed
+        # attempts add tokens, not information. The system and first user
+        # messages still lead, so the cached prompt prefix keeps applying.
+        window = conversation_history[:2] + conversation_history[2:][-1:]
+        response = await self._stream_completion(
+            window + [{"role": "user", "content": error_prompt}]
+        )
 
-registerRoot(RemotionRoot);
-```
+        # The returned history stays complete (a copy; the caller's is untouched)
+        messages = conversation_history + [
+            {"role": "user", "content": error_prompt},
+            {"role": "assistant", "content": response},
+        ]
 
-Return ONLY the complete fixed TypeScript/React code, no explanations."""
+        fixed_code = self._parse_code_response(response, duration_frames)
 
-        logger.info(f"Fixing Remotion code based on error (attempt {attempt + 1})")
+        logger.debug(f"Fixed code attempt {attempt + 1}, length: {len(fixed_code)} characters")
+        return fixed_code, messages
 
-        conversation_history.append({"role": "user", "content": error_prompt})
+    async def _stream_completion(
+        self,
+        messages: List[Dict],
+        temperature: float = 0.7,
+        seed: Optional[int] = None,
+        response_format: Dict = CODE_RESPONSE_FORMAT,
+    ) -> str:
+        """
+        Stream a structured-output chat completion and return its text.
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=conversation_history,
-            temperature=0.7,
-        )
+        Args:
+            messages: Conversation to send
+            temperature: Sampling temperature
+            seed: Optional sampling seed
+            response_format: Structured output schema for the response
 
-        fixed_code = response.choices[0].message.content
-        conversation_history.append({"role": "assistant", "content": fixed_code})
+        Returns:
+            The response text
 
-        fixed_code = self._extract_code_from_markdown(fixed_code)
+        Raises:
+            asyncio.TimeoutError: If the completion stalls for LLM_TIMEOUT or
+                takes longer than LLM_TOTAL_TIMEOUT overall
+        """
+        extra_args = {"seed": seed} if seed is not None else {}
+
+        async def complete() -> str:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                response_format=response_format,
+                stream=True,
+                timeout=self.LLM_TIMEOUT,
+                **extra_args,
+            )
 
-        logger.debug(f"Fixed code attempt {attempt + 1}, length: {len(fixed_code)} characters")
-        return fixed_code, conversation_history
+            parts = []
+            chunks = stream.__aiter__()
+            try:
+                while True:
+                    # A stalled stream fails fast, while one that keeps
+                    # producing can run as long as a full Root.tsx needs
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.LLM_TIMEOUT)
+                    except StopAsyncIteration:
+                        break
+                    if not chunk.choices:
+                        continue
+                    parts.append(chunk.choices[0].delta.content or "")
+            finally:
+                await stream.close()
+
+            return "".join(parts)
+
+        # A slow trickle of chunks could otherwise stretch one attempt indefinitely
+        return await asyncio.wait_for(complete(), timeout=self.LLM_TOTAL_TIMEOUT)
 
     async def _setup_remotion_project(self, output_dir: Path, root_tsx_code: str):
         """Setup Remotion project structure with generated code."""
         logger.info(f"Setting up Remotion project in {output_dir}")
 
-        # Create directory structure (just src folder for the Root.tsx)
-        output_dir.mkdir(parents=True, exist_ok=True)
+        # All filesystem work happens in one thread hop, off the event loop
+        root_file = await asyncio.to_thread(self._write_project, output_dir, root_tsx_code)
+        logger.info(f"Written Root.tsx to {root_file}")
+        logger.info("Remotion project structure created (using shared backend node_modules)")
+
+    @staticmethod
+    def _write_project(output_dir: Path, root_tsx_code: str) -> Path:
+        """Create the project's src folder and write Root.tsx in a single write()."""
+        # Just the src folder for Root.tsx - the only file needed per job
         src_dir = output_dir / "src"
-        src_dir.mkdir(exist_ok=True)
+        src_dir.mkdir(parents=True, exist_ok=True)
 
-        # Write Root.tsx - this is the only file needed per job
         root_file = src_dir / "Root.tsx"
-        await asyncio.to_thread(
-            root_file.write_text, root_tsx_code, encoding="utf-8"
-        )
-        logger.info(f"Written Root.tsx to {root_file}")
-        logger.info("Remotion project structure created (using shared backend node_modules)")
+        root_file.write_bytes(root_tsx_code.encode("utf-8"))
+        return root_file
 
-    async def _validate_code(self, project_dir: Path) -> Tuple[bool, Optional[str]]:
+    async def _validate_code(
+        self, project_dir: Path, code: Optional[str] = None
+    ) -> Tuple[bool, Optional[str]]:
         """
         Validate Remotion code by checking TypeScript syntax.
 
         Args:
             project_dir: Path to the Remotion project directory
+            code: Contents of Root.tsx if already in memory (skips reading it back)
 
         Returns:
             Tuple of (is_valid, error_message)
@@ -595,47 +1404,93 @@ Return ONLY the complete fixed TypeScript/React code, no explanations."""
             if not root_file.exists():
                 return False, "Root.tsx file not found"
 
-            # Read and do basic validation
-            code_content = root_file.read_text(encoding="utf-8")
+            # Read (unless the caller has the code) and do basic validation
+            code_content = code
+            if code_content is None:
+                code_content = await asyncio.to_thread(root_file.read_text, encoding="utf-8")
+            found = Counter(match.lastgroup for match in STRUCTURE_RE.finditer(code_content))
 
             # Check for required imports
-            if "from 'remotion'" not in code_content and 'from "remotion"' not in code_content:
+            if not found["imports"]:
                 return False, "Missing Remotion imports"
+            if found["import_statement"] > self.TEMPLATE_IMPORTS:
+                return False, "Extra import statements - components must not contain imports"
 
             # Check for export (needed for component resolution)
-            if "export" not in code_content:
+            if not found["export"]:
                 return False, "Missing export statement (export const RemotionRoot)"
+            if found["export"] > 1:
+                return False, "Duplicate RemotionRoot - components must not define it"
 
             # Check for registerRoot (REQUIRED for Remotion 4.x)
-            if "registerRoot" not in code_content:
+            if not found["register"]:
                 return False, "Missing registerRoot() call - REQUIRED for Remotion 4.x"
+            if found["register"] > 1:
+                return False, "Duplicate registerRoot() call - components must not call it"
 
             # Check for Composition
-            if "Composition" not in code_content:
+            if not found["composition"]:
                 return False, "Missing Composition component"
 
+            # Check for the scene the composition renders
+            if not found["scene"]:
+                return False, "Missing EducationalScene component (const EducationalScene: React.FC = ...)"
+
             # Check for AbsoluteFill
-            if "AbsoluteFill" not in code_content:
+            if not found["fill"]:
                 logger.warning("AbsoluteFill not found - layout may be incorrect")
 
-            logger.info("Code validation passed (basic checks)")
+            # Parse with esbuild so syntax errors are caught before a render
+            syntax_error = await _get_syntax_checker().check(code_content, Path(__file__).parent.parent)
+            if syntax_error:
+                return False, f"Syntax error:\n{syntax_error}"
+
+            logger.info("Code validation passed (structure and syntax checks)")
             return True, None
 
         except Exception as e:
             logger.error(f"Validation error: {e}")
             return False, f"Validation error: {str(e)}"
 
-    def _extract_code_from_markdown(self, text: str) -> str:
-        """Extract code from markdown code blocks if present."""
-        # Try TypeScript/TSX code blocks first
-        pattern = r"```(?:tsx|typescript|ts)?\s*\n(.*?)```"
-        matches = re.findall(pattern, text, re.DOTALL)
+    def _parse_code_response(self, text: str, duration_frames: int) -> str:
+        """
+        Assemble Root.tsx from a structured-output response.
+
+        The model only writes the components; the imports, RemotionRoot and
+        registerRoot() come from the trusted header and footer templates.
+        Falls back to the first fenced code block (or the raw text) if the
+        model ignored the requested format, using it as the whole file when
+        it already registers a root.
+
+        Args:
+            text: Response text, normally {"components": "..."}
+            duration_frames: Composition length in frames
 
-        if matches:
-            return matches[0].strip()
+        Returns:
+            Complete Root.tsx code
+        """
+        try:
+            components = json.loads(text)["components"].strip()
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            logger.warning("Response was not the expected JSON object, falling back to markdown extraction")
+            components = self._extract_code_from_markdown(text)
+            if "registerRoot(" in components:
+                return components
+
+        return self._assemble_code(components, duration_frames)
+
+    @staticmethod
+    def _assemble_code(components: str, duration_frames: int) -> str:
+        """Wrap model-written components in the trusted header and footer."""
+        return (
+            REMOTION_CODE_HEADER
+            + components
+            + REMOTION_CODE_FOOTER.format(duration_frames=duration_frames)
+        )
 
-        # No code blocks found, return original
-        return text.strip()
+    def _extract_code_from_markdown(self, text: str) -> str:
+        """Extract code from markdown code blocks if present."""
+        return _extract_code(text)
 
     async def render_remotion_video(
         self,
@@ -691,35 +1546,14 @@ Return ONLY the complete fixed TypeScript/React code, no explanations."""
             logger.info(f"Using backend node_modules at {backend_node_modules}")
             logger.info(f"Rendering from {root_tsx_path} to {output_path_abs}")
 
-            # Render with Remotion CLI from backend directory
-            cmd = [
-                "npx",
-                "remotion",
-                "render",
-                str(root_tsx_path),
-                composition_id,
-                str(output_path_abs),
-                "--codec=h264",
-            ]
-
-            logger.info(f"Running command: {' '.join(cmd)}")
-
-            result = await asyncio.to_thread(
-                subprocess.run,
-                cmd,
-                cwd=str(backend_dir),  # Run from backend dir where node_modules is
-                capture_output=True,
-                text=True,
-                timeout=600,  # 10 minute timeout
+            # Render in a warm worker, falling back to the CLI if none is available
+            rendered = await _get_render_pool().render(
+                root_tsx_path, output_path_abs, composition_id, backend_dir, self.RENDER_TIMEOUT
             )
-
-            if result.stdout:
-                logger.info(f"Remotion stdout: {result.stdout[-1000:]}")
-            if result.stderr:
-                logger.warning(f"Remotion stderr: {result.stderr[-1000:]}")
-
-            if result.returncode != 0:
-                error_msg = f"Remotion rendering failed: {result.stderr}"
+            if rendered is None:
+                await self._render_with_cli(root_tsx_path, output_path_abs, composition_id, backend_dir)
+            elif not rendered[0]:
+                error_msg = f"Remotion rendering failed: {rendered[1]}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
 
@@ -727,16 +1561,101 @@ Return ONLY the complete fixed TypeScript/React code, no explanations."""
                 raise Exception(f"Rendered video not found at {output_path}")
 
             logger.info(f"Video rendered successfully: {output_path}")
+            self._settle_cache(project_dir, rendered=True)
 
             if progress_callback:
                 progress_callback("Remotion rendering complete", 85)
 
             return output_path
 
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
+            self._settle_cache(project_dir, rendered=False)
             error_msg = "Remotion rendering timeout (10 minutes)"
             logger.error(error_msg)
             raise Exception(error_msg)
         except Exception as e:
+            self._settle_cache(project_dir, rendered=False)
             logger.error(f"Remotion rendering failed: {e}")
             raise Exception(f"Failed to render Remotion video: {e}")
+
+    async def _render_with_cli(
+        self, root_tsx_path: Path, output_path: Path, composition_id: str, backend_dir: Path
+    ):
+        """
+        Render with a one-off `npx remotion render` process.
+
+        Raises:
+            Exception: If rendering fails
+            asyncio.TimeoutError: If rendering exceeds RENDER_TIMEOUT
+        """
+        # Render with Remotion CLI from backend directory
+        cmd = [
+            "npx",
+            "remotion",
+            "render",
+            str(root_tsx_path),
+            composition_id,
+            str(output_path),
+            "--codec=h264",
+        ]
+
+        logger.info(f"Running command: {' '.join(cmd)}")
+
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=str(backend_dir),  # Run from backend dir where node_modules is
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        # Drain both pipes while rendering, keeping only the last lines of
+        # each, so progress output can't fill a pipe or pile up in memory
+        stdout_tail = deque(maxlen=self.RENDER_OUTPUT_TAIL_LINES)
+        stderr_tail = deque(maxlen=self.RENDER_OUTPUT_TAIL_LINES)
+        readers = [
+            asyncio.create_task(self._tail_output(proc.stdout, stdout_tail)),
+            asyncio.create_task(self._tail_output(proc.stderr, stderr_tail)),
+        ]
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=self.RENDER_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Kill the whole group: npx's node and Chromium children would
+            # otherwise keep running and hold the pipes open
+            os.killpg(proc.pid, signal.SIGKILL)
+            await proc.wait()
+            raise
+        finally:
+            await asyncio.gather(*readers)
+
+        stdout = "\n".join(stdout_tail)
+        stderr = "\n".join(stderr_tail)
+
+        if stdout:
+            logger.info(f"Remotion stdout: {stdout[-1000:]}")
+        if stderr:
+            logger.warning(f"Remotion stderr: {stderr[-1000:]}")
+
+        if proc.returncode != 0:
+            error_msg = f"Remotion rendering failed: {stderr}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    @staticmethod
+    async def _tail_output(stream: asyncio.StreamReader, tail: deque):
+        """
+        Read a subprocess pipe to EOF, keeping its most recent lines in tail.
+
+        Splits on carriage returns too, since the CLI redraws its progress
+        line with \\r rather than printing new lines.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = ""
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                break
+            buffer += decoder.decode(chunk).replace("\r", "\n")
+            *lines, buffer = buffer.split("\n")
+            tail.extend(line for line in lines if line.strip())
+        if buffer.strip():
+            tail.append(buffer)
@@ -0,0 +1,68 @@
+/**
+ * Remotion Render Worker
+ *
+ * Long-lived render process used by RemotionGenerator. Starting
+ * `npx remotion render` costs npx resolution, Node startup, loading the
+ * bundler and launching headless Chromium before the first frame; this
+ * worker pays that once and keeps the browser and webpack cache warm.
+ *
+ * Protocol: one JSON job per stdin line
+ *   {"entry": "/abs/src/Root.tsx", "out": "/abs/out.mp4", "composition": "EducationalScene"}
+ * and one JSON response per stdout line
+ *   {"ok": true, "error": null} | {"ok": false, "error": "..."}
+ *
+ * Library logging is sent to stderr so stdout only carries responses.
+ */
+
+import { rm } from 'node:fs/promises';
+import readline from 'node:readline';
+
+import { bundle } from '@remotion/bundler';
+import { openBrowser, renderMedia, selectComposition } from '@remotion/renderer';
+
+console.log = console.error;
+console.info = console.error;
+
+const respond = (response) => {
+  process.stdout.write(JSON.stringify(response) + '\n');
+};
+
+let browser = null;
+
+const render = async (job) => {
+  // Each job has its own Root.tsx, so it is bundled per job; webpack's
+  // cache still makes repeat bundles of the shared dependencies cheap
+  const serveUrl = await bundle({ entryPoint: job.entry, enableCaching: true });
+  try {
+    browser = browser ?? (await openBrowser('chrome'));
+    const composition = await selectComposition({
+      serveUrl,
+      id: job.composition,
+      puppeteerInstance: browser,
+    });
+    await renderMedia({
+      composition,
+      serveUrl,
+      codec: 'h264',
+      outputLocation: job.out,
+      puppeteerInstance: browser,
+    });
+  } finally {
+    await rm(serveUrl, { recursive: true, force: true });
+  }
+};
+
+const lines = readline.createInterface({ input: process.stdin });
+for await (const line of lines) {
+  if (!line.trim()) {
+    continue;
+  }
+  try {
+    await render(JSON.parse(line));
+    respond({ ok: true, error: null });
+  } catch (err) {
+    respond({ ok: false, error: String(err?.stack ?? err) });
+  }
+}
+
+process.exit(0);
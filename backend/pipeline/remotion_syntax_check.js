@@ -0,0 +1,48 @@
+/**
+ * Remotion Syntax Check
+ *
+ * Long-lived pre-flight checker used by RemotionGenerator. Parses generated
+ * Root.tsx code with esbuild's transform API (no bundling, no type checking),
+ * so syntax errors surface in milliseconds instead of after a render has
+ * started the full Remotion bundler.
+ *
+ * Protocol: one JSON request per stdin line
+ *   {"code": "<Root.tsx contents>"}
+ * and one JSON response per stdout line
+ *   {"ok": true, "error": null} | {"ok": false, "error": "..."}
+ */
+
+import readline from 'node:readline';
+
+import { transform } from 'esbuild';
+
+const respond = (response) => {
+  process.stdout.write(JSON.stringify(response) + '\n');
+};
+
+const formatError = (err) => {
+  const messages = (err.errors ?? []).map((message) => {
+    const location = message.location;
+    if (!location) {
+      return message.text;
+    }
+    return `${message.text} (line ${location.line}:${location.column})\n  ${location.lineText}`;
+  });
+  return messages.length ? messages.join('\n') : String(err?.message ?? err);
+};
+
+const lines = readline.createInterface({ input: process.stdin });
+for await (const line of lines) {
+  if (!line.trim()) {
+    continue;
+  }
+  try {
+    const { code } = JSON.parse(line);
+    await transform(code, { loader: 'tsx', sourcefile: 'Root.tsx', logLevel: 'silent' });
+    respond({ ok: true, error: null });
+  } catch (err) {
+    respond({ ok: false, error: formatError(err) });
+  }
+}
+
+process.exit(0);
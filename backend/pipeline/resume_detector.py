@@ -7,11 +7,81 @@ Allows resuming from the last successful step instead of starting over.
 
 import logging
 from pathlib import Path
-from typing import Dict, Optional, List
-import json
+from typing import Any, Callable, Dict, Optional, List, Tuple
+import asyncio
+import functools
+import os
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Every pipeline step, in pipeline order, as not yet completed
+EMPTY_STEPS = {
+    "nano_banana": False,  # NEW - Custom character image generation
+    "script": False,
+    "audio": False,
+    "timestamps": False,
+    "visual_instructions": False,  # Legacy
+    "storyboard": False,  # NEW
+    "manim_code": False,
+    "manim_render": False,
+    "celebrity_videos": False,
+    "lipsynced_videos": False,
+    "composite": False,
+    "final": False,
+}
+
+# Every file and directory a job writes, relative to the job directory
+JOB_PATHS = {
+    "nano_banana_images": "nano_banana_images",  # NEW
+    "script": "script.json",
+    "audio": "narration.mp3",
+    "audio_segments": "audio_segments",
+    "speaker_voice_map": "speaker_voice_map.json",
+    "srt": "subtitles.srt",
+    "visual_instructions": "visual_instructions.json",  # Legacy
+    "storyboard": "storyboard.json",  # NEW
+    "manim_file": "animation.py",
+    "manim_output": "manim_output",
+    "celebrity_videos": "celebrity_videos",
+    "lipsynced_videos": "lipsynced_videos",
+    "composite": "composite_video.mp4",
+    "final": "final_video.mp4",
+}
+
+# Steps that are complete once their output file (a JOB_PATHS key) exists
+# and is non-empty
+STEP_FILES = {
+    "script": "script",
+    "timestamps": "srt",
+    "visual_instructions": "visual_instructions",
+    "storyboard": "storyboard",
+    "manim_code": "manim_file",
+    "composite": "composite",
+    "final": "final",
+}
+
+# Directories that must contain at least one matching file, as
+# (JOB_PATHS key, name prefix, name suffix). audio_segments only counts
+# towards "audio", together with narration.mp3
+STEP_DIRS = {
+    "nano_banana": ("nano_banana_images", "celebrity_", "_custom.jpg"),
+    "audio_segments": ("audio_segments", "segment_", ".mp3"),
+    "celebrity_videos": ("celebrity_videos", "segment_", ".mp4"),
+    "lipsynced_videos": ("lipsynced_videos", "lipsynced_", ".mp4"),
+}
+
+# Searching manim_output for the rendered video: how many directory levels
+# down to look, and Manim's intermediate-file folders that never contain it
+MANIM_OUTPUT_MAX_DEPTH = 4
+MANIM_PRUNE_DIRS = frozenset({"partial_movie_files", "Tex", "texts"})
+
+
+def _load_json(path: Path):
+    """Parse a JSON file straight from its bytes, skipping the str decode."""
+    return orjson.loads(path.read_bytes())
+
 
 class ResumeDetector:
     """Detect completed pipeline steps from output directory."""
@@ -24,122 +94,225 @@ class ResumeDetector:
             job_dir: Path to job output directory
         """
         self.job_dir = job_dir
+        # Built once: job_dir never changes over the detector's lifetime
+        self._paths = {key: job_dir / name for key, name in JOB_PATHS.items()}
+        # (job_dir mtime in ns, steps) from the last detection
+        self._cache: Optional[Tuple[int, Dict[str, bool]]] = None
+
+    def invalidate(self):
+        """
+        Forget the cached detection result.
+
+        Results are cached until job_dir's mtime changes, which happens when
+        entries are added, removed or renamed directly inside it. Call this
+        after changing a file in place or writing inside a subdirectory.
+        """
+        self._cache = None
 
     def detect_completed_steps(self) -> Dict[str, bool]:
         """
         Analyze output directory to detect which steps are complete.
 
+        The result is cached until job_dir's mtime changes (see invalidate()),
+        so back-to-back calls from get_resume_point() and get_summary() don't
+        repeat every check.
+
         Returns:
             Dictionary mapping step names to completion status
         """
-        steps = {
-            "nano_banana": False,  # NEW - Custom character image generation
-            "script": False,
-            "audio": False,
-            "timestamps": False,
-            "visual_instructions": False,  # Legacy
-            "storyboard": False,  # NEW
-            "manim_code": False,
-            "manim_render": False,
-            "celebrity_videos": False,
-            "lipsynced_videos": False,
-            "composite": False,
-            "final": False,
-        }
+        try:
+            mtime_ns = self.job_dir.stat().st_mtime_ns
+        except FileNotFoundError:
+            logger.info(f"Job directory does not exist: {self.job_dir}")
+            return dict(EMPTY_STEPS)
+
+        if self._cache and self._cache[0] == mtime_ns:
+            return dict(self._cache[1])
+
+        results = {name: probe() for name, probe in self._probes().items()}
+        return self._store_steps(mtime_ns, self._build_steps(results))
 
-        if not self.job_dir.exists():
+    async def detect_completed_steps_async(self) -> Dict[str, bool]:
+        """
+        Like detect_completed_steps(), but runs the filesystem checks concurrently.
+
+        Every check is an independent stat or directory scan, so on network
+        filesystems issuing them in parallel from worker threads overlaps the
+        round-trips instead of paying for them one after another.
+
+        Returns:
+            Dictionary mapping step names to completion status
+        """
+        try:
+            mtime_ns = (await asyncio.to_thread(self.job_dir.stat)).st_mtime_ns
+        except FileNotFoundError:
             logger.info(f"Job directory does not exist: {self.job_dir}")
-            return steps
+            return dict(EMPTY_STEPS)
+
+        if self._cache and self._cache[0] == mtime_ns:
+            return dict(self._cache[1])
+
+        probes = self._probes()
+        values = await asyncio.gather(*(asyncio.to_thread(probe) for probe in probes.values()))
+        return self._store_steps(mtime_ns, self._build_steps(dict(zip(probes, values))))
+
+    def _store_steps(self, mtime_ns: int, steps: Dict[str, bool]) -> Dict[str, bool]:
+        """Cache a detection result and return a copy for the caller."""
+        self._cache = (mtime_ns, steps)
+        return dict(steps)
+
+    def _probes(self) -> Dict[str, Callable[[], int]]:
+        """
+        Independent filesystem checks behind detect_completed_steps().
+
+        Each returns a file size (0 if missing), a count of matching files or,
+        for the speaker voice map, whether it exists.
+        """
+        probes = {
+            name: functools.partial(self._size_or_zero, self._paths[key])
+            for name, key in STEP_FILES.items()
+        }
+        # Full counts are only needed for the step log messages; otherwise
+        # stop reading a directory at its first match
+        log_counts = logger.isEnabledFor(logging.INFO)
+        probes.update({
+            name: functools.partial(
+                self._count_matches,
+                self._paths[key],
+                prefix,
+                suffix,
+                log_counts and name in EMPTY_STEPS,
+            )
+            for name, (key, prefix, suffix) in STEP_DIRS.items()
+        })
+        probes["audio"] = functools.partial(self._size_or_zero, self._paths["audio"])
+        probes["voice_map"] = self._paths["speaker_voice_map"].exists
+        probes["manim_render"] = self._manim_render_size
+        return probes
+
+    def _build_steps(self, results: Dict[str, int]) -> Dict[str, bool]:
+        """Turn probe results into step flags, logging what was found."""
+        steps = dict(EMPTY_STEPS)
 
         # Check nano_banana custom images
-        nano_banana_dir = self.job_dir / "nano_banana_images"
-        if nano_banana_dir.exists():
-            custom_images = list(nano_banana_dir.glob("celebrity_*_custom.jpg"))
-            if len(custom_images) > 0:
-                steps["nano_banana"] = True
-                logger.info(f"✓ Nano Banana images found ({len(custom_images)} custom images)")
+        if results["nano_banana"] > 0:
+            steps["nano_banana"] = True
+            logger.info(f"✓ Nano Banana images found ({results['nano_banana']} custom images)")
 
         # Check script
-        script_path = self.job_dir / "script.json"
-        if script_path.exists() and script_path.stat().st_size > 0:
+        if results["script"] > 0:
             steps["script"] = True
             logger.info("✓ Script found")
 
         # Check audio
-        audio_path = self.job_dir / "narration.mp3"
-        audio_dir = self.job_dir / "audio_segments"
-        voice_map_path = self.job_dir / "speaker_voice_map.json"
-        if (audio_path.exists() and audio_path.stat().st_size > 0 and
-            audio_dir.exists() and len(list(audio_dir.glob("segment_*.mp3"))) > 0):
+        if results["audio"] > 0 and results["audio_segments"] > 0:
             steps["audio"] = True
-            if voice_map_path.exists():
+            if results["voice_map"]:
                 logger.info("✓ Audio found (with speaker voice map)")
             else:
                 logger.info("✓ Audio found (legacy - no speaker voice map)")
 
         # Check timestamps
-        srt_path = self.job_dir / "subtitles.srt"
-        if srt_path.exists() and srt_path.stat().st_size > 0:
+        if results["timestamps"] > 0:
             steps["timestamps"] = True
             logger.info("✓ Timestamps found")
 
         # Check visual instructions (legacy)
-        visual_path = self.job_dir / "visual_instructions.json"
-        if visual_path.exists() and visual_path.stat().st_size > 0:
+        if results["visual_instructions"] > 0:
             steps["visual_instructions"] = True
             logger.info("✓ Visual instructions found (legacy)")
 
         # Check storyboard (NEW)
-        storyboard_path = self.job_dir / "storyboard.json"
-        if storyboard_path.exists() and storyboard_path.stat().st_size > 0:
+        if results["storyboard"] > 0:
             steps["storyboard"] = True
             logger.info("✓ Storyboard found")
 
         # Check manim code
-        manim_path = self.job_dir / "animation.py"
-        if manim_path.exists() and manim_path.stat().st_size > 0:
+        if results["manim_code"] > 0:
             steps["manim_code"] = True
             logger.info("✓ Manim code found")
 
         # Check manim render
-        manim_output_dir = self.job_dir / "manim_output"
-        if manim_output_dir.exists():
-            # Find manim_output.mp4 anywhere in manim_output directory
-            manim_videos = list(manim_output_dir.rglob("manim_output.mp4"))
-            if manim_videos and manim_videos[0].stat().st_size > 0:
-                steps["manim_render"] = True
-                logger.info("✓ Manim render found")
+        if results["manim_render"] > 0:
+            steps["manim_render"] = True
+            logger.info("✓ Manim render found")
 
         # Check celebrity videos
-        celebrity_dir = self.job_dir / "celebrity_videos"
-        if celebrity_dir.exists():
-            celebrity_videos = list(celebrity_dir.glob("segment_*.mp4"))
-            if len(celebrity_videos) > 0:
-                steps["celebrity_videos"] = True
-                logger.info(f"✓ Celebrity videos found ({len(celebrity_videos)} segments)")
+        if results["celebrity_videos"] > 0:
+            steps["celebrity_videos"] = True
+            logger.info(f"✓ Celebrity videos found ({results['celebrity_videos']} segments)")
 
         # Check lip-synced videos
-        lipsynced_dir = self.job_dir / "lipsynced_videos"
-        if lipsynced_dir.exists():
-            lipsynced_videos = list(lipsynced_dir.glob("lipsynced_*.mp4"))
-            if len(lipsynced_videos) > 0:
-                steps["lipsynced_videos"] = True
-                logger.info(f"✓ Lip-synced videos found ({len(lipsynced_videos)} segments)")
+        if results["lipsynced_videos"] > 0:
+            steps["lipsynced_videos"] = True
+            logger.info(f"✓ Lip-synced videos found ({results['lipsynced_videos']} segments)")
 
         # Check composite
-        composite_path = self.job_dir / "composite_video.mp4"
-        if composite_path.exists() and composite_path.stat().st_size > 0:
+        if results["composite"] > 0:
             steps["composite"] = True
             logger.info("✓ Composite video found")
 
         # Check final
-        final_path = self.job_dir / "final_video.mp4"
-        if final_path.exists() and final_path.stat().st_size > 0:
+        if results["final"] > 0:
             steps["final"] = True
             logger.info("✓ Final video found")
 
         return steps
 
+    @staticmethod
+    def _size_or_zero(path: Path) -> int:
+        """Size of a file from a single stat(), or 0 if it doesn't exist."""
+        try:
+            return os.stat(path).st_size
+        except (FileNotFoundError, NotADirectoryError):
+            return 0
+
+    @staticmethod
+    def _count_matches(directory: Path, prefix: str, suffix: str, count_all: bool) -> int:
+        """
+        Count entries in a directory named prefix*suffix.
+
+        Args:
+            directory: Directory to scan (missing counts as empty)
+            prefix: Required start of the entry name
+            suffix: Required end of the entry name
+            count_all: Count every match; otherwise return 1 at the first one
+
+        Returns:
+            Number of matches, or 0/1 when count_all is False
+        """
+        try:
+            with os.scandir(directory) as entries:
+                # The length check keeps prefix and suffix from overlapping,
+                # as they can't in the equivalent prefix*suffix glob
+                min_length = len(prefix) + len(suffix)
+                matches = (
+                    entry for entry in entries
+                    if len(entry.name) >= min_length
+                    and entry.name.startswith(prefix)
+                    and entry.name.endswith(suffix)
+                )
+                if count_all:
+                    return sum(1 for _ in matches)
+                return 1 if next(matches, None) is not None else 0
+        except (FileNotFoundError, NotADirectoryError):
+            return 0
+
+    def _manim_render_size(self) -> int:
+        """Size of the rendered manim_output.mp4, or 0 if there isn't one."""
+        # Manim writes it at videos/<module>/<resolution>/manim_output.mp4, so
+        # walk only a few levels down, skip Manim's intermediate-file folders
+        # and stop at the first hit (a missing directory yields nothing)
+        top = str(self._paths["manim_output"])
+        for root, dirs, files in os.walk(top):
+            if "manim_output.mp4" in files:
+                return self._size_or_zero(Path(root) / "manim_output.mp4")
+            if root[len(top):].count(os.sep) >= MANIM_OUTPUT_MAX_DEPTH:
+                dirs.clear()
+            else:
+                dirs[:] = [name for name in dirs if name not in MANIM_PRUNE_DIRS]
+        return 0
+
     def get_resume_point(self) -> str:
         """
         Determine which step to resume from.
@@ -177,62 +350,67 @@ class ResumeDetector:
 
     def load_script(self) -> Optional[List[Dict]]:
         """Load script from file if it exists."""
-        script_path = self.job_dir / "script.json"
+        script_path = self._paths["script"]
         if script_path.exists():
             try:
-                return json.loads(script_path.read_text(encoding="utf-8"))
+                return _load_json(script_path)
             except Exception as e:
                 logger.error(f"Failed to load script: {e}")
         return None
 
     def load_visual_instructions(self) -> Optional[List[Dict]]:
         """Load visual instructions from file if they exist (legacy)."""
-        visual_path = self.job_dir / "visual_instructions.json"
+        visual_path = self._paths["visual_instructions"]
         if visual_path.exists():
             try:
-                return json.loads(visual_path.read_text(encoding="utf-8"))
+                return _load_json(visual_path)
             except Exception as e:
                 logger.error(f"Failed to load visual instructions: {e}")
         return None
 
     def load_storyboard(self) -> Optional[Dict]:
         """Load storyboard from file if it exists (NEW)."""
-        storyboard_path = self.job_dir / "storyboard.json"
+        storyboard_path = self._paths["storyboard"]
         if storyboard_path.exists():
             try:
-                return json.loads(storyboard_path.read_text(encoding="utf-8"))
+                return _load_json(storyboard_path)
             except Exception as e:
                 logger.error(f"Failed to load storyboard: {e}")
         return None
 
     def load_speaker_voice_map(self) -> Optional[Dict]:
         """Load speaker-to-voice mapping from file if it exists."""
-        voice_map_path = self.job_dir / "speaker_voice_map.json"
+        voice_map_path = self._paths["speaker_voice_map"]
         if voice_map_path.exists():
             try:
-                return json.loads(voice_map_path.read_text(encoding="utf-8"))
+                return _load_json(voice_map_path)
             except Exception as e:
                 logger.error(f"Failed to load speaker voice map: {e}")
         return None
 
+    async def load_all(self) -> Dict[str, Optional[Any]]:
+        """
+        Load every saved artifact concurrently.
+
+        The files are independent, so each read and parse runs in its own
+        worker thread instead of one after another.
+
+        Returns:
+            Dictionary with script, visual_instructions, storyboard and
+            speaker_voice_map, each None if missing or unreadable
+        """
+        loaders = {
+            "script": self.load_script,
+            "visual_instructions": self.load_visual_instructions,
+            "storyboard": self.load_storyboard,
+            "speaker_voice_map": self.load_speaker_voice_map,
+        }
+        results = await asyncio.gather(*(asyncio.to_thread(load) for load in loaders.values()))
+        return dict(zip(loaders, results))
+
     def get_paths(self) -> Dict[str, Path]:
         """Get all relevant file paths for the job."""
-        return {
-            "nano_banana_images": self.job_dir / "nano_banana_images",  # NEW
-            "script": self.job_dir / "script.json",
-            "audio": self.job_dir / "narration.mp3",
-            "audio_segments": self.job_dir / "audio_segments",
-            "speaker_voice_map": self.job_dir / "speaker_voice_map.json",
-            "srt": self.job_dir / "subtitles.srt",
-            "visual_instructions": self.job_dir / "visual_instructions.json",  # Legacy
-            "storyboard": self.job_dir / "storyboard.json",  # NEW
-            "manim_file": self.job_dir / "animation.py",
-            "manim_output": self.job_dir / "manim_output",
-            "celebrity_videos": self.job_dir / "celebrity_videos",
-            "lipsynced_videos": self.job_dir / "lipsynced_videos",
-            "composite": self.job_dir / "composite_video.mp4",
-            "final": self.job_dir / "final_video.mp4",
-        }
+        return dict(self._paths)
 
     def get_summary(self) -> str:
         """Get a human-readable summary of completed steps."""
@@ -7,8 +7,9 @@ Supports dynamic character personality injection for authentic dialogue.
 """
 
 import logging
-from typing import Callable, Optional, List, Dict, Any
-from openai import AsyncOpenAI
+from typing import Callable, Optional, List, Dict, Any, Tuple
+from .openai_client import get_openai_client
+import functools
 import json
 
 # Import character context system
@@ -19,63 +20,8 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-
-class ScriptGenerator:
-    """Generate multi-voice educational scripts using OpenAI GPT-4o."""
-
-    def __init__(self, api_key: str, model: str = "gpt-4o"):
-        """
-        Initialize the script generator.
-
-        Args:
-            api_key: OpenAI API key
-            model: Model to use (gpt-4o, gpt-4o-mini, gpt-3.5-turbo)
-        """
-        self.client = AsyncOpenAI(api_key=api_key)
-        self.model = model
-
-    async def generate_script(
-        self,
-        topic: str,
-        duration_seconds: int = 60,
-        progress_callback: Optional[Callable[[str, int], None]] = None,
-        speaker_names: Optional[Dict[str, str]] = None,
-        refined_context: Optional[Dict[str, Any]] = None,
-        character_context: Optional[Any] = None,  # CharacterContext
-    ) -> List[Dict[str, str]]:
-        """
-        Generate a multi-voice educational script.
-
-        Args:
-            topic: The educational topic to create a script about
-            duration_seconds: Target duration in seconds
-            progress_callback: Optional callback for progress updates
-            speaker_names: Optional dict with 'teacher' and 'student' names
-                          e.g., {"teacher": "Drake", "student": "Sydney"}
-                          Defaults to {"teacher": "Teacher", "student": "Student"}
-            refined_context: Optional enhanced context from follow-up questions
-                            Contains: audience, complexity_level, focus_areas, teaching_style
-            character_context: Optional CharacterContext with personality profiles and relationships
-
-        Returns:
-            List of script segments with speaker and text
-            Format: [{"speaker": "Alex", "text": "..."}, ...]
-
-        Raises:
-            Exception: If script generation fails
-        """
-        try:
-            if progress_callback:
-                progress_callback("Generating conversational script...", 10)
-
-            # Set speaker names
-            if speaker_names is None:
-                speaker_names = {"teacher": "Teacher", "student": "Student"}
-
-            teacher_name = speaker_names.get("teacher", "Teacher")
-            student_name = speaker_names.get("student", "Student")
-
-            system_prompt = f"""You are a world-class educator creating extraordinary learning experiences.
+# Prompt templates, filled in with str.format()
+SCRIPT_SYSTEM_PROMPT_TEMPLATE = """You are a world-class educator creating extraordinary learning experiences.
 
 Your mission: Explain concepts in a way that creates genuine "aha!" moments and builds deep, intuitive understanding.
 
@@ -116,14 +62,10 @@ DIALOGUE CHARACTERS:
 - {student_name}: Curious, asks clarifying questions, provides "aha" moments, relates to real life
 """
 
-            # Inject character personality context if provided
-            if character_context:
-                logger.info("Injecting character personality context into script generation")
-                system_prompt += "\n\n" + character_context.to_prompt_context()
-            else:
-                logger.info("No character context provided - using generic character templates")
-
-            system_prompt += """
+# Appended after any character context. Not a format template: the doubled
+# braces and {teacher_name}/{student_name} reach the model verbatim, as they
+# always have
+SCRIPT_OUTPUT_FORMAT_PROMPT = """
 OUTPUT FORMAT (JSON):
 Return a JSON object with key "dialogue" containing an array of segments:
 [
@@ -136,40 +78,9 @@ TIMING:
 - Natural pauses for Student questions and reactions
 - Build to key insights with dramatic reveals"""
 
-            # If refined context provided, enhance prompts
-            if refined_context:
-                enhancements = []
-                if audience := refined_context.get("audience"):
-                    enhancements.append(f"\nAUDIENCE: {audience}. Adjust language and examples accordingly.")
-                if complexity := refined_context.get("complexity_level"):
-                    levels = {
-                        1: "simple analogies, no jargon",
-                        2: "basic terminology",
-                        3: "balanced",
-                        4: "technical details",
-                        5: "expert-level"
-                    }
-                    complexity_desc = levels.get(complexity, "balanced")
-                    enhancements.append(f"\nCOMPLEXITY: {complexity_desc}")
-                if focus := refined_context.get("focus_areas"):
-                    if focus:  # Check if list is not empty
-                        enhancements.append(f"\nFOCUS: Emphasize {', '.join(str(f) for f in focus)}")
-                if teaching_style := refined_context.get("teaching_style"):
-                    if teaching_style:  # Check if list is not empty
-                        enhancements.append(f"\nTEACHING STYLE: {', '.join(str(s) for s in teaching_style)}")
-
-                if enhancements:
-                    system_prompt += "\n".join(enhancements)
-                    logger.info(f"Enhanced system prompt with context: {', '.join(refined_context.keys())}")
-
-            # Calculate word count constraint based on speaking rate
-            # Average speaking rate: 2.5 words per second (150 words/minute)
-            # Use conservative estimate to ensure we stay under duration_seconds
-            max_words = int(duration_seconds * 2.5)
-
-            user_prompt = f"""Topic: {topic}
+SCRIPT_USER_PROMPT_TEMPLATE = """Topic: {topic}
 Target Duration: EXACTLY {duration_seconds} seconds (STRICT MAXIMUM)
-Target Segments: {max(10, duration_seconds // 4)} segments
+Target Segments: {segment_count} segments
 CRITICAL WORD LIMIT: {max_words} words TOTAL across ALL segments (Average speaking rate: 2.5 words/sec)
 
 BREVITY IS ESSENTIAL - This must fit in {duration_seconds} seconds of audio!
@@ -215,9 +126,200 @@ Every line should naturally reference visuals:
 
 Make learning feel like an exciting discovery journey - but KEEP IT BRIEF!"""
 
+
+# Keys the script array may come under, in priority order: "dialogue" is the
+# current standard, the rest are legacy
+SCRIPT_KEYS = ("dialogue", "script", "segments", "conversation", "lines", "content", "data")
+SCRIPT_KEY_RANKS = {key: rank for rank, key in enumerate(SCRIPT_KEYS)}
+
+
+def _looks_like_script(value: List) -> bool:
+    """Whether a list starts with a dialogue segment (has speaker or text)."""
+    return bool(value) and isinstance(value[0], dict) and ("speaker" in value[0] or "text" in value[0])
+
+
+@functools.lru_cache(maxsize=8)
+def _render_system_prompt(teacher_name: str, student_name: str) -> str:
+    """System prompt for a speaker pair; the few pairs in use are rendered once."""
+    return SCRIPT_SYSTEM_PROMPT_TEMPLATE.format(teacher_name=teacher_name, student_name=student_name)
+
+
+class ScriptSegmentScanner:
+    """
+    Pick completed dialogue segments out of a streamed JSON response.
+
+    Tracks container nesting and string/escape state across chunks, so each
+    {"speaker": ..., "text": ...} object inside an array is emitted as soon
+    as its closing brace arrives, long before the whole document is done.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack: List[Tuple[str, int]] = []  # (opening char, index) of open containers
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        """
+        Add the next chunk of response text.
+
+        Returns:
+            Segments completed by this chunk, in order
+        """
+        self.text += chunk
+        segments = []
+        for index in range(self._pos, len(self.text)):
+            char = self.text[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append((char, index))
+            elif char in "}]" and self._stack:
+                _, start = self._stack.pop()
+                # Segments are objects that are elements of an array
+                if char == "}" and self._stack and self._stack[-1][0] == "[":
+                    segment = self._parse_segment(self.text[start:index + 1])
+                    if segment:
+                        segments.append(segment)
+        self._pos = len(self.text)
+        return segments
+
+    @staticmethod
+    def _parse_segment(text: str) -> Optional[Dict[str, str]]:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(value, dict) and "speaker" in value and "text" in value:
+            return value
+        return None
+
+
+class ScriptGenerator:
+    """Generate multi-voice educational scripts using OpenAI GPT-4o."""
+
+    def __init__(self, api_key: str, model: str = "gpt-4o"):
+        """
+        Initialize the script generator.
+
+        Args:
+            api_key: OpenAI API key
+            model: Model to use (gpt-4o, gpt-4o-mini, gpt-3.5-turbo)
+        """
+        self.client = get_openai_client(api_key)
+        self.model = model
+
+    async def generate_script(
+        self,
+        topic: str,
+        duration_seconds: int = 60,
+        progress_callback: Optional[Callable[[str, int], None]] = None,
+        speaker_names: Optional[Dict[str, str]] = None,
+        refined_context: Optional[Dict[str, Any]] = None,
+        character_context: Optional[Any] = None,  # CharacterContext
+        segment_callback: Optional[Callable[[Dict[str, str]], None]] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Generate a multi-voice educational script.
+
+        The response is streamed, so progress is reported and segment_callback
+        is called as each dialogue segment completes rather than after the
+        whole response has arrived.
+
+        Args:
+            topic: The educational topic to create a script about
+            duration_seconds: Target duration in seconds
+            progress_callback: Optional callback for progress updates
+            speaker_names: Optional dict with 'teacher' and 'student' names
+                          e.g., {"teacher": "Drake", "student": "Sydney"}
+                          Defaults to {"teacher": "Teacher", "student": "Student"}
+            refined_context: Optional enhanced context from follow-up questions
+                            Contains: audience, complexity_level, focus_areas, teaching_style
+            character_context: Optional CharacterContext with personality profiles and relationships
+            segment_callback: Optional callback receiving each segment as soon as
+                it has streamed in (provisional: before validation and the
+                word-limit truncation applied to the returned script)
+
+        Returns:
+            List of script segments with speaker and text
+            Format: [{"speaker": "Alex", "text": "..."}, ...]
+
+        Raises:
+            Exception: If script generation fails
+        """
+        try:
+            if progress_callback:
+                progress_callback("Generating conversational script...", 10)
+
+            # Set speaker names
+            if speaker_names is None:
+                speaker_names = {"teacher": "Teacher", "student": "Student"}
+
+            teacher_name = speaker_names.get("teacher", "Teacher")
+            student_name = speaker_names.get("student", "Student")
+
+            system_prompt = _render_system_prompt(teacher_name, student_name)
+
+            # Inject character personality context if provided
+            if character_context:
+                logger.info("Injecting character personality context into script generation")
+                system_prompt += "\n\n" + character_context.to_prompt_context()
+            else:
+                logger.info("No character context provided - using generic character templates")
+
+            system_prompt += SCRIPT_OUTPUT_FORMAT_PROMPT
+
+            # If refined context provided, enhance prompts
+            if refined_context:
+                enhancements = []
+                if audience := refined_context.get("audience"):
+                    enhancements.append(f"\nAUDIENCE: {audience}. Adjust language and examples accordingly.")
+                if complexity := refined_context.get("complexity_level"):
+                    levels = {
+                        1: "simple analogies, no jargon",
+                        2: "basic terminology",
+                        3: "balanced",
+                        4: "technical details",
+                        5: "expert-level"
+                    }
+                    complexity_desc = levels.get(complexity, "balanced")
+                    enhancements.append(f"\nCOMPLEXITY: {complexity_desc}")
+                if focus := refined_context.get("focus_areas"):
+                    if focus:  # Check if list is not empty
+                        enhancements.append(f"\nFOCUS: Emphasize {', '.join(str(f) for f in focus)}")
+                if teaching_style := refined_context.get("teaching_style"):
+                    if teaching_style:  # Check if list is not empty
+                        enhancements.append(f"\nTEACHING STYLE: {', '.join(str(s) for s in teaching_style)}")
+
+                if enhancements:
+                    system_prompt += "\n".join(enhancements)
+                    logger.info(f"Enhanced system prompt with context: {', '.join(refined_context.keys())}")
+
+            # Calculate word count constraint based on speaking rate
+            # Average speaking rate: 2.5 words per second (150 words/minute)
+            # Use conservative estimate to ensure we stay under duration_seconds
+            max_words = int(duration_seconds * 2.5)
+
+            user_prompt = SCRIPT_USER_PROMPT_TEMPLATE.format(
+                topic=topic,
+                duration_seconds=duration_seconds,
+                segment_count=max(10, duration_seconds // 4),
+                max_words=max_words,
+                teacher_name=teacher_name,
+                student_name=student_name,
+            )
+
             logger.info(f"Generating script for topic: {topic}")
 
-            response = await self.client.chat.completions.create(
+            stream = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -225,38 +327,43 @@ Make learning feel like an exciting discovery journey - but KEEP IT BRIEF!"""
                 ],
                 temperature=0.8,
                 response_format={"type": "json_object"},
+                stream=True,
             )
 
-            content = response.choices[0].message.content
+            scanner = ScriptSegmentScanner()
+            streamed_segments = 0
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    new_segments = scanner.feed(chunk.choices[0].delta.content or "")
+                    if not new_segments:
+                        continue
+                    streamed_segments += len(new_segments)
+                    if segment_callback:
+                        for segment in new_segments:
+                            segment_callback(segment)
+                    if progress_callback:
+                        progress_callback(
+                            f"Writing script (segment {streamed_segments})...",
+                            min(19, 10 + streamed_segments // 2),
+                        )
+            finally:
+                await stream.close()
+
+            # The complete document is still parsed and validated as a whole
+            content = scanner.text
             logger.info(f"Script response preview (first 500 chars): {content[:500]}")
 
             # Parse JSON response
             parsed = json.loads(content)
 
-            # Handle different possible JSON structures - try multiple keys
+            # Handle different possible JSON structures
             script = None
-            # Prioritize "dialogue" as the new standard, but support legacy keys
-            possible_keys = ["dialogue", "script", "segments", "conversation", "lines", "content", "data"]
-
             if isinstance(parsed, list):
                 script = parsed
             elif isinstance(parsed, dict):
-                # Try known keys first
-                for key in possible_keys:
-                    if key in parsed and isinstance(parsed[key], list):
-                        script = parsed[key]
-                        logger.info(f"Found script under key: {key}")
-                        break
-
-                # If still not found, try ANY list value
-                if script is None:
-                    for key, value in parsed.items():
-                        if isinstance(value, list) and len(value) > 0:
-                            # Check if it looks like a script (has speaker/text)
-                            if isinstance(value[0], dict) and ("speaker" in value[0] or "text" in value[0]):
-                                script = value
-                                logger.info(f"Found script-like list under key: {key}")
-                                break
+                script = self._find_script(parsed)
 
             if script is None:
                 logger.error(f"Failed to find script in response. Keys found: {list(parsed.keys()) if isinstance(parsed, dict) else 'not a dict'}")
@@ -306,6 +413,43 @@ Make learning feel like an exciting discovery journey - but KEEP IT BRIEF!"""
             logger.error(f"Script generation failed: {e}")
             raise Exception(f"Failed to generate script: {e}")
 
+    @staticmethod
+    def _find_script(parsed: Dict[str, Any]) -> Optional[List]:
+        """
+        Find the script array in a response object in a single pass.
+
+        A list under a known key wins, the earliest key in SCRIPT_KEYS
+        first; otherwise the first list anywhere that looks like a script.
+        Stops as soon as the top-priority key is seen.
+
+        Args:
+            parsed: Parsed response object
+
+        Returns:
+            The script list, or None if there isn't one
+        """
+        best_rank = len(SCRIPT_KEYS)
+        best_key = fallback_key = None
+        for key, value in parsed.items():
+            if not isinstance(value, list):
+                continue
+            rank = SCRIPT_KEY_RANKS.get(key)
+            if rank is not None:
+                if rank < best_rank:
+                    best_rank, best_key = rank, key
+                    if rank == 0:
+                        break
+            elif fallback_key is None and _looks_like_script(value):
+                fallback_key = key
+
+        if best_key is not None:
+            logger.info(f"Found script under key: {best_key}")
+            return parsed[best_key]
+        if fallback_key is not None:
+            logger.info(f"Found script-like list under key: {fallback_key}")
+            return parsed[fallback_key]
+        return None
+
     def _truncate_script_to_word_limit(
         self, script: List[Dict[str, str]], max_words: int
     ) -> List[Dict[str, str]]:
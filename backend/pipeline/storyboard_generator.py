@@ -8,7 +8,7 @@ Supports cumulative visual context for progressive diagram building.
 
 import logging
 from typing import Callable, Optional, List, Dict, Any
-from openai import AsyncOpenAI
+from .openai_client import get_openai_client
 import json
 
 # Import visual context system
@@ -42,7 +42,7 @@ class StoryboardGenerator:
         Args:
             api_key: OpenAI API key
         """
-        self.client = AsyncOpenAI(api_key=api_key)
+        self.client = get_openai_client(api_key)
         self.model = "gpt-4o"
 
     async def generate_storyboard(
@@ -9,7 +9,7 @@ import logging
 from typing import Callable, Optional, List, Dict
 from pathlib import Path
 import asyncio
-from openai import AsyncOpenAI
+from .openai_client import get_openai_client
 import re
 
 logger = logging.getLogger(__name__)
@@ -25,7 +25,7 @@ class TimestampExtractor:
         Args:
             api_key: OpenAI API key
         """
-        self.client = AsyncOpenAI(api_key=api_key)
+        self.client = get_openai_client(api_key)
         self.model = "whisper-1"
 
     async def extract_timestamps(
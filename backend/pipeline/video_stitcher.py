@@ -14,6 +14,36 @@ import json
 
 logger = logging.getLogger(__name__)
 
+# Probed once per process by _detect_nvenc(); None until then
+_NVENC_AVAILABLE: Optional[bool] = None
+
+
+def _detect_nvenc() -> bool:
+    """
+    Check whether ffmpeg can actually encode with NVENC.
+
+    Many ffmpeg builds list h264_nvenc without a usable GPU, so this runs a
+    tiny test encode instead of grepping `ffmpeg -encoders`.
+    """
+    global _NVENC_AVAILABLE
+    if _NVENC_AVAILABLE is None:
+        try:
+            result = subprocess.run(
+                [
+                    "ffmpeg", "-hide_banner",
+                    "-f", "lavfi", "-i", "color=size=256x256:duration=0.1",
+                    "-c:v", "h264_nvenc",
+                    "-f", "null", "-",
+                ],
+                capture_output=True,
+                timeout=30,
+            )
+            _NVENC_AVAILABLE = result.returncode == 0
+        except (FileNotFoundError, subprocess.TimeoutExpired):
+            _NVENC_AVAILABLE = False
+        logger.info(f"NVENC hardware encoding {'available' if _NVENC_AVAILABLE else 'unavailable'}")
+    return _NVENC_AVAILABLE
+
 
 class VideoStitcher:
     """Combine audio and video using ffmpeg."""
@@ -678,6 +708,12 @@ class VideoStitcher:
             #
             # Solution: Use audio from bottom video (celebrity_lipsynced_full.mp4) directly
             # and trim both videos to match the bottom video's duration
+            # Encode on the GPU when possible; -cq 23 roughly matches x264's crf 23
+            if await asyncio.to_thread(_detect_nvenc):
+                video_codec_args = ["-c:v", "h264_nvenc", "-preset", "p4", "-cq", "23", "-b:v", "0"]
+            else:
+                video_codec_args = ["-c:v", "libx264", "-preset", "medium", "-crf", "23"]
+
             cmd = [
                 "ffmpeg",
                 "-i", str(top_video_path),
@@ -699,9 +735,7 @@ class VideoStitcher:
                 ),
                 "-map", "[v]",
                 "-map", "1:a",  # Use audio from bottom video (celebrity_lipsynced_full.mp4 with lip-synced audio)
-                "-c:v", "libx264",
-                "-preset", "medium",
-                "-crf", "23",
+                *video_codec_args,
                 "-c:a", "copy",  # Copy audio as-is (already encoded and synced in bottom video)
                 # Remove -t and -shortest since trimming is now done in the filter
                 # This ensures the output matches the trimmed filter output exactly
@@ -21,13 +21,14 @@ class MockUploadFile:
         self.content = content
         self.filename = filename
         self.content_type = content_type
-        self._read = False
-
-    async def read(self):
-        if not self._read:
-            self._read = True
-            return self.content
-        return b""
+        self.size = len(content)
+        self._offset = 0
+
+    async def read(self, size: int = -1):
+        end = len(self.content) if size < 0 else self._offset + size
+        chunk = self.content[self._offset:end]
+        self._offset += len(chunk)
+        return chunk
 
 
 async def test_photo_upload():